@@ -0,0 +1,409 @@
+# Benchmark of postprocessing and rendering on synthetic catalogs, without a
+# database:
+#   python benchmark.py --tables 10000 --output bench/10k.json
+#   python benchmark.py --tables 10000 --compare bench/10k.json
+#   python benchmark.py --catalog output/radar_db.json
+
+import argparse
+from datetime import datetime
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import postgresql_autodoc
+from postgresql_autodoc import (set_column_attribute, set_column_constraint_attribute, set_constraint,
+                                set_function_attribute, set_index_definition, set_permission_granted,
+                                set_schema_comment, set_table_attribute)
+
+TEMPLATE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
+
+BENCHMARK_DATABASE = 'benchmark'
+
+# Layers and services named by the generated comments, as they are read from
+# the config file by main()
+BENCHMARK_LAYERS = {'layer_{}'.format(n): {'name': 'layer_{}'.format(n), 'url': 'http://maps/?name=layer_{}'.format(n)}
+                    for n in range(10)}
+BENCHMARK_SERVICES = {'сервис_{}'.format(n): {'name': 'Сервис_{}'.format(n), 'url': 'http://services/{}'.format(n)}
+                      for n in range(10)}
+
+# (type, length, align, average width) of the generated columns
+COLUMN_TYPES = (
+    ('integer', 4, 'i', 4),
+    ('bigint', 8, 'd', 8),
+    ('boolean', 1, 'c', 1),
+    ('smallint', 2, 's', 2),
+    ('text', -1, 'i', 24),
+    ('character varying(64)', -1, 'i', 16),
+    ('timestamp with time zone', 8, 'd', 8),
+    ('numeric(12,2)', -1, 'i', 7),
+    ('integer[]', -1, 'i', 40),
+)
+
+FUNCTION_SOURCE = '''
+DECLARE
+    counter integer := 0;
+BEGIN
+    -- Walk the rows of {table} and count the matching ones
+    FOR r IN SELECT * FROM {table} WHERE id > p_id LOOP
+        counter := counter + 1;
+    END LOOP;
+    RETURN counter;
+END;
+'''
+
+VIEW_DEFINITION = (" SELECT t.id, t.col_1, (t.id + 1) AS next_id FROM ({table} t LEFT JOIN {other} o ON ((t.id = o.id)))"
+                   " WHERE ((t.id > 0) AND (o.id IS NOT NULL)) ORDER BY t.id;")
+
+
+#####
+# generate_catalog
+#   Synthetic catalog in the shape info_collect() leaves in db: tables with
+#   columns, keys, foreign keys, indexes and statistics, views, functions and
+#   comments using the \depends, \affects and \param keywords. The same
+#   parameters and seed always give the same catalog.
+def generate_catalog(schemas=10, tables=1000, columns=8, foreign_keys=1.5, functions=200, keywords=0.3,
+                     views=0.1, seed=1):
+    rnd = random.Random(seed)
+    db = {BENCHMARK_DATABASE: {'COMMENT': 'Synthetic catalog for benchmarks', 'STRUCT': dict(), 'EXTENSION': dict()}}
+    struct = db[BENCHMARK_DATABASE]['STRUCT']
+
+    schema_names = ['schema_{}'.format(n) for n in range(schemas)]
+    table_names = [(schema_names[n % schemas], 'table_{}'.format(n)) for n in range(tables)]
+    function_names = [(schema_names[n % schemas], 'function_{}'.format(n)) for n in range(functions)]
+
+    def keyword_comment(text):
+        if rnd.random() >= keywords:
+            return text
+        keyword = rnd.choice(('\\depends', '\\affects'))
+        kind = rnd.choice(('TABLE', 'TABLE', 'FUNCTION', 'LAYER', 'SERVICE'))
+        if kind == 'TABLE' or kind == 'FUNCTION' and not function_names:
+            target = '{}.{}'.format(*rnd.choice(table_names))
+            kind = 'TABLE'
+        elif kind == 'FUNCTION':
+            target = '{}.{}'.format(*rnd.choice(function_names))
+        elif kind == 'LAYER':
+            target = rnd.choice(list(BENCHMARK_LAYERS))
+        else:
+            target = rnd.choice(list(BENCHMARK_SERVICES))
+        return '{} {} {}: {} and the rest of the description'.format(text, keyword, kind, target)
+
+    for schema in schema_names:
+        set_schema_comment(struct, schema, 'Схема {} of the synthetic catalog'.format(schema))
+
+    for table_index, (schema, table) in enumerate(table_names):
+        is_view = rnd.random() < views
+        set_table_attribute(struct, schema, table, 'TYPE', 'view' if is_view else 'table')
+        set_table_attribute(struct, schema, table, 'DESCRIPTION', keyword_comment('Table {} хранит данные'.format(table)))
+        set_table_attribute(struct, schema, table, 'RELTUPLES', 0 if is_view else rnd.randint(0, 10 ** 7))
+        if is_view:
+            other_schema, other_table = rnd.choice(table_names)
+            set_table_attribute(struct, schema, table, 'VIEW_DEF', VIEW_DEFINITION.format(
+                table='{}.{}'.format(schema, table), other='{}.{}'.format(other_schema, other_table)))
+            set_table_attribute(struct, schema, table, 'HAS_STATISTICS', False)
+        else:
+            set_table_attribute(struct, schema, table, 'VIEW_DEF', None)
+            set_table_attribute(struct, schema, table, 'HAS_STATISTICS', True)
+            set_table_attribute(struct, schema, table, 'TABLELEN', rnd.randint(8192, 10 ** 10))
+            set_table_attribute(struct, schema, table, 'TUPLECOUNT', rnd.randint(0, 10 ** 7))
+            set_table_attribute(struct, schema, table, 'TUPLELEN', rnd.randint(0, 10 ** 9))
+            set_table_attribute(struct, schema, table, 'DEADTUPLELEN', rnd.randint(0, 10 ** 6))
+            set_table_attribute(struct, schema, table, 'FREELEN', rnd.randint(0, 10 ** 6))
+
+        column_names = ['id'] + ['col_{}'.format(n) for n in range(1, max(columns, 1))]
+        for column_index, column in enumerate(column_names):
+            column_type, length, align, width = COLUMN_TYPES[0] if column == 'id' else rnd.choice(COLUMN_TYPES)
+            set_column_attribute(struct, schema, table, column, 'ORDER', column_index + 1)
+            set_column_attribute(struct, schema, table, column, 'PRIMARY KEY', 0)
+            set_column_attribute(struct, schema, table, column, 'FKTABLE', '')
+            set_column_attribute(struct, schema, table, column, 'TYPE', column_type)
+            set_column_attribute(struct, schema, table, column, 'NULL', 'NOT NULL' if column == 'id' else '')
+            set_column_attribute(struct, schema, table, column, 'DESCRIPTION',
+                                 rnd.choice((None, 'Колонка {}'.format(column), 'Column "{}" & <more>'.format(column))))
+            set_column_attribute(struct, schema, table, column, 'DEFAULT',
+                                 "nextval('{}_id_seq'::regclass)".format(table) if column == 'id' else None)
+            set_column_attribute(struct, schema, table, column, 'LENGTH', length)
+            set_column_attribute(struct, schema, table, column, 'ALIGN', align)
+            set_column_attribute(struct, schema, table, column, 'AVG_WIDTH', width)
+        if is_view:
+            continue
+
+        primary_key = table + '_pkey'
+        set_column_constraint_attribute(struct, schema, table, 'id', primary_key, 'TYPE', 'PRIMARY KEY')
+        set_column_constraint_attribute(struct, schema, table, 'id', primary_key, 'COLNUM', 1)
+        set_index_definition(struct, schema, table, primary_key,
+                             'CREATE UNIQUE INDEX {} ON {}.{} USING btree (id)'.format(primary_key, schema, table))
+        index_keys = {primary_key: {'COLUMNS': ['id'], 'OPCLASSES': ['int4_ops'], 'OPTIONS': [0], 'UNIQUE': True,
+                                    'PRIMARY': True, 'EXCLUSION': False, 'METHOD': 'btree', 'PREDICATE': None,
+                                    'EXPRESSIONS': None, 'SIZE': 16384, 'SCANS': rnd.randint(0, 1000)}}
+        set_table_attribute(struct, schema, table, 'INDEX_KEYS', index_keys)
+        set_constraint(struct, schema, table, table + '_check', 'CHECK ((id > 0))')
+
+        # Foreign keys mostly reference earlier tables, with a few cycles
+        fk_count = int(foreign_keys) + (rnd.random() < foreign_keys - int(foreign_keys))
+        for fk_index in range(min(fk_count, len(column_names) - 1) if table_index else 0):
+            if rnd.random() < 0.02:
+                fk_schema, fk_table = rnd.choice(table_names)
+            else:
+                fk_schema, fk_table = table_names[rnd.randrange(table_index)]
+            if struct[fk_schema].get('TABLE', dict()).get(fk_table, dict()).get('TYPE', 'table') != 'table':
+                continue
+            column = column_names[fk_index + 1]
+            constraint = '{}_{}_fkey'.format(table, column)
+            set_column_constraint_attribute(struct, schema, table, column, constraint, 'TYPE', 'FOREIGN KEY')
+            set_column_constraint_attribute(struct, schema, table, column, constraint, 'COLNUM', 1)
+            set_column_constraint_attribute(struct, schema, table, column, constraint, 'FKTABLE', fk_table)
+            set_column_constraint_attribute(struct, schema, table, column, constraint, 'FKSCHEMA', fk_schema)
+            set_column_constraint_attribute(struct, schema, table, column, constraint, 'FK-COL NAME', 'id')
+            if rnd.random() < 0.5:
+                index = '{}_{}_idx'.format(table, column)
+                set_index_definition(struct, schema, table, index,
+                                     'CREATE INDEX {} ON {}.{} USING btree ({})'.format(index, schema, table, column))
+                index_keys[index] = {'COLUMNS': [column], 'OPCLASSES': ['int4_ops'], 'OPTIONS': [0], 'UNIQUE': False,
+                                     'PRIMARY': False, 'EXCLUSION': False, 'METHOD': 'btree', 'PREDICATE': None,
+                                     'EXPRESSIONS': None, 'SIZE': 8192, 'SCANS': rnd.randint(0, 10)}
+
+        for user in rnd.sample(('postgres', 'PUBLIC', 'reader', 'writer'), 2):
+            for permission in ('SELECT', 'INSERT', 'UPDATE'):
+                set_permission_granted(struct, schema, table, user, permission)
+
+    for function_index, (schema, function) in enumerate(function_names):
+        table_schema, table = rnd.choice(table_names)
+        arguments = ['p_id integer', 'p_name text'][:function_index % 3]
+        name = '{}({})'.format(function, ', '.join(arguments))
+        comment = '\n'.join(['\\param {} the {} argument'.format(argument.split()[0], argument.split()[1])
+                             for argument in arguments] + [keyword_comment('Counts rows of {}'.format(table))])
+        set_function_attribute(struct, schema, name, 'NAME', function)
+        set_function_attribute(struct, schema, name, 'ARGS', arguments)
+        set_function_attribute(struct, schema, name, 'COMMENT', comment)
+        set_function_attribute(struct, schema, name, 'SOURCE',
+                               FUNCTION_SOURCE.format(table='{}.{}'.format(table_schema, table)))
+        set_function_attribute(struct, schema, name, 'LANGUAGE', 'plpgsql')
+        set_function_attribute(struct, schema, name, 'RETURNS', 'integer')
+        set_function_attribute(struct, schema, name, 'VOLATILITY', rnd.choice(('immutable', 'stable', 'volatile')))
+        set_function_attribute(struct, schema, name, 'PARALLEL', 'unsafe')
+        set_function_attribute(struct, schema, name, 'COST', 100)
+        set_function_attribute(struct, schema, name, 'ROWS', 0)
+        set_function_attribute(struct, schema, name, 'SECURITY_DEFINER', False)
+        set_function_attribute(struct, schema, name, 'LEAKPROOF', False)
+        set_function_attribute(struct, schema, name, 'STRICT', False)
+
+    return db
+
+
+#####
+# measure
+#   Run a phase, returning its result and a dict of the wall and CPU time it
+#   took, or with trace_memory of the peak of Python allocations during it.
+def measure(phase, trace_memory=False):
+    if trace_memory:
+        tracemalloc.reset_peak()
+        result = phase()
+        return result, {'peak_traced_bytes': tracemalloc.get_traced_memory()[1]}
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    result = phase()
+    return result, {
+        'wall_seconds': round(time.perf_counter() - wall_start, 4),
+        'cpu_seconds': round(time.process_time() - cpu_start, 4),
+    }
+
+
+#####
+# run_phases
+#   Postprocess the catalog, write all templates at once and then each
+#   template on its own. Templates are rendered without the cache, so every
+#   run renders everything. The 'template_context' phase only prepares the
+#   context the templates share, which the time of each template includes.
+def run_phases(db, jobs, html_shards, trace_memory):
+    database = next(iter(db))
+    phases = dict()
+    templates = sorted(os.path.splitext(file)[0] for file in os.listdir(TEMPLATE_PATH)
+                       if os.path.splitext(file)[1] == '.mako'
+                       and os.path.splitext(file)[0] not in postgresql_autodoc.AUXILIARY_TEMPLATES)
+
+    def write(wanted_output, jobs):
+        return lambda: postgresql_autodoc.write_using_templates(db, database, TEMPLATE_PATH, output_filename_base,
+                                                                wanted_output, None, jobs, html_shards)
+
+    _, phases['info_postprocess'] = measure(
+        lambda: postgresql_autodoc.info_postprocess(db, BENCHMARK_LAYERS, BENCHMARK_SERVICES), trace_memory)
+    with tempfile.TemporaryDirectory() as output_dir:
+        output_filename_base = os.path.join(output_dir, database)
+        _, phases['write_using_templates'] = measure(write(None, jobs), trace_memory)
+        # No template has this type, so only the context is prepared
+        _, phases['template_context'] = measure(write('-', 1), trace_memory)
+        for template in templates:
+            _, phases['template:' + template] = measure(write(template, 1), trace_memory)
+        output_bytes = sum(os.path.getsize(os.path.join(path, file))
+                           for path, _, files in os.walk(output_dir) for file in files)
+    return phases, output_bytes
+
+
+#####
+# run_benchmark
+#   Time the phases on db, then, as tracing slows everything down several
+#   times, trace their memory in a second run on a fresh catalog from
+#   make_catalog().
+def run_benchmark(db, make_catalog, jobs=1, html_shards=None, trace_memory=True):
+    phases, output_bytes = run_phases(db, jobs, html_shards, False)
+    if trace_memory:
+        tracemalloc.start()
+        try:
+            memory, _ = run_phases(make_catalog(), 1, html_shards, True)
+        finally:
+            tracemalloc.stop()
+        for phase, measurement in memory.items():
+            phases[phase].update(measurement)
+    return phases, output_bytes
+
+
+#####
+# catalog_size
+#   Number of objects of the catalog, stored with the results so that runs on
+#   different catalogs are not compared by mistake.
+def catalog_size(db):
+    size = {'schemas': 0, 'tables': 0, 'columns': 0, 'foreign_keys': 0, 'functions': 0}
+    for database_attr in db.values():
+        for schema_attr in database_attr['STRUCT'].values():
+            size['schemas'] += 1
+            size['functions'] += len(schema_attr.get('FUNCTION', dict()))
+            for table_attr in schema_attr.get('TABLE', dict()).values():
+                size['tables'] += 1
+                size['columns'] += len(table_attr.get('COLUMN', dict()))
+                size['foreign_keys'] += len(set(
+                    con for column_attr in table_attr.get('COLUMN', dict()).values()
+                    for con, con_attr in column_attr.get('CON', dict()).items() if con_attr['TYPE'] == 'FOREIGN KEY'))
+    return size
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=os.path.dirname(TEMPLATE_PATH),
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+#####
+# compare_results
+#   Print the phases of two runs side by side with the ratio of their wall
+#   time, and return the names of the phases slower than the threshold.
+def compare_results(baseline, results, threshold):
+    if baseline.get('catalog') != results['catalog']:
+        print('warning: the baseline was measured on a different catalog {}'.format(baseline.get('catalog')))
+    regressions = list()
+    print('{:<32} {:>12} {:>12} {:>8}'.format('phase', 'baseline, s', 'current, s', 'ratio'))
+    for phase, measurement in results['phases'].items():
+        before = baseline.get('phases', dict()).get(phase)
+        if before is None or not before['wall_seconds']:
+            print('{:<32} {:>12} {:>12.3f}'.format(phase, '-', measurement['wall_seconds']))
+            continue
+        ratio = measurement['wall_seconds'] / before['wall_seconds']
+        print('{:<32} {:>12.3f} {:>12.3f} {:>8.2f}'.format(phase, before['wall_seconds'],
+                                                           measurement['wall_seconds'], ratio))
+        if ratio > threshold:
+            regressions.append(phase)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark postprocessing and rendering of the templates on a synthetic catalog or a catalog '
+                    'saved by postgresql_autodoc (<file>.json), without a database. The timings and peak memory '
+                    'of every phase are written as JSON, so runs on different commits can be compared.')
+    parser.add_argument('--catalog', metavar='<json>', type=str,
+                        help='Benchmark this saved catalog instead of generating one')
+    parser.add_argument('--schemas', metavar='<count>', type=int, default=10, help='Generated schemas (default: 10)')
+    parser.add_argument('--tables', metavar='<count>', type=int, default=1000,
+                        help='Generated tables and views (default: 1000)')
+    parser.add_argument('--columns', metavar='<count>', type=int, default=8, help='Columns per table (default: 8)')
+    parser.add_argument('--foreign-keys', metavar='<count>', type=float, default=1.5,
+                        help='Average foreign keys per table (default: 1.5)')
+    parser.add_argument('--functions', metavar='<count>', type=int, default=200,
+                        help='Generated functions (default: 200)')
+    parser.add_argument('--keywords', metavar='<fraction>', type=float, default=0.3,
+                        help='Fraction of comments with \\depends or \\affects keywords (default: 0.3)')
+    parser.add_argument('--views', metavar='<fraction>', type=float, default=0.1,
+                        help='Fraction of the tables generated as views (default: 0.1)')
+    parser.add_argument('--seed', metavar='<number>', type=int, default=1, help='Random seed (default: 1)')
+    parser.add_argument('--save-catalog', metavar='<json>', type=str,
+                        help='Also write the generated catalog, in the format of <file>.json')
+    parser.add_argument('--html-shards', choices=('schema', 'object'), help='Render the html output as shards')
+    parser.add_argument('-j', '--jobs', metavar='<count>', type=int, default=1,
+                        help='Processes rendering the templates when they are written at once (default: 1)')
+    parser.add_argument('--no-trace-memory', action='store_true',
+                        help='Do not run the phases a second time to trace their peak memory')
+    parser.add_argument('-o', '--output', metavar='<json>', type=str, help='Write the results to this file')
+    parser.add_argument('--compare', metavar='<json>', type=str,
+                        help='Compare the results with a previous run and fail when a phase is slower than '
+                             '--threshold times its time there')
+    parser.add_argument('--threshold', metavar='<ratio>', type=float, default=1.25,
+                        help='Slowdown over the compared run counted as a regression (default: 1.25)')
+    args = parser.parse_args()
+
+    # Postprocessing changes the catalog, so every run gets its own copy
+    if args.catalog is not None:
+        parameters = {'catalog': args.catalog}
+
+        def make_catalog():
+            with open(args.catalog) as catalog_file:
+                return json.load(catalog_file)
+
+        db = make_catalog()
+    else:
+        parameters = {'schemas': args.schemas, 'tables': args.tables, 'columns': args.columns,
+                      'foreign_keys': args.foreign_keys, 'functions': args.functions, 'keywords': args.keywords,
+                      'views': args.views, 'seed': args.seed}
+
+        def make_catalog():
+            return generate_catalog(**parameters)
+
+        db, generation = measure(make_catalog)
+        print('generated the catalog in {:.1f} s'.format(generation['wall_seconds']))
+        if args.save_catalog is not None:
+            postgresql_autodoc.write_json_if_changed(db, args.save_catalog)
+    catalog = catalog_size(db)
+    phases, output_bytes = run_benchmark(db, make_catalog, args.jobs, args.html_shards, not args.no_trace_memory)
+    parameters.update({'jobs': args.jobs, 'html_shards': args.html_shards})
+
+    results = {
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'parameters': parameters,
+        'catalog': catalog,
+        'phases': phases,
+        'output_bytes': output_bytes,
+        # Linux reports kilobytes, macOS bytes
+        'max_rss_bytes': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == 'darwin'
+                                                                               else 1024),
+    }
+
+    if args.output is not None:
+        output_dir = os.path.dirname(args.output)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        with open(args.output, 'w') as output_file:
+            json.dump(results, output_file, indent=2, ensure_ascii=False)
+    else:
+        print(json.dumps(results, indent=2, ensure_ascii=False))
+
+    if args.compare is not None:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = compare_results(baseline, results, args.threshold)
+        if regressions:
+            print('slower than {} times the baseline: {}'.format(args.threshold, ', '.join(regressions)))
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,7 @@
 from decimal import Decimal
+import functools
 import json
-import psycopg2
+import time
 
 
 class PgJsonEncoder(json.JSONEncoder):
@@ -10,6 +11,302 @@ class PgJsonEncoder(json.JSONEncoder):
         return super(PgJsonEncoder, self).default(o)
 
 
+class QueryStatistics:
+    # Calls, latencies, rows and bytes of the catalog queries, by the get_*
+    # function which ran them. A query is a round trip to the server, so the
+    # time of a round trip without work, measured with 'SELECT 1', tells how
+    # much of the latency is the network rather than the server.
+    def __init__(self):
+        self.kinds = dict()
+        self.round_trip = None
+
+    def measure_round_trip(self, cur, count=5):
+        for _ in range(count):
+            start = time.perf_counter()
+            cur.execute('SELECT 1')
+            cur.fetchall()
+            elapsed = time.perf_counter() - start
+            if self.round_trip is None or elapsed < self.round_trip:
+                self.round_trip = elapsed
+
+    def add_query(self, kind, seconds):
+        kind_stats = self.kinds.get(kind)
+        if kind_stats is None:
+            kind_stats = self.kinds[kind] = {'latencies': list(), 'rows': 0, 'bytes': 0}
+        kind_stats['latencies'].append(seconds)
+        return kind_stats
+
+    @staticmethod
+    def __percentile(values, percent):
+        values = sorted(values)
+        return values[max(0, -(-len(values) * percent // 100) - 1)]
+
+    def report(self):
+        kinds = dict()
+        for kind, kind_stats in self.kinds.items():
+            latencies = kind_stats['latencies']
+            total = sum(latencies)
+            report = kinds[kind] = {
+                'calls': len(latencies),
+                'total_seconds': round(total, 6),
+                'p50_seconds': round(self.__percentile(latencies, 50), 6),
+                'p99_seconds': round(self.__percentile(latencies, 99), 6),
+                'rows': kind_stats['rows'],
+                'bytes': kind_stats['bytes'],
+            }
+            if self.round_trip is not None:
+                round_trips = min(total, len(latencies) * self.round_trip)
+                report['round_trip_seconds'] = round(round_trips, 6)
+                report['server_seconds'] = round(total - round_trips, 6)
+        return {
+            'round_trip_seconds': round(self.round_trip, 6) if self.round_trip is not None else None,
+            'calls': sum(kind['calls'] for kind in kinds.values()),
+            'total_seconds': round(sum(kind['total_seconds'] for kind in kinds.values()), 6),
+            'kinds': dict(sorted(kinds.items(), key=lambda item: item[1]['total_seconds'], reverse=True)),
+        }
+
+    def summary(self, limit=15):
+        report = self.report()
+        lines = ['catalog queries: {} in {:.2f} s'.format(report['calls'], report['total_seconds'])]
+        if report['round_trip_seconds'] is not None:
+            lines[0] += ', round trip {:.2f} ms'.format(report['round_trip_seconds'] * 1000)
+        lines.append('  {:<28} {:>7} {:>9} {:>9} {:>9} {:>9} {:>11}'.format(
+            'query', 'calls', 'total, s', 'trips, s', 'p50, ms', 'p99, ms', 'rows'))
+        for kind, kind_report in list(report['kinds'].items())[:limit]:
+            lines.append('  {:<28} {:>7} {:>9.2f} {:>9.2f} {:>9.2f} {:>9.2f} {:>11}'.format(
+                kind, kind_report['calls'], kind_report['total_seconds'],
+                kind_report.get('round_trip_seconds', 0), kind_report['p50_seconds'] * 1000,
+                kind_report['p99_seconds'] * 1000, kind_report['rows']))
+        return '\n'.join(lines)
+
+
+class InstrumentedCursor:
+    # Cursor recording every query in a QueryStatistics under its kind, the
+    # name of the catalog_query function running it, paced by a QueryThrottle
+    # if given. The rows are fetched by execute() on the client side, so it
+    # holds the whole latency; the bytes are those of the values in their
+    # text form, encoded in UTF-8.
+    OTHER_KIND = 'other'
+
+    def __init__(self, cursor, query_statistics, throttle=None):
+        self.cursor = cursor
+        self.query_statistics = query_statistics
+        self.throttle = throttle
+        self.kind = None
+        self.kind_stats = None
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+    def execute(self, query, vars=None):
+        kind = self.kind or self.OTHER_KIND
+        if self.throttle is not None:
+            self.throttle.before_query(self.cursor)
+        start = time.perf_counter()
+        try:
+            if self.throttle is not None:
+                return self.throttle.execute(self.cursor, kind, query, vars)
+            return self.cursor.execute(query, vars)
+        finally:
+            self.kind_stats = self.query_statistics.add_query(kind, time.perf_counter() - start)
+
+    def fetchall(self):
+        rows = self.cursor.fetchall()
+        if self.kind_stats is not None:
+            self.kind_stats['rows'] += len(rows)
+            self.kind_stats['bytes'] += sum(len(str(value).encode('utf-8')) for row in rows for value in row
+                                            if value is not None)
+        return rows
+
+
+class QueryThrottle:
+    # Paces the catalog queries of a collection so that it stays out of the
+    # way of a busy server: at most max_rate queries a second, and a pause,
+    # doubling up to MAX_BACKOFF_SECONDS, while more than max_active_sessions
+    # other sessions are active or the replication lag exceeds
+    # max_replication_lag seconds, checked every LOAD_CHECK_SECONDS. Once the
+    # pauses took max_pause seconds in all, a warning is printed and the
+    # collection goes on without them. The statement and lock timeouts are
+    # set for the session, and a query they cancel is run again after a pause,
+    # up to MAX_RETRIES times. With a lock timeout the sizes of relations are
+    # estimated from relpages, as the size functions lock every relation.
+    # What was delayed, retried or skipped is kept for the report.
+    LOAD_CHECK_SECONDS = 5
+    MAX_BACKOFF_SECONDS = 60
+    MAX_PAUSE_SECONDS = 1800
+    MAX_RETRIES = 5
+
+    def __init__(self, max_rate=None, statement_timeout=None, lock_timeout=None, max_active_sessions=None,
+                 max_replication_lag=None, max_pause=None):
+        self.max_rate = max_rate
+        self.statement_timeout = statement_timeout
+        self.lock_timeout = lock_timeout
+        self.max_active_sessions = max_active_sessions
+        self.max_replication_lag = max_replication_lag
+        self.max_pause = self.MAX_PAUSE_SECONDS if max_pause is None else max_pause
+        self.enabled = any(value is not None for value in (max_rate, statement_timeout, lock_timeout,
+                                                           max_active_sessions, max_replication_lag))
+        self.next_query = 0
+        self.next_load_check = 0
+        self.paced = {'queries': 0, 'seconds': 0}
+        self.backoffs = dict()
+        self.paused_seconds = 0
+        self.pause_limit_reached = False
+        self.load = {'max_active_sessions': None, 'max_replication_lag': None}
+        self.estimated_sizes = lock_timeout is not None
+        self.retried = dict()
+        self.retrying = True
+        self.timed_out = list()
+
+    def setup(self, conn, cur):
+        if self.statement_timeout is not None:
+            cur.execute('SET statement_timeout = %s', (int(self.statement_timeout),))
+        if self.lock_timeout is not None and conn.server_version >= 90300:
+            cur.execute('SET lock_timeout = %s', (int(self.lock_timeout),))
+        # Committed, so that rolling back after a timeout doesn't undo them
+        conn.commit()
+
+    def before_query(self, cur):
+        now = time.monotonic()
+        if now >= self.next_load_check and not self.pause_limit_reached and (
+                self.max_active_sessions is not None or self.max_replication_lag is not None):
+            self.__wait_for_load(cur)
+            now = time.monotonic()
+            self.next_load_check = now + self.LOAD_CHECK_SECONDS
+        if self.max_rate:
+            if now < self.next_query:
+                time.sleep(self.next_query - now)
+                self.paced['queries'] += 1
+                self.paced['seconds'] += self.next_query - now
+                now = self.next_query
+            self.next_query = now + 1 / self.max_rate
+
+    def __overload(self, cur):
+        reasons = list()
+        if self.max_active_sessions is not None:
+            active_sessions = get_active_sessions(cur)
+            if active_sessions is not None:
+                self.load['max_active_sessions'] = max(self.load['max_active_sessions'] or 0, active_sessions)
+                if active_sessions > self.max_active_sessions:
+                    reasons.append('active sessions')
+        if self.max_replication_lag is not None:
+            replication_lag = get_replication_lag(cur)
+            if replication_lag is not None:
+                self.load['max_replication_lag'] = max(self.load['max_replication_lag'] or 0, replication_lag)
+                if replication_lag > self.max_replication_lag:
+                    reasons.append('replication lag')
+        return reasons
+
+    def __wait_for_load(self, cur):
+        backoff = 1
+        reasons = self.__overload(cur)
+        while reasons:
+            if self.paused_seconds >= self.max_pause:
+                self.pause_limit_reached = True
+                print('warning: paused {} s in all for the load of the server, collection goes on without waiting '
+                      'for the {}'.format(self.paused_seconds, ' and '.join(reasons)))
+                return
+            pause = min(backoff, self.max_pause - self.paused_seconds)
+            for reason in reasons:
+                backoff_stats = self.backoffs.setdefault(reason, {'pauses': 0, 'seconds': 0})
+                backoff_stats['pauses'] += 1
+                backoff_stats['seconds'] += pause
+            time.sleep(pause)
+            self.paused_seconds += pause
+            backoff = min(backoff * 2, self.MAX_BACKOFF_SECONDS)
+            reasons = self.__overload(cur)
+
+    # SQLSTATEs of query_canceled and lock_not_available
+    TIMEOUT_ERRORS = ('57014', '55P03')
+
+    def execute(self, cur, kind, query, vars):
+        # A table locked by an ALTER TABLE, VACUUM FULL or REINDEX makes the
+        # catalog queries touching it time out, for a while only: the query is
+        # rolled back and run again after a pause doubling from a second
+        backoff = 1
+        for retry in range(self.MAX_RETRIES + 1):
+            try:
+                return cur.execute(query, vars)
+            except Exception as error:
+                if getattr(error, 'pgcode', None) not in self.TIMEOUT_ERRORS or not self.retrying or \
+                        retry == self.MAX_RETRIES:
+                    raise
+                cur.connection.rollback()
+                retry_stats = self.retried.setdefault(kind, {'retries': 0, 'seconds': 0})
+                retry_stats['retries'] += 1
+                retry_stats['seconds'] += backoff
+                time.sleep(backoff)
+                backoff = min(backoff * 2, self.MAX_BACKOFF_SECONDS)
+
+    def unless_timed_out(self, conn, what, query):
+        # Result of query(), or None when the statement or lock timeout
+        # canceled it, without retrying
+        if self.statement_timeout is None and self.lock_timeout is None:
+            return query()
+        import psycopg2
+        self.retrying = False
+        try:
+            return query()
+        except psycopg2.Error as error:
+            if error.pgcode not in self.TIMEOUT_ERRORS:
+                raise
+            conn.rollback()
+            self.timed_out.append(what)
+            return None
+        finally:
+            self.retrying = True
+
+    def report(self):
+        return {
+            'max_rate': self.max_rate,
+            'statement_timeout_ms': self.statement_timeout,
+            'lock_timeout_ms': self.lock_timeout,
+            'max_active_sessions': self.max_active_sessions,
+            'max_replication_lag_seconds': self.max_replication_lag,
+            'max_pause_seconds': self.max_pause,
+            'paced_queries': self.paced['queries'],
+            'paced_seconds': round(self.paced['seconds'], 3),
+            'backoffs': self.backoffs,
+            'pause_limit_reached': self.pause_limit_reached,
+            'observed_active_sessions': self.load['max_active_sessions'],
+            'observed_replication_lag_seconds': self.load['max_replication_lag'],
+            'estimated_sizes': self.estimated_sizes,
+            'retried': self.retried,
+            'timed_out': self.timed_out,
+        }
+
+    def summary(self):
+        lines = ['throttling: {} queries delayed {:.1f} s by the rate limit'.format(
+            self.paced['queries'], self.paced['seconds'])]
+        for reason, backoff_stats in sorted(self.backoffs.items()):
+            lines.append('  paused {} times, {} s in all, for the {}'.format(
+                backoff_stats['pauses'], backoff_stats['seconds'], reason))
+        if self.pause_limit_reached:
+            lines.append('  stopped pausing after {} s in all'.format(self.paused_seconds))
+        for kind, retry_stats in sorted(self.retried.items()):
+            lines.append('  retried {} times after a timeout, pausing {} s in all: {}'.format(
+                retry_stats['retries'], retry_stats['seconds'], kind))
+        if self.timed_out:
+            lines.append('  skipped after a timeout: {}'.format(', '.join(self.timed_out)))
+        return '\n'.join(lines)
+
+
+def catalog_query(query):
+    # The queries run by the decorated function are of its kind on an
+    # InstrumentedCursor
+    @functools.wraps(query)
+    def run(cur, *args, **kwargs):
+        if not isinstance(cur, InstrumentedCursor):
+            return query(cur, *args, **kwargs)
+        outer_kind = cur.kind
+        cur.kind = query.__name__
+        try:
+            return query(cur, *args, **kwargs)
+        finally:
+            cur.kind = outer_kind
+    return run
+
+
 def fetchall_as_list_of_dict(cur):
     result = list()
     rows = cur.fetchall()
@@ -26,6 +323,50 @@ def quoted_and_comma_separated(elements):
     return ', '.join(map(lambda elem: "'" + elem + "'", elements))
 
 
+# The size functions take an AccessShareLock on the relation, which waits for
+# an ALTER TABLE, VACUUM FULL, REINDEX or CLUSTER. Estimated, the sizes are the
+# pages counted by the last VACUUM or ANALYZE, read without any lock.
+BLOCK_SIZE = "CAST(pg_catalog.current_setting('block_size') AS bigint)"
+
+
+def relation_size(relation_oid, estimated_sizes):
+    if not estimated_sizes:
+        return 'pg_catalog.pg_relation_size({})'.format(relation_oid)
+    return '''(SELECT size_class.relpages * {}
+                 FROM pg_catalog.pg_class AS size_class
+                WHERE size_class.oid = {})'''.format(BLOCK_SIZE, relation_oid)
+
+
+def indexes_size(relation_oid, estimated_sizes):
+    if not estimated_sizes:
+        return 'pg_catalog.pg_indexes_size({})'.format(relation_oid)
+    return '''(SELECT COALESCE(sum(size_class.relpages), 0) * {}
+                 FROM pg_catalog.pg_index AS size_index
+                 JOIN pg_catalog.pg_class AS size_class ON (size_class.oid = size_index.indexrelid)
+                WHERE size_index.indrelid = {})'''.format(BLOCK_SIZE, relation_oid)
+
+
+def total_relation_size(relation_oid, estimated_sizes):
+    # The relation, its TOAST table and the indexes of both
+    if not estimated_sizes:
+        return 'pg_catalog.pg_total_relation_size({})'.format(relation_oid)
+    return '''(SELECT COALESCE(sum(size_class.relpages), 0) * {0}
+                 FROM pg_catalog.pg_class AS size_class
+                WHERE size_class.oid IN (SELECT {1}
+                                          UNION ALL
+                                         SELECT toast_class.reltoastrelid
+                                           FROM pg_catalog.pg_class AS toast_class
+                                          WHERE toast_class.oid = {1}
+                                          UNION ALL
+                                         SELECT size_index.indexrelid
+                                           FROM pg_catalog.pg_index AS size_index
+                                           JOIN pg_catalog.pg_class AS indexed_class
+                                                ON (size_index.indrelid IN (indexed_class.oid,
+                                                                            indexed_class.reltoastrelid))
+                                          WHERE indexed_class.oid = {1}))'''.format(BLOCK_SIZE, relation_oid)
+
+
+@catalog_query
 def get_database_description(cur, database):
     request = '''
        SELECT pg_catalog.shobj_description(oid, 'pg_database') as comment
@@ -47,6 +388,7 @@ def regex_from_json(json_value, default):
     return json_value
 
 
+@catalog_query
 def get_schemas(cur, schemas_whitelist_regex, schemas_blacklist_regex):
     schemas_whitelist_regex = regex_from_json(schemas_whitelist_regex, '^')
     schemas_blacklist_regex = regex_from_json(schemas_blacklist_regex, '^$')
@@ -65,6 +407,7 @@ def get_schemas(cur, schemas_whitelist_regex, schemas_blacklist_regex):
     return result
 
 
+@catalog_query
 def get_tables(cur, schema, tables_whitelist_regex, tables_blacklist_regex):
     tables_whitelist_regex = regex_from_json(tables_whitelist_regex, '^')
     tables_blacklist_regex = regex_from_json(tables_blacklist_regex, '^$')
@@ -75,6 +418,8 @@ def get_tables(cur, schema, tables_whitelist_regex, tables_blacklist_regex):
             , pg_class.oid
             , pg_catalog.obj_description(pg_class.oid, 'pg_class') as table_description
             , relacl
+            , relkind
+            , reltuples
             , CASE
               WHEN relkind = 'f' THEN
                 'foreign table'
@@ -82,7 +427,7 @@ def get_tables(cur, schema, tables_whitelist_regex, tables_blacklist_regex):
                 'materialized view'
               WHEN relkind = 's' THEN
                 'special'
-              WHEN relkind = 'r' THEN
+              WHEN relkind IN ('r', 'p') THEN
                 'table'
               ELSE
                 'view'
@@ -95,7 +440,7 @@ def get_tables(cur, schema, tables_whitelist_regex, tables_blacklist_regex):
               END as view_definition
          FROM pg_catalog.pg_class
          JOIN pg_catalog.pg_namespace ON (relnamespace = pg_namespace.oid)
-        WHERE relkind IN ('f', 'm', 's', 'r', 'v')
+        WHERE relkind IN ('f', 'm', 's', 'r', 'p', 'v')
           AND nspname = %(schema)s
           AND relname ~ %(tables_whitelist_regex)s
           AND relname !~ %(tables_blacklist_regex)s
@@ -107,6 +452,7 @@ def get_tables(cur, schema, tables_whitelist_regex, tables_blacklist_regex):
     return rows
 
 
+@catalog_query
 def get_statistics(cur, table_oid):
     request = '''
        SELECT table_len
@@ -125,11 +471,46 @@ def get_statistics(cur, table_oid):
     return rows
 
 
+@catalog_query
+def get_fast_statistics(cur, schemas, estimated_sizes=False):
+    # Only catalog and statistics collector data, no page is read
+    request = '''
+       SELECT pg_class.oid
+            , reltuples
+            , relpages
+            , {} AS table_len
+            , {} AS total_len
+            , CASE
+              WHEN reltoastrelid <> 0 THEN
+                {}
+              ELSE
+                0
+              END AS toast_len
+            , {} AS index_len
+            , n_live_tup
+            , n_dead_tup
+            , to_char(GREATEST(last_vacuum, last_autovacuum), 'YYYY-MM-DD HH24:MI:SS') AS last_vacuum
+            , to_char(GREATEST(last_analyze, last_autoanalyze), 'YYYY-MM-DD HH24:MI:SS') AS last_analyze
+         FROM pg_catalog.pg_class
+         JOIN pg_catalog.pg_namespace ON (relnamespace = pg_namespace.oid)
+         LEFT JOIN pg_catalog.pg_stat_user_tables ON (relid = pg_class.oid)
+        WHERE relkind = 'r'
+          AND nspname IN ({});
+    '''.format(relation_size('pg_class.oid', estimated_sizes), total_relation_size('pg_class.oid', estimated_sizes),
+               total_relation_size('pg_class.reltoastrelid', estimated_sizes),
+               indexes_size('pg_class.oid', estimated_sizes), quoted_and_comma_separated(schemas))
+    cur.execute(request)
+    rows = fetchall_as_list_of_dict(cur)
+    return rows
+
+
+@catalog_query
 def get_columns(cur, attrelid):
     # - uses pg_class.oid
     request = '''
        SELECT attname as column_name
             , attlen as column_length
+            , attalign as column_align
             , CASE
               WHEN pg_type.typname = 'int4'
                    AND EXISTS (SELECT TRUE
@@ -183,6 +564,48 @@ def get_columns(cur, attrelid):
     return rows
 
 
+@catalog_query
+def get_column_profiles(cur, schemas, most_common_values_limit):
+    # Planner statistics of ANALYZE; for parents of inheritance and partitioned
+    # tables the statistics of the whole hierarchy are preferred
+    request = '''
+       SELECT DISTINCT ON (schemaname, tablename, attname)
+              schemaname
+            , tablename
+            , attname AS column_name
+            , null_frac
+            , n_distinct
+            , avg_width
+            , correlation
+            , (CAST(CAST(most_common_vals AS text) AS text[]))[1:%(limit)s] AS most_common_vals
+            , most_common_freqs[1:%(limit)s] AS most_common_freqs
+         FROM pg_catalog.pg_stats
+        WHERE schemaname IN ({})
+        ORDER BY schemaname, tablename, attname, inherited DESC;
+    '''.format(quoted_and_comma_separated(schemas))
+    cur.execute(request, {'limit': most_common_values_limit})
+    rows = fetchall_as_list_of_dict(cur)
+    return rows
+
+
+@catalog_query
+def get_column_widths(cur, schemas):
+    request = '''
+       SELECT DISTINCT ON (schemaname, tablename, attname)
+              schemaname
+            , tablename
+            , attname AS column_name
+            , avg_width
+         FROM pg_catalog.pg_stats
+        WHERE schemaname IN ({})
+        ORDER BY schemaname, tablename, attname, inherited DESC;
+    '''.format(quoted_and_comma_separated(schemas))
+    cur.execute(request)
+    rows = fetchall_as_list_of_dict(cur)
+    return rows
+
+
+@catalog_query
 def get_indexes(cur, schemaname, tablename):
     request = '''
        SELECT schemaname
@@ -202,6 +625,64 @@ def get_indexes(cur, schemaname, tablename):
     return rows
 
 
+@catalog_query
+def get_index_keys(cur, schemas, estimated_sizes=False):
+    # The sizes (pg_relation_size) exist since 8.1, no index is advised on
+    # before
+    if cur.connection.server_version < 80100:
+        return list()
+    # INCLUDE columns (indnkeyatts) exist since 11
+    if cur.connection.server_version >= 110000:
+        key_count = 'indnkeyatts'
+    else:
+        key_count = 'indnatts'
+    # Exclusion constraints exist since 9.0
+    if cur.connection.server_version >= 90000:
+        exclusion = 'indisexclusion'
+    else:
+        exclusion = 'false'
+    # Sort options (DESC, NULLS FIRST) exist since 8.3, before every column
+    # is ascending
+    if cur.connection.server_version >= 80300:
+        options = 'CAST(indoption AS int2[])'
+    else:
+        options = 'CAST(ARRAY(SELECT 0 FROM generate_series(1, indnatts)) AS int2[])'
+    # The int2vector indkey is subscripted from 0
+    request = '''
+       SELECT nspname AS schemaname
+            , tblcla.relname AS tablename
+            , idxcla.relname AS indexname
+            , ARRAY(SELECT attname
+                      FROM generate_series(0, indnatts - 1) AS key_position
+                      LEFT JOIN pg_catalog.pg_attribute ON (    attrelid = indrelid
+                                                            AND attnum = indkey[key_position])
+                     ORDER BY key_position) AS index_columns
+            , {} AS key_count
+            , CAST(CAST(indclass AS oid[]) AS text[]) AS index_opclasses
+            , {} AS index_options
+            , indisunique
+            , indisprimary
+            , {} AS indisexclusion
+            , amname AS index_method
+            , pg_catalog.pg_get_expr(indpred, indrelid) AS index_predicate
+            , pg_catalog.pg_get_expr(indexprs, indrelid) AS index_expressions
+            , {} AS index_len
+            , idx_scan
+         FROM pg_catalog.pg_index
+         JOIN pg_catalog.pg_class AS idxcla ON (idxcla.oid = pg_index.indexrelid)
+         JOIN pg_catalog.pg_class AS tblcla ON (tblcla.oid = indrelid)
+         JOIN pg_catalog.pg_namespace ON (pg_namespace.oid = tblcla.relnamespace)
+         JOIN pg_catalog.pg_am ON (pg_am.oid = idxcla.relam)
+         LEFT JOIN pg_catalog.pg_stat_user_indexes ON (pg_stat_user_indexes.indexrelid = pg_index.indexrelid)
+        WHERE nspname IN ({});
+    '''.format(key_count, options, exclusion, relation_size('pg_index.indexrelid', estimated_sizes),
+               quoted_and_comma_separated(schemas))
+    cur.execute(request)
+    rows = fetchall_as_list_of_dict(cur)
+    return rows
+
+
+@catalog_query
 def get_inheritance(cur, child_schemaname, child_tablename, schemas):
     request = '''
            SELECT parnsp.nspname AS par_schemaname
@@ -222,6 +703,47 @@ def get_inheritance(cur, child_schemaname, child_tablename, schemas):
     return rows
 
 
+@catalog_query
+def get_partitions(cur, schemas, estimated_sizes=False):
+    # Declarative partitioning (pg_partitioned_table, relpartbound) exists since 10
+    if cur.connection.server_version >= 100000:
+        partition_columns = '''
+            , pg_partitioned_table.partrelid IS NOT NULL AS declarative
+            , pg_catalog.pg_get_partkeydef(pg_partitioned_table.partrelid) AS partition_key
+            , pg_catalog.pg_get_expr(chlcla.relpartbound, chlcla.oid) AS partition_bound
+         FROM pg_catalog.pg_inherits
+         LEFT JOIN pg_catalog.pg_partitioned_table ON (partrelid = inhparent)'''
+    else:
+        partition_columns = '''
+            , false AS declarative
+            , NULL AS partition_key
+            , NULL AS partition_bound
+         FROM pg_catalog.pg_inherits'''
+    request = '''
+       SELECT chlcla.oid AS chl_oid
+            , chlnsp.nspname AS chl_schemaname
+            , chlcla.relname AS chl_tablename
+            , chlcla.relkind AS chl_relkind
+            , parcla.oid AS par_oid
+            , parnsp.nspname AS par_schemaname
+            , parcla.relname AS par_tablename
+            , {} AS total_size
+            {}
+         JOIN pg_catalog.pg_class AS chlcla ON (chlcla.oid = inhrelid)
+         JOIN pg_catalog.pg_namespace AS chlnsp ON (chlnsp.oid = chlcla.relnamespace)
+         JOIN pg_catalog.pg_class AS parcla ON (parcla.oid = inhparent)
+         JOIN pg_catalog.pg_namespace AS parnsp ON (parnsp.oid = parcla.relnamespace)
+        WHERE chlcla.relkind IN ('r', 'p', 'f')
+          AND chlnsp.nspname IN ({})
+          AND parnsp.nspname IN ({});
+    '''.format(total_relation_size('chlcla.oid', estimated_sizes), partition_columns,
+               quoted_and_comma_separated(schemas), quoted_and_comma_separated(schemas))
+    cur.execute(request)
+    rows = fetchall_as_list_of_dict(cur)
+    return rows
+
+
+@catalog_query
 def get_primary_keys(cur, conrelid):
     request = '''
        SELECT conname AS constraint_name
@@ -246,7 +768,19 @@ def get_primary_keys(cur, conrelid):
     # Don't return the constraint name if it was automatically generated by
     # PostgreSQL.  The $N (where N is an integer) is not a descriptive enough
     # piece of information to be worth while including in the various outputs.
+@catalog_query
 def get_foreign_keys(cur, conrelid, schemas):
+    # Since 12 a foreign key to a partitioned table has a clone on the same
+    # table for every partition, whose parent (11+) is the foreign key; the
+    # foreign keys a partition inherits have their parent on another table
+    if cur.connection.server_version >= 110000:
+        clones = '''
+          AND NOT EXISTS (SELECT TRUE
+                            FROM pg_catalog.pg_constraint AS parent_constraint
+                           WHERE parent_constraint.oid = pg_constraint.conparentid
+                             AND parent_constraint.conrelid = pg_constraint.conrelid)'''
+    else:
+        clones = ''
     request = '''
        SELECT pg_constraint.oid
             , pg_namespace.nspname AS namespace
@@ -264,13 +798,14 @@ def get_foreign_keys(cur, conrelid, schemas):
         WHERE contype = 'f'
           AND conrelid = %(conrelid)s
           AND pg_namespace.nspname IN ({})
-          AND pn.nspname IN ({});
-    '''.format(quoted_and_comma_separated(schemas), quoted_and_comma_separated(schemas))
+          AND pn.nspname IN ({}){};
+    '''.format(quoted_and_comma_separated(schemas), quoted_and_comma_separated(schemas), clones)
     cur.execute(request, {'conrelid': conrelid})
     rows = fetchall_as_list_of_dict(cur)
     return rows
 
 
+@catalog_query
 def get_foreign_key_arg(cur, attrelid, attnum):
     request = '''
        SELECT attname AS attribute_name
@@ -287,6 +822,7 @@ def get_foreign_key_arg(cur, attrelid, attnum):
     return rows
 
 
+@catalog_query
 def get_constraint(cur, conrelid):
     request = '''
        SELECT pg_get_constraintdef(oid) AS constraint_source
@@ -300,6 +836,7 @@ def get_constraint(cur, conrelid):
     return rows
 
 
+@catalog_query
 def get_function_arg(cur, type_oid):
     request = '''
        SELECT nspname AS namespace
@@ -315,6 +852,7 @@ def get_function_arg(cur, type_oid):
     return rows
 
 
+@catalog_query
 def get_schemas_comment(cur, schemas):
     request = '''
        SELECT pg_catalog.obj_description(oid, 'pg_namespace') AS comment
@@ -327,11 +865,241 @@ def get_schemas_comment(cur, schemas):
     return rows
 
 
+def get_schema_filters(schemas, schema_tweaks, kind):
+    # (schema, whitelist, blacklist) of every schema for the objects of a
+    # kind ('tables', 'types'), as in the schema_tweaks of the config
+    schema_filters = list()
+    for schema in schemas:
+        tweaks = schema_tweaks.get(schema, dict())
+        schema_filters.append((schema,
+                               regex_from_json(tweaks.get(kind + '_whitelist_regex'), '^'),
+                               regex_from_json(tweaks.get(kind + '_blacklist_regex'), '^$')))
+    return schema_filters
+
+
+def execute_filtered(cur, request, schema_filters):
+    # The request joins the 'schema_filter' relation on the schema and name
+    if not schema_filters:
+        return list()
+    values = ', '.join(['(%s, %s, %s)'] * len(schema_filters))
+    parameters = [value for schema_filter in schema_filters for value in schema_filter]
+    cur.execute('WITH schema_filter (namespace, whitelist_regex, blacklist_regex) AS (VALUES {}) {}'.format(
+        values, request), parameters)
+    return fetchall_as_list_of_dict(cur)
+
+
+@catalog_query
+def get_triggers(cur, table_filters):
+    # Triggers are internal (tgisinternal) since 9.0; before, the triggers of
+    # foreign keys are constraint triggers depending on the constraint
+    if cur.connection.server_version >= 90000:
+        internal = 'tgisinternal'
+    else:
+        internal = '''tgisconstraint
+              AND EXISTS (SELECT TRUE
+                            FROM pg_catalog.pg_depend
+                            JOIN pg_catalog.pg_constraint ON (pg_constraint.oid = refobjid)
+                           WHERE classid = CAST('pg_catalog.pg_trigger' AS regclass)
+                             AND objid = pg_trigger.oid
+                             AND refclassid = CAST('pg_catalog.pg_constraint' AS regclass)
+                             AND deptype = 'i'
+                             AND contype = 'f')'''
+    # tgenabled is a boolean before 8.3
+    if cur.connection.server_version >= 80300:
+        enabled = 'tgenabled'
+    else:
+        enabled = "CASE WHEN tgenabled THEN 'O' ELSE 'D' END"
+    request = '''
+       SELECT nspname AS namespace
+            , relname AS tablename
+            , tgname AS trigger_name
+            , pg_catalog.pg_get_triggerdef(pg_trigger.oid) AS trigger_definition
+            , {} AS trigger_enabled
+            , pg_catalog.obj_description(pg_trigger.oid, 'pg_trigger') AS trigger_description
+         FROM pg_catalog.pg_trigger
+         JOIN pg_catalog.pg_class ON (pg_class.oid = tgrelid)
+         JOIN pg_catalog.pg_namespace ON (pg_namespace.oid = relnamespace)
+         JOIN schema_filter ON (schema_filter.namespace = nspname)
+        WHERE NOT ({})
+          AND relname ~ whitelist_regex
+          AND relname !~ blacklist_regex
+    '''.format(enabled, internal)
+    return execute_filtered(cur, request, table_filters)
+
+
+@catalog_query
+def get_sequences(cur, table_filters):
+    # pg_sequence exists since 10, before the parameters are only in the
+    # sequence relations themselves
+    if cur.connection.server_version >= 100000:
+        parameters = '''
+            , pg_catalog.format_type(seqtypid, NULL) AS data_type
+            , seqstart AS start_value
+            , seqincrement AS increment
+            , seqmin AS min_value
+            , seqmax AS max_value
+            , seqcache AS cache_size
+            , seqcycle AS cycle
+         FROM pg_catalog.pg_class
+         JOIN pg_catalog.pg_sequence ON (seqrelid = pg_class.oid)'''
+    else:
+        parameters = '''
+            , NULL AS data_type
+            , NULL AS start_value
+            , NULL AS increment
+            , NULL AS min_value
+            , NULL AS max_value
+            , NULL AS cache_size
+            , NULL AS cycle
+         FROM pg_catalog.pg_class'''
+    request = '''
+       SELECT nspname AS namespace
+            , pg_class.relname AS sequence_name
+            , pg_catalog.obj_description(pg_class.oid, 'pg_class') AS sequence_description
+            , owner.relname AS owner_table
+            , attname AS owner_column
+            {}
+         JOIN pg_catalog.pg_namespace ON (pg_namespace.oid = pg_class.relnamespace)
+         JOIN schema_filter ON (schema_filter.namespace = nspname)
+    LEFT JOIN pg_catalog.pg_depend ON (    classid = CAST('pg_catalog.pg_class' AS regclass)
+                                       AND objid = pg_class.oid
+                                       AND refclassid = CAST('pg_catalog.pg_class' AS regclass)
+                                       AND deptype IN ('a', 'i'))
+    LEFT JOIN pg_catalog.pg_class AS owner ON (owner.oid = refobjid)
+    LEFT JOIN pg_catalog.pg_attribute ON (    attrelid = refobjid
+                                          AND attnum = refobjsubid)
+        WHERE pg_class.relkind = 'S'
+          AND pg_class.relname ~ whitelist_regex
+          AND pg_class.relname !~ blacklist_regex
+    '''.format(parameters)
+    return execute_filtered(cur, request, table_filters)
+
+
+@catalog_query
+def get_enums(cur, type_filters):
+    # Enums exist since 8.3; before 9.1, when labels could only be added at
+    # the end, they are in the order of their oids
+    if cur.connection.server_version < 80300:
+        return list()
+    if cur.connection.server_version >= 90100:
+        sort_order = 'enumsortorder'
+    else:
+        sort_order = 'pg_enum.oid'
+    request = '''
+       SELECT nspname AS namespace
+            , typname AS type_name
+            , pg_catalog.obj_description(pg_type.oid, 'pg_type') AS type_description
+            , ARRAY(SELECT enumlabel
+                      FROM pg_catalog.pg_enum
+                     WHERE enumtypid = pg_type.oid
+                     ORDER BY {}) AS enum_labels
+         FROM pg_catalog.pg_type
+         JOIN pg_catalog.pg_namespace ON (pg_namespace.oid = typnamespace)
+         JOIN schema_filter ON (schema_filter.namespace = nspname)
+        WHERE typtype = 'e'
+          AND typname ~ whitelist_regex
+          AND typname !~ blacklist_regex
+    '''.format(sort_order)
+    return execute_filtered(cur, request, type_filters)
+
+
+@catalog_query
+def get_domains(cur, type_filters):
+    request = '''
+       SELECT nspname AS namespace
+            , typname AS type_name
+            , pg_catalog.obj_description(pg_type.oid, 'pg_type') AS type_description
+            , pg_catalog.format_type(typbasetype, typtypmod) AS base_type
+            , typnotnull AS not_null
+            , typdefault AS domain_default
+            , ARRAY(SELECT pg_catalog.pg_get_constraintdef(pg_constraint.oid)
+                      FROM pg_catalog.pg_constraint
+                     WHERE contypid = pg_type.oid
+                     ORDER BY conname) AS domain_constraints
+         FROM pg_catalog.pg_type
+         JOIN pg_catalog.pg_namespace ON (pg_namespace.oid = typnamespace)
+         JOIN schema_filter ON (schema_filter.namespace = nspname)
+        WHERE typtype = 'd'
+          AND typname ~ whitelist_regex
+          AND typname !~ blacklist_regex
+    '''
+    return execute_filtered(cur, request, type_filters)
+
+
+@catalog_query
+def get_extensions(cur):
+    # Extensions exist since 9.1
+    if cur.connection.server_version < 90100:
+        return list()
+    request = '''
+       SELECT extname AS extension_name
+            , extversion AS extension_version
+            , nspname AS namespace
+            , pg_catalog.obj_description(pg_extension.oid, 'pg_extension') AS extension_description
+         FROM pg_catalog.pg_extension
+         JOIN pg_catalog.pg_namespace ON (pg_namespace.oid = extnamespace)
+    '''
+    cur.execute(request)
+    rows = fetchall_as_list_of_dict(cur)
+    return rows
+
+
+@catalog_query
+def get_active_sessions(cur):
+    # Other sessions running a statement
+    if cur.connection.server_version < 90200:
+        return None
+    request = '''
+       SELECT count(*) AS active_sessions
+         FROM pg_catalog.pg_stat_activity
+        WHERE state = 'active'
+          AND pid <> pg_catalog.pg_backend_pid()
+    '''
+    cur.execute(request)
+    rows = fetchall_as_list_of_dict(cur)
+    return rows[0]['active_sessions']
+
+
+@catalog_query
+def get_replication_lag(cur):
+    # Seconds the slowest standby replays behind a primary, or a standby
+    # behind its primary. A standby which replayed all it received has no
+    # lag, however long ago the last transaction of an idle primary was.
+    if cur.connection.server_version < 100000:
+        return None
+    request = '''
+       SELECT CASE
+              WHEN pg_catalog.pg_is_in_recovery() THEN
+                CASE
+                WHEN pg_catalog.pg_last_wal_receive_lsn() = pg_catalog.pg_last_wal_replay_lsn() THEN 0
+                ELSE EXTRACT(EPOCH FROM now() - pg_catalog.pg_last_xact_replay_timestamp())
+                END
+              ELSE
+                (SELECT EXTRACT(EPOCH FROM max(replay_lag)) FROM pg_catalog.pg_stat_replication)
+              END AS replication_lag
+    '''
+    cur.execute(request)
+    rows = fetchall_as_list_of_dict(cur)
+    return float(rows[0]['replication_lag'] or 0)
+
+
+@catalog_query
 def get_functions(cur, schema, functions_whitelist_regex, functions_blacklist_regex):
     functions_whitelist_regex = regex_from_json(functions_whitelist_regex, '^')
     functions_blacklist_regex = regex_from_json(functions_blacklist_regex, '^$')
+    # Parallel safety exists since 9.6
+    if cur.connection.server_version >= 90600:
+        parallel = 'proparallel'
+    else:
+        parallel = 'NULL'
+    # Leakproof functions exist since 9.2
+    if cur.connection.server_version >= 90200:
+        leakproof = 'proleakproof'
+    else:
+        leakproof = 'NULL'
     request = '''
-       SELECT proname AS function_name
+       SELECT pg_proc.oid AS function_oid
+            , proname AS function_name
             , nspname AS namespace
             , lanname AS language_name
             , pg_catalog.obj_description(pg_proc.oid, 'pg_proc') AS comment
@@ -340,6 +1108,13 @@ def get_functions(cur, schema, functions_whitelist_regex, functions_blacklist_re
             , prosrc AS source_code
             , proretset AS returns_set
             , prorettype AS return_type
+            , provolatile AS volatility
+            , {} AS parallel
+            , procost AS cost
+            , prorows AS rows
+            , prosecdef AS security_definer
+            , {} AS leakproof
+            , proisstrict AS strict
          FROM pg_catalog.pg_proc
          JOIN pg_catalog.pg_language ON (pg_language.oid = prolang)
          JOIN pg_catalog.pg_namespace ON (pronamespace = pg_namespace.oid)
@@ -347,7 +1122,7 @@ def get_functions(cur, schema, functions_whitelist_regex, functions_blacklist_re
         WHERE pg_namespace.nspname = %(schema)s
           AND proname ~ %(functions_whitelist_regex)s
           AND proname !~ %(functions_blacklist_regex)s
-    '''
+    '''.format(parallel, leakproof)
     cur.execute(request, {'schema': schema,
                           'functions_whitelist_regex': functions_whitelist_regex,
                           'functions_blacklist_regex': functions_blacklist_regex})
@@ -355,7 +1130,45 @@ def get_functions(cur, schema, functions_whitelist_regex, functions_blacklist_re
     return rows
 
 
+@catalog_query
+def get_function_usage(cur, schemas):
+    # Views (through their rewrite rule) and column defaults calling the
+    # functions of the given schemas
+    request = '''
+       SELECT DISTINCT
+              refobjid AS function_oid
+            , CASE
+              WHEN classid = CAST('pg_catalog.pg_rewrite' AS regclass) THEN
+                'view'
+              ELSE
+                'default'
+              END AS usage
+            , nspname AS schemaname
+            , relname AS tablename
+            , attname AS column_name
+         FROM pg_catalog.pg_depend
+         JOIN pg_catalog.pg_proc ON (pg_proc.oid = refobjid)
+         JOIN pg_catalog.pg_namespace AS pronsp ON (pronsp.oid = pronamespace)
+    LEFT JOIN pg_catalog.pg_rewrite ON (    classid = CAST('pg_catalog.pg_rewrite' AS regclass)
+                                        AND objid = pg_rewrite.oid)
+    LEFT JOIN pg_catalog.pg_attrdef ON (    classid = CAST('pg_catalog.pg_attrdef' AS regclass)
+                                        AND objid = pg_attrdef.oid)
+         JOIN pg_catalog.pg_class ON (pg_class.oid = COALESCE(ev_class, adrelid))
+         JOIN pg_catalog.pg_namespace ON (pg_namespace.oid = relnamespace)
+    LEFT JOIN pg_catalog.pg_attribute ON (    attrelid = adrelid
+                                          AND attnum = adnum)
+        WHERE refclassid = CAST('pg_catalog.pg_proc' AS regclass)
+          AND classid IN (CAST('pg_catalog.pg_rewrite' AS regclass), CAST('pg_catalog.pg_attrdef' AS regclass))
+          AND pronsp.nspname IN ({});
+    '''.format(quoted_and_comma_separated(schemas))
+    cur.execute(request)
+    rows = fetchall_as_list_of_dict(cur)
+    return rows
+
+
 def main():
+    import psycopg2
+
     # Database Connection
     conn = psycopg2.connect(database='sandbox', user='postgres', password=1, host='localhost', port=5432)
     conn.set_client_encoding('UTF8')
@@ -376,7 +1189,7 @@ def main():
         reloid = table['oid']
         relname = table['tablename']
         schema = table['namespace']
-        if table['reltype'] == 'table':
+        if table['reltype'] == 'table' and table['relkind'] != 'p':
             table['statistics'] = get_statistics(cur, reloid)
         table['columns'] = get_columns(cur, reloid)
         table['indexes'] = get_indexes(cur, schema, relname)
@@ -0,0 +1,233 @@
+# Micro-benchmark of the helpers called for every documented object:
+#   python microbenchmark.py --save-baseline bench/micro.json
+#   python microbenchmark.py --baseline bench/micro.json
+# Baselines are only comparable on the machine and Python they were made on.
+
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+
+import postgresql_autodoc
+
+# Escaping helpers keep a memo of their results, which the cases clear before
+# every repeat so that the work is measured rather than the memo
+MEMOIZED_HELPERS = (postgresql_autodoc._html_escape, postgresql_autodoc._docbook_escape,
+                    postgresql_autodoc.graphviz, postgresql_autodoc.sgml_safe_id)
+
+CYRILLIC_WORDS = ('таблица', 'содержит', 'данные', 'аэродромов', 'маршрутов', 'обновляется', 'ежедневно',
+                  'сервисом', 'запроса', 'формуляров', 'значение', 'по', 'умолчанию')
+LATIN_WORDS = ('table', 'contains', 'the', 'data', 'of', 'routes', 'updated', 'daily', 'by', 'service', '"quoted"',
+               "it's", 'a < b', 'x > 0', 'R&D', '&amp;', 'value')
+
+
+def words(rnd, count, vocabulary):
+    return ' '.join(rnd.choice(vocabulary) for _ in range(count))
+
+
+#####
+# make_corpora
+#   Inputs of the cases, the same for every run: object names, Cyrillic and
+#   mixed descriptions, long PL/pgSQL function comments with keywords, view
+#   definitions of about 200 KB and sizes in bytes.
+def make_corpora(seed=1):
+    rnd = random.Random(seed)
+    names = list()
+    for n in range(5000):
+        names.append(rnd.choice(('sch_{}.table_{}', 'schema_{}.Таблица_{}', 'public.{} "Quoted ({})"',
+                                 'sch_{}.function_{}(integer[], text)')).format(n % 50, n))
+    texts = list()
+    for n in range(2000):
+        texts.append('{}\n{} {}'.format(words(rnd, rnd.randint(3, 30), CYRILLIC_WORDS), n,
+                                         words(rnd, rnd.randint(3, 30), LATIN_WORDS + CYRILLIC_WORDS)))
+
+    comments = list()
+    for n in range(200):
+        lines = list()
+        for line in range(rnd.randint(20, 80)):
+            if line % 10 == 0:
+                lines.append('\\param p_{} {}'.format(line, words(rnd, 8, LATIN_WORDS)))
+            elif line % 10 == 5:
+                lines.append('\\depends TABLE: sch_{}.table_{} {}'.format(n % 50, line, words(rnd, 5, CYRILLIC_WORDS)))
+            elif line % 10 == 7:
+                lines.append('\\affects SERVICE: сервис_{} {}'.format(line % 3, words(rnd, 5, CYRILLIC_WORDS)))
+            else:
+                lines.append(words(rnd, 12, LATIN_WORDS + CYRILLIC_WORDS))
+        comments.append('\n'.join(lines))
+
+    views = list()
+    for n in range(3):
+        parts = list()
+        size = 0
+        while size < 200 * 1024:
+            part = (" LEFT JOIN sch_{0}.table_{1} t{1} ON (((t{1}.id = t0.id) AND (t{1}.kind = 'кодировка (x)'::text)"
+                    " OR (t{1}.value > 0)))".format(n, len(parts) + 1))
+            parts.append(part)
+            size += len(part)
+        columns = ', '.join('t{0}.value AS value_{0}'.format(i) for i in range(1, len(parts) + 1, 7))
+        views.append(' SELECT t0.id, {} FROM (sch_{}.table_0 t0{}) WHERE (t0.id > 0) GROUP BY t0.id'
+                     ' ORDER BY t0.id UNION ALL SELECT CAST(1 AS integer);'.format(columns, n, ''.join(parts)))
+
+    sizes = [rnd.randint(0, 2 ** 50) for _ in range(5000)] + [None] * 100
+    return {'names': names, 'texts': texts, 'comments': comments, 'views': views, 'sizes': sizes}
+
+
+#####
+# comments_catalog
+#   Catalog with a function for every comment and the tables they name.
+def comments_catalog(comments):
+    struct = dict()
+    for schema in range(50):
+        for table in range(80):
+            schema_name, table_name = 'sch_{}'.format(schema), 'table_{}'.format(table)
+            postgresql_autodoc.set_table_attribute(struct, schema_name, table_name, 'TYPE', 'table')
+            postgresql_autodoc.set_table_attribute(struct, schema_name, table_name, 'DESCRIPTION', None)
+    for n, comment in enumerate(comments):
+        function = 'function_{}(integer)'.format(n)
+        postgresql_autodoc.set_function_attribute(struct, 'sch_0', function, 'NAME', 'function_{}'.format(n))
+        postgresql_autodoc.set_function_attribute(struct, 'sch_0', function, 'COMMENT', comment)
+    return {'microbenchmark': {'STRUCT': struct}}
+
+
+#####
+# parse_comments
+#   Find the keywords of the comments of the catalog the way
+#   info_postprocess() finds them.
+def parse_comments(db):
+    services = {'сервис_{}'.format(n): {'name': 'сервис_{}'.format(n), 'url': 'http://services/{}'.format(n)}
+                for n in range(3)}
+    postgresql_autodoc.CommentsParser(db, dict(), services).parse()
+    return list(db['microbenchmark']['STRUCT']['sch_0']['FUNCTION'].values())
+
+
+#####
+# make_cases
+#   Name of every case and its (setup, run) functions: run goes once over
+#   the corpus of the case, taking what setup returned, which isn't timed.
+def make_cases(corpora):
+    names, texts, comments, views, sizes = (corpora[key] for key in ('names', 'texts', 'comments', 'views', 'sizes'))
+    parsed_functions = parse_comments(comments_catalog(comments))
+
+    def each(function, values):
+        return None, lambda _: [function(value) for value in values]
+
+    return {
+        'html': each(postgresql_autodoc.html, texts + comments),
+        'docbook': each(postgresql_autodoc.docbook, texts + comments),
+        'graphviz': each(postgresql_autodoc.graphviz, names + texts),
+        'sgml_safe_id': each(postgresql_autodoc.sgml_safe_id, names),
+        'elided': (None, lambda _: [postgresql_autodoc.elided(text, 20, 20) for text in texts + names]),
+        'use_units': each(postgresql_autodoc.use_units, sizes),
+        'sql_prettyprint': each(postgresql_autodoc.sql_prettyprint, views),
+        # The parser adds the keywords to the catalog, so every run gets a new one
+        'comments_parser': (lambda: comments_catalog(comments), parse_comments),
+        'make_comment_html': (None, lambda _: [postgresql_autodoc.make_function_comment_html(
+            function_attr['COMMENT'], function_attr.get('KEYWORDS', list())) for function_attr in parsed_functions]),
+    }
+
+
+#####
+# run_case
+#   Time of one run of a case: the best of a number of repeats, which is the
+#   least disturbed by the rest of the machine. Every repeat runs the case
+#   often enough to take at least min_seconds, so that short cases aren't
+#   lost in the resolution of the clock.
+def run_case(setup, run, repeats, min_seconds=0.2):
+    def timed(loops):
+        elapsed = 0
+        for _ in range(loops):
+            argument = setup() if setup else None
+            for helper in MEMOIZED_HELPERS:
+                helper.cache_clear()
+            start = time.perf_counter()
+            run(argument)
+            elapsed += time.perf_counter() - start
+        return elapsed
+
+    loops = 1
+    elapsed = timed(loops)
+    while elapsed < min_seconds:
+        loops = loops * 2 if elapsed * 10 < min_seconds else int(loops * min_seconds / elapsed) + 1
+        elapsed = timed(loops)
+    best = elapsed
+    for _ in range(repeats - 1):
+        best = min(best, timed(loops))
+    return best / loops
+
+
+#####
+# find_regressions
+#   Cases slower than their threshold times the baseline. The baseline may
+#   hold a 'thresholds' dict with a threshold for some of the cases.
+def find_regressions(baseline, results, threshold):
+    regressions = list()
+    print('{:<20} {:>12} {:>12} {:>8}'.format('case', 'baseline, s', 'current, s', 'ratio'))
+    for case, seconds in results.items():
+        before = baseline['results'].get(case)
+        if not before:
+            print('{:<20} {:>12} {:>12.4f}'.format(case, '-', seconds))
+            continue
+        ratio = seconds / before
+        print('{:<20} {:>12.4f} {:>12.4f} {:>8.2f}'.format(case, before, seconds, ratio))
+        if ratio > baseline.get('thresholds', dict()).get(case, threshold):
+            regressions.append(case)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Time the escaping, pretty-printing and comment parsing helpers of postgresql_autodoc on fixed '
+                    'corpora, and compare them with a stored baseline.')
+    parser.add_argument('cases', metavar='<case>', nargs='*', help='Cases to run (default: all)')
+    parser.add_argument('-r', '--repeats', metavar='<count>', type=int, default=5,
+                        help='Repeats of every case, of which the best is kept (default: 5)')
+    parser.add_argument('--baseline', metavar='<json>', type=str,
+                        help='Fail when a case is slower than --threshold times its time in this baseline')
+    parser.add_argument('--threshold', metavar='<ratio>', type=float, default=1.3,
+                        help='Slowdown over the baseline counted as a regression (default: 1.3)')
+    parser.add_argument('--save-baseline', metavar='<json>', type=str, help='Write the results as a baseline')
+    args = parser.parse_args()
+
+    cases = make_cases(make_corpora())
+    unknown = [case for case in args.cases if case not in cases]
+    if unknown:
+        parser.error('unknown cases: {} (known: {})'.format(', '.join(unknown), ', '.join(cases)))
+
+    results = dict()
+    for case, (setup, run) in cases.items():
+        if args.cases and case not in args.cases:
+            continue
+        results[case] = round(run_case(setup, run, args.repeats), 6)
+        if not args.baseline:
+            print('{:<20} {:>10.4f} s'.format(case, results[case]))
+
+    if args.save_baseline is not None:
+        baseline = {'python': platform.python_version(), 'platform': platform.platform(), 'results': results}
+        if os.path.exists(args.save_baseline):
+            # Keep the thresholds tuned for some cases
+            with open(args.save_baseline) as baseline_file:
+                thresholds = json.load(baseline_file).get('thresholds')
+            if thresholds:
+                baseline['thresholds'] = thresholds
+        output_dir = os.path.dirname(args.save_baseline)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        with open(args.save_baseline, 'w') as baseline_file:
+            json.dump(baseline, baseline_file, indent=2)
+
+    if args.baseline is not None:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline.get('python') != platform.python_version():
+            print('warning: the baseline was made with Python {}'.format(baseline.get('python')))
+        regressions = find_regressions(baseline, results, args.threshold)
+        if regressions:
+            print('slower than the baseline: {}'.format(', '.join(regressions)))
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -3,22 +3,28 @@
 #   --host 192.168.12.208 -p 5432 -d radar_db -u postgres --statistics --password=123 -f output/radar_db -t html
 #
 # profiling:
+#   - --profile writes the time and memory of every phase and a trace for chrome://tracing or Perfetto
 #   - interpreter options to enable profiling: -B -m cProfile -o output.prof
 #   - pip install snakeviz
 #   - snakeviz output.prof
 
 import argparse
+import contextlib
 from datetime import datetime
+import functools
+import hashlib
 import json
 import os
-import psycopg2
 import re
 import sys
-import mako.template
-import mako.lookup
+import time
+import urllib.parse
 
 import collect_info
 
+# psycopg2, Mako and multiprocessing are imported where they are used, so
+# that short runs like '--help' don't pay for loading them.
+
 
 def elided(text, left, right):
     mid = ' ... '
@@ -94,6 +100,12 @@ def set_table_inherit(struct, schema, table, parent_schemaname, parent_tablename
         setdefault(parent_schemaname, dict())[parent_tablename] = 1
 
 
+def set_schema_object(struct, schema, kind, name, attributes):
+    struct. \
+        setdefault(schema, dict()). \
+        setdefault(kind, dict())[name] = attributes
+
+
 def set_function_attribute(struct, schema, function, name, value):
     struct. \
         setdefault(schema, dict()). \
@@ -101,32 +113,309 @@ def set_function_attribute(struct, schema, function, name, value):
         setdefault(function, dict())[name] = value
 
 
+#####
+# ProgressBar
+#    Progress of a loop over many items, refreshed at most every
+#    PROGRESS_REFRESH_SECONDS rather than for every item, with the rate and
+#    the time left. Modes:
+#      - 'bar': a line redrawn in the terminal;
+#      - 'json': a JSON object per line for programs following the run, at
+#        most every PROGRESS_EVENT_SECONDS;
+#      - 'auto': 'bar' when stdout is a terminal, else nothing;
+#      - None: nothing.
+PROGRESS_REFRESH_SECONDS = 0.2
+PROGRESS_EVENT_SECONDS = 5
+
+
 class ProgressBar:
-    def __init__(self, title, count):
+    def __init__(self, title, count, mode='auto'):
+        if mode == 'auto':
+            mode = 'bar' if sys.stdout.isatty() else None
+        self.mode = mode
         self.title = title
+        self.name = title.strip().rstrip(':')
         self.current_index = 0
         self.count = count
-        self.bar_length = 80
-        self.bar_content = self.title + '-' * self.bar_length + ' {} items to process'.format(self.count)
-        print(self.bar_content, flush=True, sep='', end='')
+        self.bar_length = 40
+        self.bar_content = ''
+        self.start = time.monotonic()
+        self.refresh_seconds = PROGRESS_EVENT_SECONDS if mode == 'json' else PROGRESS_REFRESH_SECONDS
+        self.next_refresh = self.start + self.refresh_seconds
+        if mode == 'bar':
+            self.__draw(self.title + '-' * self.bar_length + ' {} items to process'.format(self.count))
+        elif mode == 'json':
+            self.__event('start')
 
     def begin_step(self, about_item):
-        bar_left = self.current_index * self.bar_length // self.count
-        bar_right = self.bar_length - bar_left
-        self.bar_content = self.title + '=' * bar_left + '-' * bar_right + ' item {} of {} in process: {}'.format(
-            self.current_index + 1, self.count, about_item)
-        print('\r', self.bar_content, flush=True, sep='', end='')
         self.current_index += 1
+        if self.mode is None:
+            return
+        now = time.monotonic()
+        if now < self.next_refresh:
+            return
+        self.next_refresh = now + self.refresh_seconds
+        done = self.current_index - 1
+        elapsed = now - self.start
+        rate = done / elapsed if elapsed > 0 else 0
+        eta = (self.count - done) / rate if rate else None
+        if self.mode == 'json':
+            self.__event('progress', item=about_item, done=done, items_per_second=round(rate, 1),
+                         eta_seconds=round(eta) if eta is not None else None)
+            return
+        bar_left = done * self.bar_length // self.count
+        bar_right = self.bar_length - bar_left
+        self.__draw(self.title + '=' * bar_left + '-' * bar_right + ' {} of {}, {:.0f}/s, {} left: {}'.format(
+            self.current_index, self.count, rate, self.__duration(eta), elided(str(about_item), 20, 20)))
 
     def end(self):
-        self.bar_content = self.title + '=' * self.bar_length + ' all {} items processed'.format(self.count)
-        print('\r', self.bar_content, flush=True, sep='')
+        elapsed = time.monotonic() - self.start
+        if self.mode == 'bar':
+            self.__draw(self.title + '=' * self.bar_length + ' all {} items processed in {}'.format(
+                self.count, self.__duration(elapsed)))
+            print(flush=True)
+        elif self.mode == 'json':
+            self.__event('end', done=self.current_index, seconds=round(elapsed, 3))
 
     def message(self, *args, sep=' '):
-        print('\r', sep='', end='')
+        if self.mode != 'bar':
+            print(*args, sep=sep)
+            return
+        print('\r', ' ' * len(self.bar_content), '\r', sep='', end='')
         print(*args, sep=sep)
         print(self.bar_content, flush=True, sep='', end='')
 
+    def __draw(self, content):
+        # Blank the end of a longer previous line
+        print('\r', content.ljust(len(self.bar_content)), flush=True, sep='', end='')
+        self.bar_content = content
+
+    def __event(self, event, **values):
+        print(json.dumps(dict({'event': event, 'title': self.name, 'count': self.count}, **values),
+                         ensure_ascii=False), flush=True)
+
+    @staticmethod
+    def __duration(seconds):
+        if seconds is None:
+            return '?'
+        minutes, seconds = divmod(round(seconds), 60)
+        return '{}:{:02}:{:02}'.format(minutes // 60, minutes % 60, seconds)
+
+
+#####
+# Profiler
+#    Spans of a run: phases, with their wall and CPU time and the peak of
+#    Python allocations traced by tracemalloc, and the schemas, tables and
+#    templates within them. They are written as trace events which Chrome
+#    (chrome://tracing) and Perfetto (ui.perfetto.dev) display on a timeline.
+#    A disabled profiler does nothing, so the spans cost nothing normally.
+class Profiler:
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.stack = list()
+        self.events = list()
+        self.phases = list()
+        if enabled:
+            import tracemalloc
+            self.tracemalloc = tracemalloc
+            tracemalloc.start()
+            self.origin = time.perf_counter()
+
+    def begin(self, name, category='phase', **args):
+        if not self.enabled:
+            return
+        # The peak of the enclosing span is kept before restarting the peak
+        # for the new one
+        current, peak = self.tracemalloc.get_traced_memory()
+        if self.stack:
+            self.stack[-1]['peak'] = max(self.stack[-1]['peak'], peak)
+        self.tracemalloc.reset_peak()
+        self.stack.append({'name': name, 'category': category, 'args': args, 'peak': current,
+                           'wall': time.perf_counter(), 'cpu': time.process_time()})
+
+    def end(self):
+        if not self.enabled:
+            return
+        span = self.stack.pop()
+        wall = time.perf_counter() - span['wall']
+        cpu = time.process_time() - span['cpu']
+        peak = max(span['peak'], self.tracemalloc.get_traced_memory()[1])
+        self.tracemalloc.reset_peak()
+        if self.stack:
+            self.stack[-1]['peak'] = max(self.stack[-1]['peak'], peak)
+        args = dict(span['args'], cpu_seconds=round(cpu, 6), peak_traced_bytes=peak)
+        self.events.append({'name': span['name'], 'cat': span['category'], 'ph': 'X', 'pid': os.getpid(), 'tid': 0,
+                            'ts': round((span['wall'] - self.origin) * 1e6), 'dur': round(wall * 1e6),
+                            'args': args})
+        if span['category'] == 'phase':
+            self.phases.append({'name': span['name'], 'depth': len(self.stack),
+                                'start': round(span['wall'] - self.origin, 6), 'wall_seconds': round(wall, 6),
+                                'cpu_seconds': round(cpu, 6), 'peak_traced_bytes': peak})
+
+    # Begin the next of a sequence of spans of a category, ending the
+    # previous one and the spans opened within it
+    def begin_step(self, name, category, **args):
+        self.end_steps(category)
+        self.begin(name, category, **args)
+
+    def end_steps(self, category):
+        if not self.enabled:
+            return
+        if any(span['category'] == category for span in self.stack):
+            while self.stack[-1]['category'] != category:
+                self.end()
+            self.end()
+
+    @contextlib.contextmanager
+    def phase(self, name, **args):
+        self.begin(name, 'phase', **args)
+        try:
+            yield
+        finally:
+            self.end()
+
+    def summary(self):
+        # Phases in the order they began, nested ones indented
+        lines = ['  {:<48} {:>10} {:>10} {:>12}'.format('phase', 'wall, s', 'cpu, s', 'peak, MiB')]
+        for phase in sorted(self.phases, key=lambda phase: phase['start']):
+            lines.append('  {:<48} {:>10.2f} {:>10.2f} {:>12.1f}'.format(
+                elided('  ' * phase['depth'] + phase['name'], 30, 13), phase['wall_seconds'], phase['cpu_seconds'],
+                phase['peak_traced_bytes'] / 1024 / 1024))
+        return '\n'.join(lines)
+
+    def write(self, profile_filename, trace_filename):
+        while self.stack:
+            self.end()
+        self.tracemalloc.stop()
+        with open(profile_filename, 'w') as profile_file:
+            json.dump({'phases': sorted(self.phases, key=lambda phase: phase['start'])}, profile_file, indent=2)
+        with open(trace_filename, 'w') as trace_file:
+            json.dump({'traceEvents': sorted(self.events, key=lambda event: event['ts']),
+                       'displayTimeUnit': 'ms'}, trace_file)
+
+
+#####
+# CollectionCheckpoint
+#    Keeps what info_collect gathered table by table and function by function
+#    in a local file, so that a run which failed half way can be resumed.
+#    The checkpoint is saved every CHECKPOINT_SECONDS, or less often when
+#    saving it takes long, and when collection fails; it is removed once
+#    collection succeeded. It is only used when the fingerprint of the
+#    collected tables and of the options matches, the functions are only
+#    taken when their list matches too. Without a file name nothing is kept.
+CHECKPOINT_SECONDS = 30
+
+
+class CollectionCheckpoint:
+    def __init__(self, filename=None, resume=False):
+        self.filename = filename
+        self.resume = resume
+        self.saved = None
+        self.struct = None
+        self.fingerprint = None
+        self.functions_fingerprint = None
+        self.tables = set()
+        self.functions = dict()
+        self.current_table = None
+        self.interval = CHECKPOINT_SECONDS
+        self.next_save = None
+
+    def start_tables(self, fingerprint, struct):
+        self.fingerprint = fingerprint
+        self.struct = struct
+        self.next_save = time.monotonic() + self.interval
+        if self.filename is None or not self.resume or not os.path.exists(self.filename):
+            return
+        with open(self.filename) as checkpoint_file:
+            saved = json.load(checkpoint_file)
+        if saved.get('FINGERPRINT') != fingerprint:
+            print('{} was made for other tables or options, collecting from the start'.format(self.filename))
+            return
+        self.saved = saved
+        struct.update(saved['STRUCT'])
+        self.tables = set(saved['TABLES'])
+        print('resuming from {}: {} tables collected'.format(self.filename, len(self.tables)))
+
+    def start_functions(self, fingerprint):
+        self.functions_fingerprint = fingerprint
+        if self.saved is None or not self.saved.get('FUNCTIONS'):
+            return
+        if self.saved.get('FUNCTIONS_FINGERPRINT') != fingerprint:
+            # Functions collected for another list are dropped
+            for schema_attr in self.struct.values():
+                schema_attr.pop('FUNCTION', None)
+            return
+        self.functions = {oid: (schema, function) for oid, schema, function in self.saved['FUNCTIONS']}
+        print('resuming from {}: {} functions collected'.format(self.filename, len(self.functions)))
+
+    def table_collected(self, reloid):
+        return reloid in self.tables
+
+    def begin_table(self, schema, relname):
+        self.current_table = (schema, relname)
+
+    def end_table(self, reloid):
+        self.current_table = None
+        self.tables.add(reloid)
+        self.save_if_due()
+
+    def function_collected(self, function_oid):
+        return self.functions.get(function_oid)
+
+    def end_function(self, function_oid, key):
+        self.functions[function_oid] = key
+        self.save_if_due()
+
+    def save_if_due(self):
+        if time.monotonic() >= self.next_save:
+            self.save()
+
+    def save(self):
+        if self.filename is None or self.struct is None:
+            return
+        # A table whose collection failed is collected again
+        if self.current_table is not None:
+            schema, relname = self.current_table
+            self.struct.get(schema, dict()).get('TABLE', dict()).pop(relname, None)
+            self.current_table = None
+        start = time.monotonic()
+        temporary_filename = self.filename + '.tmp'
+        with open(temporary_filename, 'w') as checkpoint_file:
+            json.dump({
+                'FINGERPRINT': self.fingerprint,
+                'FUNCTIONS_FINGERPRINT': self.functions_fingerprint,
+                'TABLES': sorted(self.tables),
+                'FUNCTIONS': [[oid, schema, function] for oid, (schema, function) in self.functions.items()],
+                'STRUCT': self.struct,
+            }, checkpoint_file, cls=collect_info.PgJsonEncoder)
+        os.replace(temporary_filename, self.filename)
+        # Saving should take a small part of the run
+        self.interval = max(CHECKPOINT_SECONDS, 10 * (time.monotonic() - start))
+        self.next_save = time.monotonic() + self.interval
+
+    def remove(self):
+        if self.filename is not None and os.path.exists(self.filename):
+            os.remove(self.filename)
+
+
+# Query rate, statement timeout (ms), lock timeout (ms), other active sessions
+# and replication lag (s) of --low-impact
+LOW_IMPACT_DEFAULTS = (10, 30000, 1000, 20, 30)
+
+# Rendering processes by default. Every worker ends up with its own copy of
+# the template context, however it was shared at first, so the memory grows
+# with their number.
+MAX_DEFAULT_JOBS = 4
+
+
+#####
+# available_cpus
+#    The CPUs this process may run on, which in a container or under taskset
+#    can be fewer than those of the machine
+def available_cpus():
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
 
 def main():
     argv = sys.argv
@@ -135,6 +424,10 @@ def main():
     # The templates path
     template_path = 'templates'
 
+    # Where results worth keeping between runs are stored
+    cache_dir = os.path.join(os.getenv('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'),
+                             'pg_autodoc')
+
     # Setup the default connection variables based on the environment
     dbuser = os.getenv('PGUSER') or os.getenv('USER')
     database = os.getenv('PGDATABASE') or os.getenv('USER')
@@ -146,7 +439,11 @@ def main():
     dbpass = None
 
     wanted_output = None  # means all types
-    statistics = 0
+    jobs = min(available_cpus(), MAX_DEFAULT_JOBS)
+    statistics = None
+    column_profile = None
+    fold_partitions = 'declarative'
+    progress = 'auto'
 
     # Fetch base name
     basename = os.path.split(argv[0])[1]
@@ -181,12 +478,70 @@ def main():
                              'for tables and functions of concrete schema if required')
     parser.add_argument('-w', action="store_true",
                         help='Use ~/.pgpass for authentication (overrides all other password options)')
-    parser.add_argument('--statistics', action="store_true",
+    parser.add_argument('--statistics', nargs='?', const='full', choices=('full', 'fast'),
                         help='In 7.4 and later, with the contrib module pgstattuple installed we can gather '
                              'statistics on the tables in the database (average size, free space, disk space used, '
                              'dead tuple counts, etc.) This is disk intensive on large databases as all pages must be '
-                             'visited')
+                             'visited. With "fast" the statistics are estimated from pg_class and '
+                             'pg_stat_user_tables in a single query instead, without reading any table. Either '
+                             'also collects the row estimates, column widths and index usage of the row layout '
+                             'and unused index advice')
+    parser.add_argument('--column-profile', metavar='<count>', nargs='?', const=5, type=int,
+                        help='Document the planner statistics of the columns (null fraction, distinct values, '
+                             'average width, correlation and up to <count> most common values, default 5) from '
+                             'pg_stats, without reading any table. The most common values are data of the tables')
+    parser.add_argument('--fold-partitions', choices=('declarative', 'all', 'none'),
+                        help='Child tables which are documented only as a summary (count, bound range, total size) '
+                             'on their parent: declarative partitions, all children of table inheritance, or none '
+                             '(default: {})'.format(fold_partitions))
+    parser.add_argument('--cache-dir', metavar='<path>', type=str,
+                        help='Directory for data cached between runs: compiled templates, pretty-printed '
+                             'view definitions, rendered fragments and the manifest of the outputs, which lets '
+                             'unchanged outputs be skipped (default: {})'.format(cache_dir))
+    parser.add_argument('--no-cache', action="store_true",
+                        help='Do not read or write the cache directory')
+    parser.add_argument('--html-shards', choices=('schema', 'object'),
+                        help='Write the html output as a directory <file>_html with an index page, a page per schema '
+                             'or a page per table and function, and a search index')
+    parser.add_argument('--stream-schemas', action="store_true",
+                        help='With --html-shards, collect, postprocess and write one schema at a time, so that '
+                             'memory is bounded by the largest schema rather than the database. Schemas are '
+                             'kept in <file>_json and only the html shards are written')
+    parser.add_argument('-j', '--jobs', metavar='<count>', type=int,
+                        help='Number of processes rendering templates in parallel (default: {})'.format(jobs))
+    parser.add_argument('--progress', choices=('auto', 'bar', 'json', 'none'),
+                        help='Progress of the collection: a bar, JSON objects one per line, or nothing '
+                             '(default: auto, a bar when the output is a terminal, else nothing)')
+    parser.add_argument('--low-impact', action="store_true",
+                        help='Collect without loading a busy server: the options below default to {} queries a '
+                             'second, a statement timeout of {} ms, a lock timeout of {} ms, at most {} other '
+                             'active sessions and a replication lag of {} s'.format(*LOW_IMPACT_DEFAULTS))
+    parser.add_argument('--max-query-rate', metavar='<count>', type=float,
+                        help='Catalog queries a second at most')
+    parser.add_argument('--statement-timeout', metavar='<ms>', type=int,
+                        help='statement_timeout of the session; tables whose pgstattuple scan times out get no '
+                             'statistics, other queries which time out are retried')
+    parser.add_argument('--lock-timeout', metavar='<ms>', type=int,
+                        help='lock_timeout of the session (9.3+); sizes are then estimated from relpages')
+    parser.add_argument('--max-active-sessions', metavar='<count>', type=int,
+                        help='Pause, with a growing backoff, while more other sessions are active (9.2+)')
+    parser.add_argument('--max-replication-lag', metavar='<seconds>', type=float,
+                        help='Pause, with a growing backoff, while the replication lag is longer (10+)')
+    parser.add_argument('--max-pause', metavar='<seconds>', type=float,
+                        help='Stop pausing for --max-active-sessions and --max-replication-lag, with a warning, '
+                             'once the pauses took this long in all (default: {})'.format(
+                                 collect_info.QueryThrottle.MAX_PAUSE_SECONDS))
+    parser.add_argument('--resume', action="store_true",
+                        help='Continue a collection which failed from its checkpoint <file>.checkpoint.json, '
+                             'which is saved while collecting, if the tables and the options are the same')
+    parser.add_argument('--profile', action="store_true",
+                        help='Measure the wall and CPU time and the peak memory of every phase of the run, written '
+                             'to <file>.profile.json, with a trace of the phases, schemas, tables and templates '
+                             'for Chrome or Perfetto in <file>.trace.json. Templates are rendered in one process '
+                             'and tracing the memory slows the run down several times')
     args = parser.parse_args()
+    if args.stream_schemas and (not args.html_shards or args.type not in (None, 'html')):
+        parser.error('--stream-schemas writes only the html output, it needs --html-shards')
 
     # Set the database
     if args.d is not None:
@@ -230,6 +585,39 @@ def main():
     if args.library is not None:
         template_path = args.library
 
+    # Set the cache directory explicitly or disable caching
+    if args.cache_dir is not None:
+        cache_dir = args.cache_dir
+    if args.no_cache:
+        cache_dir = None
+
+    # Set the number of rendering processes
+    if args.jobs is not None:
+        jobs = args.jobs
+
+    # Pace the collection on a busy server
+    max_query_rate, statement_timeout, lock_timeout, max_active_sessions, max_replication_lag = (
+        LOW_IMPACT_DEFAULTS if args.low_impact else (None,) * 5)
+    if args.max_query_rate is not None:
+        max_query_rate = args.max_query_rate
+    if args.statement_timeout is not None:
+        statement_timeout = args.statement_timeout
+    if args.lock_timeout is not None:
+        lock_timeout = args.lock_timeout
+    if args.max_active_sessions is not None:
+        max_active_sessions = args.max_active_sessions
+    if args.max_replication_lag is not None:
+        max_replication_lag = args.max_replication_lag
+
+    # Set how the progress is reported
+    if args.progress is not None:
+        progress = None if args.progress == 'none' else args.progress
+
+    # Profile the run, with every template rendered in this process
+    profiler = Profiler(args.profile)
+    if args.profile:
+        jobs = 1
+
     # Set the output type
     if args.type is not None:
         wanted_output = args.type
@@ -264,8 +652,16 @@ def main():
         services_url[service_name.lower()] = {"name": service_name, "url": service_url}
 
     # Check to see if Statistics have been requested
-    if args.statistics:
-        statistics = 1
+    if args.statistics is not None:
+        statistics = args.statistics
+
+    # Check to see if column profiles have been requested
+    if args.column_profile is not None:
+        column_profile = args.column_profile
+
+    # Set which child tables are folded into their parent
+    if args.fold_partitions is not None:
+        fold_partitions = args.fold_partitions
 
     # If no arguments have been provided, connect to the database anyway but
     # inform the user of what we're doing.
@@ -280,34 +676,98 @@ def main():
         dbpass = input("Password: ")
 
     # Database Connection
+    import psycopg2
     conn = psycopg2.connect(database=database, user=dbuser, password=dbpass, host=dbhost, port=dbport)
     conn.set_client_encoding('UTF8')
 
-    info_collect(conn, db, database, schemas_whitelist_regex, schemas_blacklist_regex, schema_tweaks, statistics)
-    conn.close()
-
-    output_filename = output_filename_base + '.json'
-    with open(output_filename, 'w') as outfile:
-        json.dump(db, outfile, indent=2, cls=collect_info.PgJsonEncoder)
-
-    info_postprocess(db, layers_url, services_url)
-
-    output_filename = output_filename_base + '.postprocessed.json'
-    with open(output_filename, 'w') as outfile:
-        json.dump(db, outfile, indent=2, cls=collect_info.PgJsonEncoder)
-
-    # Write out *ALL* templates
-    write_using_templates(db, database, template_path, output_filename_base, wanted_output)
+    query_statistics = collect_info.QueryStatistics()
+    throttle = collect_info.QueryThrottle(max_query_rate, statement_timeout, lock_timeout, max_active_sessions,
+                                          max_replication_lag, args.max_pause)
+    if args.stream_schemas:
+        # One schema at a time, with only their cross references kept
+        with profiler.phase('info_collect'):
+            index = info_collect_by_schema(conn, database, output_filename_base + '_json', schemas_whitelist_regex,
+                                           schemas_blacklist_regex, schema_tweaks, statistics, fold_partitions,
+                                           column_profile, query_statistics, profiler, progress,
+                                           output_filename_base + '.checkpoint.json', args.resume, throttle)
+        conn.close()
+
+        with profiler.phase('write_by_schema'):
+            write_by_schema(index, layers_url, services_url, template_path, output_filename_base, cache_dir, jobs,
+                            args.html_shards, profiler)
+        db = index.db
+    else:
+        checkpoint = CollectionCheckpoint(output_filename_base + '.checkpoint.json', args.resume)
+        with profiler.phase('info_collect'):
+            try:
+                info_collect(conn, db, database, schemas_whitelist_regex, schemas_blacklist_regex, schema_tweaks,
+                             statistics, fold_partitions, column_profile, query_statistics, profiler, progress,
+                             checkpoint, throttle)
+            except BaseException:
+                checkpoint.save()
+                print('collection failed, run again with --resume to continue it from {}'.format(checkpoint.filename))
+                raise
+        conn.close()
+        checkpoint.remove()
+
+        output_filename = output_filename_base + '.json'
+        with profiler.phase('write ' + output_filename):
+            write_json_if_changed(db, output_filename)
+
+        with profiler.phase('info_postprocess'):
+            info_postprocess(db, layers_url, services_url, profiler)
+
+        output_filename = output_filename_base + '.postprocessed.json'
+        with profiler.phase('write ' + output_filename):
+            write_json_if_changed(db, output_filename)
+
+        # Write out *ALL* templates
+        with profiler.phase('write_using_templates'):
+            write_using_templates(db, database, template_path, output_filename_base, wanted_output, cache_dir, jobs,
+                                  args.html_shards, profiler)
+
+    output_filename = output_filename_base + '.index_advice.json'
+    write_json_if_changed(db[database]['INDEX_ADVICE'], output_filename)
+
+    output_filename = output_filename_base + '.row_layout.json'
+    write_json_if_changed(db[database]['ROW_LAYOUT'], output_filename)
+
+    output_filename = output_filename_base + '.load_order.json'
+    write_json_if_changed(db[database]['LOAD_ORDER'], output_filename)
+
+    # Time spent in the catalog queries, by query, and what the low impact
+    # mode delayed or skipped
+    query_report = query_statistics.report()
+    if throttle.enabled:
+        query_report['throttle'] = throttle.report()
+    output_filename = output_filename_base + '.queries.json'
+    with open(output_filename, 'w') as output_file:
+        json.dump(query_report, output_file, indent=2)
+    print(query_statistics.summary())
+    if throttle.enabled:
+        print(throttle.summary())
+
+    if args.profile:
+        profiler.write(output_filename_base + '.profile.json', output_filename_base + '.trace.json')
+        print(profiler.summary())
 
 
 ##
 # info_collect
 #
 # Pull out all of the applicable information about a specific database
-def info_collect(conn, db, database, schemas_whitelist_regex, schemas_blacklist_regex, schema_tweaks, statistics):
+def info_collect(conn, db, database, schemas_whitelist_regex, schemas_blacklist_regex, schema_tweaks, statistics,
+                 fold_partitions='declarative', column_profile=None, query_statistics=None, profiler=None,
+                 progress='auto', checkpoint=None, throttle=None, only_schemas=None):
     print('collecting data')
     if schema_tweaks is None:
         schema_tweaks = dict()
+    if profiler is None:
+        profiler = Profiler()
+    if checkpoint is None:
+        checkpoint = CollectionCheckpoint()
+    if throttle is None:
+        throttle = collect_info.QueryThrottle()
 
     db[database] = dict()
     struct = db[database]['STRUCT'] = dict()
@@ -336,11 +796,25 @@ def info_collect(conn, db, database, schemas_whitelist_regex, schemas_blacklist_
 
     cur = conn.cursor()
 
+    # Record every catalog query by the collect_info function running it,
+    # and pace the queries in the low impact mode
+    if throttle.enabled:
+        throttle.setup(conn, cur)
+    if query_statistics is not None or throttle.enabled:
+        if query_statistics is None:
+            query_statistics = collect_info.QueryStatistics()
+        if query_statistics.round_trip is None:
+            query_statistics.measure_round_trip(cur)
+        cur = collect_info.InstrumentedCursor(cur, query_statistics, throttle if throttle.enabled else None)
+
     # Fetch Database info
     db[database]['COMMENT'] = collect_info.get_database_description(cur, database)
 
-    # Fetch list of schemas
-    schemas = collect_info.get_schemas(cur, schemas_whitelist_regex, schemas_blacklist_regex)
+    # Fetch list of schemas. With only_schemas the others are not collected,
+    # but foreign keys and parents in any documented schema are still kept.
+    schemas = documented_schemas = collect_info.get_schemas(cur, schemas_whitelist_regex, schemas_blacklist_regex)
+    if only_schemas is not None:
+        schemas = [schema for schema in schemas if schema in only_schemas]
 
     # Fetch tables and all things bound to tables
     tables = list()
@@ -351,6 +825,19 @@ def info_collect(conn, db, database, schemas_whitelist_regex, schemas_blacklist_
             tables_blacklist_regex = schema_tweaks[schema].get('tables_blacklist_regex')
         tables += collect_info.get_tables(cur, schema, tables_whitelist_regex, tables_blacklist_regex)
 
+    # Child partitions are summarized on their parent instead of being collected one by one
+    partition_summaries = dict()
+    if fold_partitions != 'none':
+        partitions = collect_info.get_partitions(cur, schemas, throttle.estimated_sizes)
+        tables, partition_summaries = fold_child_partitions(tables, partitions, fold_partitions == 'all',
+                                                            statistics is not None)
+
+    # Estimated statistics of all tables at once
+    fast_statistics = dict()
+    if statistics == 'fast':
+        for stats in collect_info.get_fast_statistics(cur, schemas, throttle.estimated_sizes):
+            fast_statistics[stats['oid']] = stats
+
     permission_flag_to_str = {
         'a': 'INSERT',
         'r': 'SELECT',
@@ -361,7 +848,14 @@ def info_collect(conn, db, database, schemas_whitelist_regex, schemas_blacklist_
         't': 'TRIGGER',
     }
 
-    table_bar = ProgressBar('tables:    ', len(tables))
+    # Tables collected by a previous run of the same tables with the same
+    # options are taken from its checkpoint
+    checkpoint.start_tables(content_hash(
+        database, schemas, [(table['oid'], table['namespace'], table['tablename'], table['relkind'])
+                            for table in tables], statistics, fold_partitions, column_profile), struct)
+
+    profiler.begin('tables')
+    table_bar = ProgressBar('tables:    ', len(tables), progress)
     for (item_index, table) in enumerate(tables):
         table_bar.begin_step(table['tablename'])
 
@@ -369,6 +863,15 @@ def info_collect(conn, db, database, schemas_whitelist_regex, schemas_blacklist_
         relname = table['tablename']
         schema = table['namespace']
 
+        # The tables come schema by schema
+        if item_index == 0 or tables[item_index - 1]['namespace'] != schema:
+            profiler.begin_step(schema, 'schema')
+        profiler.begin_step(relname, 'table', schema=schema)
+
+        if checkpoint.table_collected(reloid):
+            continue
+        checkpoint.begin_table(schema, relname)
+
         # Store permissions
         acl = table['relacl']
 
@@ -397,9 +900,15 @@ def info_collect(conn, db, database, schemas_whitelist_regex, schemas_blacklist_
                 permission = permission_flag_to_str.setdefault(flag, 'FLAG_{}'.format(flag))  # fall back if unexpected
                 set_permission_granted(struct, schema, relname, user, permission)
 
-        # Primitive Stats, but only if requested
-        if statistics == 1 and table['reltype'] == 'table':
-            stats = collect_info.get_statistics(cur, reloid)
+        # Primitive Stats, but only if requested. pgstattuple reads the whole
+        # table, which a timeout of the low impact mode may cancel.
+        stats = None
+        if statistics == 'full' and table['reltype'] == 'table' and table['relkind'] != 'p':
+            stats = throttle.unless_timed_out(conn, '{}.{}'.format(schema, relname),
+                                              lambda: collect_info.get_statistics(cur, reloid))
+        if statistics == 'fast' and reloid in fast_statistics:
+            set_fast_statistics(struct, schema, relname, fast_statistics[reloid])
+        elif stats is not None:
             assert len(stats) == 1
             set_table_attribute(struct, schema, relname, 'HAS_STATISTICS', True)
             set_table_attribute(struct, schema, relname, 'TABLELEN', stats[0]['table_len'])
@@ -413,12 +922,23 @@ def info_collect(conn, db, database, schemas_whitelist_regex, schemas_blacklist_
         # Store the relation type
         set_table_attribute(struct, schema, relname, 'TYPE', table['reltype'])
 
+        # Store the estimated number of rows. Like the sizes and scans of the
+        # indexes and the widths of the columns, it changes with every write,
+        # so it is only kept with statistics: the documentation of a catalog
+        # which didn't change stays the same otherwise.
+        if statistics is not None:
+            set_table_attribute(struct, schema, relname, 'RELTUPLES', table['reltuples'])
+
         # Store table description
         set_table_attribute(struct, schema, relname, 'DESCRIPTION', table['table_description'])
 
         # Store the view definition
         set_table_attribute(struct, schema, relname, 'VIEW_DEF', table['view_definition'])
 
+        # Store the summary of folded partitions
+        if reloid in partition_summaries:
+            set_table_attribute(struct, schema, relname, 'PARTITIONS', partition_summaries[reloid])
+
         # Store constraints
         constraints = collect_info.get_constraint(cur, reloid)
         for constraint in constraints:
@@ -436,6 +956,8 @@ def info_collect(conn, db, database, schemas_whitelist_regex, schemas_blacklist_
             set_column_attribute(struct, schema, relname, column_name, 'NULL', column['column_null'])
             set_column_attribute(struct, schema, relname, column_name, 'DESCRIPTION', column['column_description'])
             set_column_attribute(struct, schema, relname, column_name, 'DEFAULT', column['column_default'])
+            set_column_attribute(struct, schema, relname, column_name, 'LENGTH', column['column_length'])
+            set_column_attribute(struct, schema, relname, column_name, 'ALIGN', column['column_align'])
 
         # Pull out both PRIMARY and UNIQUE keys based on the supplied query
         # and the relation OID.
@@ -480,7 +1002,7 @@ def info_collect(conn, db, database, schemas_whitelist_regex, schemas_blacklist_
         # FOREIGN KEYS like UNIQUE indexes can appear several times in
         # a table in multi-column format. We use the same trick to
         # record a numeric association to the foreign key reference.
-        foreign_keys = collect_info.get_foreign_keys(cur, reloid, schemas)
+        foreign_keys = collect_info.get_foreign_keys(cur, reloid, documented_schemas)
         fkgroup = 0
         for forcols in foreign_keys:
             column_oid = forcols['oid']
@@ -546,13 +1068,63 @@ def info_collect(conn, db, database, schemas_whitelist_regex, schemas_blacklist_
             set_index_definition(struct, schema, relname, index_name, index_definition)
 
         # Extract Inheritance information
-        inheritance = collect_info.get_inheritance(cur, schema, relname, schemas)
+        inheritance = collect_info.get_inheritance(cur, schema, relname, documented_schemas)
         for inherit in inheritance:
             parent_schemaname = inherit['par_schemaname']
             parent_tablename = inherit['par_tablename']
             set_table_inherit(struct, schema, relname, parent_schemaname, parent_tablename)
 
+        checkpoint.end_table(reloid)
+
     table_bar.end()
+    profiler.end_steps('schema')
+    profiler.end()
+
+    # Key columns, kind and usage of every index of the documented tables
+    for index in collect_info.get_index_keys(cur, schemas, throttle.estimated_sizes):
+        table_attr = struct.get(index['schemaname'], dict()).get('TABLE', dict()).get(index['tablename'])
+        if table_attr is None:
+            continue
+        key_count = index['key_count']
+        table_attr.setdefault('INDEX_KEYS', dict())[index['indexname']] = {
+            'COLUMNS': index['index_columns'][:key_count],
+            'OPCLASSES': index['index_opclasses'][:key_count],
+            'OPTIONS': index['index_options'][:key_count],
+            'UNIQUE': index['indisunique'],
+            'PRIMARY': index['indisprimary'],
+            'EXCLUSION': index['indisexclusion'],
+            'METHOD': index['index_method'],
+            'PREDICATE': index['index_predicate'],
+            'EXPRESSIONS': index['index_expressions'],
+            'SIZE': index['index_len'] if statistics is not None else None,
+            'SCANS': index['idx_scan'] if statistics is not None else None,
+        }
+
+    # Average width of the columns, for the row layout analysis with
+    # statistics, and with column_profile their data profiles, from a single
+    # scan of pg_stats
+    if column_profile is not None:
+        column_stats = collect_info.get_column_profiles(cur, schemas, column_profile)
+    elif statistics is not None:
+        column_stats = collect_info.get_column_widths(cur, schemas)
+    else:
+        column_stats = list()
+    for stats in column_stats:
+        table_attr = struct.get(stats['schemaname'], dict()).get('TABLE', dict()).get(stats['tablename'])
+        if table_attr is None or stats['column_name'] not in table_attr.get('COLUMN', dict()):
+            continue
+        set_column_attribute(struct, stats['schemaname'], stats['tablename'], stats['column_name'], 'AVG_WIDTH',
+                             stats['avg_width'])
+        if column_profile is None:
+            continue
+        most_common = list(zip(stats['most_common_vals'] or list(), stats['most_common_freqs'] or list()))
+        set_column_attribute(struct, stats['schemaname'], stats['tablename'], stats['column_name'], 'PROFILE', {
+            'NULL_FRAC': stats['null_frac'],
+            'N_DISTINCT': stats['n_distinct'],
+            'AVG_WIDTH': stats['avg_width'],
+            'CORRELATION': stats['correlation'],
+            'MOST_COMMON': [[elided(value, 25, 5), freq] for value, freq in most_common],
+        })
 
     # Function Handling
     functions = list()
@@ -563,9 +1135,20 @@ def info_collect(conn, db, database, schemas_whitelist_regex, schemas_blacklist_
             functions_blacklist_regex = schema_tweaks[schema].get('functions_blacklist_regex')
         functions += collect_info.get_functions(cur, schema, functions_whitelist_regex, functions_blacklist_regex)
 
-    function_bar = ProgressBar('functions: ', len(functions))
+    function_volatility = {'i': 'immutable', 's': 'stable', 'v': 'volatile'}
+    function_parallel = {'s': 'safe', 'r': 'restricted', 'u': 'unsafe'}
+    function_keys = dict()
+
+    checkpoint.start_functions(content_hash([function['function_oid'] for function in functions]))
+
+    profiler.begin('functions')
+    function_bar = ProgressBar('functions: ', len(functions), progress)
     for function_index, function in enumerate(functions):
         function_bar.begin_step(function['function_name'])
+        function_key = checkpoint.function_collected(function['function_oid'])
+        if function_key is not None:
+            function_keys[function['function_oid']] = function_key
+            continue
         schema = function['namespace']
         comment = function['comment']
         functionargs = function['function_args']
@@ -597,8 +1180,91 @@ def info_collect(conn, db, database, schemas_whitelist_regex, schemas_blacklist_
         set_function_attribute(struct, schema, functionname, 'SOURCE', function['source_code'])
         set_function_attribute(struct, schema, functionname, 'LANGUAGE', function['language_name'])
         set_function_attribute(struct, schema, functionname, 'RETURNS', ret_type)
+        set_function_attribute(struct, schema, functionname, 'VOLATILITY', function_volatility[function['volatility']])
+        set_function_attribute(struct, schema, functionname, 'PARALLEL', function_parallel.get(function['parallel']))
+        set_function_attribute(struct, schema, functionname, 'COST', function['cost'])
+        set_function_attribute(struct, schema, functionname, 'ROWS', function['rows'])
+        set_function_attribute(struct, schema, functionname, 'SECURITY_DEFINER', function['security_definer'])
+        set_function_attribute(struct, schema, functionname, 'LEAKPROOF', function['leakproof'])
+        set_function_attribute(struct, schema, functionname, 'STRICT', function['strict'])
+        function_keys[function['function_oid']] = (schema, functionname)
+        checkpoint.end_function(function['function_oid'], (schema, functionname))
 
     function_bar.end()
+    profiler.end()
+
+    # Views and column defaults calling the documented functions. They are
+    # collected afresh, a checkpoint saved after this pass has them already
+    for schema, functionname in function_keys.values():
+        struct[schema]['FUNCTION'][functionname].pop('USED_BY', None)
+    for usage in collect_info.get_function_usage(cur, schemas):
+        if usage['function_oid'] not in function_keys:
+            continue
+        schema, functionname = function_keys[usage['function_oid']]
+        struct[schema]['FUNCTION'][functionname].setdefault('USED_BY', list()).append({
+            'TYPE': usage['usage'],
+            'SCHEMA': usage['schemaname'],
+            'TABLE': usage['tablename'],
+            'COLUMN': usage['column_name'],
+        })
+    for schema, functionname in function_keys.values():
+        struct[schema]['FUNCTION'][functionname].get('USED_BY', list()).sort(
+            key=lambda usage: (usage['SCHEMA'], usage['TABLE'], usage['TYPE'], usage['COLUMN'] or ''))
+
+    # Triggers, sequences, enums and domains: one query per kind for all
+    # the schemas, filtered like tables (triggers, sequences) or with the
+    # types_whitelist_regex and types_blacklist_regex of the schema tweaks
+    table_filters = collect_info.get_schema_filters(schemas, schema_tweaks, 'tables')
+    type_filters = collect_info.get_schema_filters(schemas, schema_tweaks, 'types')
+
+    trigger_enabled = {'O': 'enabled', 'D': 'disabled', 'R': 'replica', 'A': 'always'}
+    for trigger in collect_info.get_triggers(cur, table_filters):
+        table_attr = struct.get(trigger['namespace'], dict()).get('TABLE', dict()).get(trigger['tablename'])
+        if table_attr is None:
+            continue
+        table_attr.setdefault('TRIGGER', dict())[trigger['trigger_name']] = {
+            'DEFINITION': trigger['trigger_definition'],
+            'ENABLED': trigger_enabled.get(trigger['trigger_enabled'], trigger['trigger_enabled']),
+            'DESCRIPTION': trigger['trigger_description'],
+        }
+
+    for sequence in collect_info.get_sequences(cur, table_filters):
+        set_schema_object(struct, sequence['namespace'], 'SEQUENCE', sequence['sequence_name'], {
+            'DESCRIPTION': sequence['sequence_description'],
+            'OWNER_TABLE': sequence['owner_table'],
+            'OWNER_COLUMN': sequence['owner_column'],
+            'DATA_TYPE': sequence['data_type'],
+            'START': sequence['start_value'],
+            'INCREMENT': sequence['increment'],
+            'MIN': sequence['min_value'],
+            'MAX': sequence['max_value'],
+            'CACHE': sequence['cache_size'],
+            'CYCLE': sequence['cycle'],
+        })
+
+    for enum in collect_info.get_enums(cur, type_filters):
+        set_schema_object(struct, enum['namespace'], 'ENUM', enum['type_name'], {
+            'DESCRIPTION': enum['type_description'],
+            'LABELS': enum['enum_labels'],
+        })
+
+    for domain in collect_info.get_domains(cur, type_filters):
+        set_schema_object(struct, domain['namespace'], 'DOMAIN', domain['type_name'], {
+            'DESCRIPTION': domain['type_description'],
+            'BASE_TYPE': domain['base_type'],
+            'NOT_NULL': domain['not_null'],
+            'DEFAULT': domain['domain_default'],
+            'CONSTRAINTS': domain['domain_constraints'],
+        })
+
+    # Extensions belong to the whole database
+    extensions = db[database]['EXTENSION'] = dict()
+    for extension in collect_info.get_extensions(cur):
+        extensions[extension['extension_name']] = {
+            'VERSION': extension['extension_version'],
+            'SCHEMA': extension['namespace'],
+            'DESCRIPTION': extension['extension_description'],
+        }
 
     # Deal with the Schema
     schema_comments = collect_info.get_schemas_comment(cur, schemas)
@@ -610,6 +1276,284 @@ def info_collect(conn, db, database, schemas_whitelist_regex, schemas_blacklist_
     cur.close()
 
 
+#####
+# CrossReferenceIndex
+#    What the pages of one schema need of the others when the database is
+#    collected and written schema by schema. db has the shape of a collected
+#    database, but of every table its STRUCT keeps only the type, the order
+#    of the columns and the foreign keys, and of every function the name; the
+#    \depends and \affects keywords are added as the comments are parsed.
+#    ObjectRegistry, ForeignKeyIndex, CommentsParser.parse_part(),
+#    DependenciesInvestigator and LoadOrderPlanner take it for the whole
+#    database. files is the file every schema was collected to.
+class CrossReferenceIndex:
+    def __init__(self, database):
+        self.database = database
+        self.db = {database: {'STRUCT': dict()}}
+        self.files = dict()
+
+    def add_schemas(self, db, filename):
+        database_attr = self.db[self.database]
+        database_attr['COMMENT'] = db[self.database]['COMMENT']
+        database_attr['EXTENSION'] = db[self.database]['EXTENSION']
+        for schema, schema_attr in db[self.database]['STRUCT'].items():
+            self.files[schema] = filename
+            index_attr = database_attr['STRUCT'][schema] = dict()
+            for table, table_attr in schema_attr.get('TABLE', dict()).items():
+                columns = dict()
+                for column, column_attr in table_attr.get('COLUMN', dict()).items():
+                    columns[column] = {'ORDER': column_attr['ORDER']}
+                    foreign_keys = {con: con_attr for con, con_attr in column_attr.get('CON', dict()).items()
+                                    if con_attr['TYPE'] == 'FOREIGN KEY'}
+                    if foreign_keys:
+                        columns[column]['CON'] = foreign_keys
+                index_attr.setdefault('TABLE', dict())[table] = {'TYPE': table_attr['TYPE'], 'COLUMN': columns}
+            for function, function_attr in schema_attr.get('FUNCTION', dict()).items():
+                index_attr.setdefault('FUNCTION', dict())[function] = {'NAME': function_attr['NAME']}
+
+    def add_keywords(self, db):
+        struct = self.db[self.database]['STRUCT']
+        for schema, schema_attr in db[self.database]['STRUCT'].items():
+            for kind in ('TABLE', 'FUNCTION'):
+                for name, attr in schema_attr.get(kind, dict()).items():
+                    keywords = [keyword for keyword in attr.get('KEYWORDS', list())
+                                if keyword['NAME'] in ('\\depends', '\\affects')]
+                    if keywords:
+                        struct[schema][kind][name]['KEYWORDS'] = keywords
+
+
+#####
+# info_collect_by_schema
+#    Collects the documented schemas one at a time with info_collect() and
+#    writes every one to <output_dir>/<schema>.json, so that only the schema
+#    being collected and the CrossReferenceIndex of the others are held in
+#    memory. Collected schemas are listed in <output_dir>/collected.jsonl,
+#    after the fingerprint of the options; with resume the schemas a previous
+#    run with the same options collected are read back from their files.
+def info_collect_by_schema(conn, database, output_dir, schemas_whitelist_regex, schemas_blacklist_regex, schema_tweaks,
+                           statistics, fold_partitions='declarative', column_profile=None, query_statistics=None,
+                           profiler=None, progress='auto', checkpoint_filename=None, resume=False, throttle=None):
+    os.makedirs(output_dir, exist_ok=True)
+    cur = conn.cursor()
+    schemas = sorted(collect_info.get_schemas(cur, schemas_whitelist_regex, schemas_blacklist_regex))
+    cur.close()
+
+    collected_filename = os.path.join(output_dir, 'collected.jsonl')
+    fingerprint = content_hash(database, schema_tweaks, statistics, fold_partitions, column_profile)
+    collected = set()
+    if resume and os.path.exists(collected_filename):
+        with open(collected_filename) as collected_file:
+            lines = collected_file.read().splitlines()
+        if lines and json.loads(lines[0]) == fingerprint:
+            for line in lines[1:]:
+                # The last line may have been cut by a failure
+                with contextlib.suppress(ValueError):
+                    collected.add(json.loads(line))
+        else:
+            print('{} was made for other options, collecting from the start'.format(collected_filename))
+    if collected:
+        print('resuming from {}: {} schemas collected'.format(collected_filename, len(collected)))
+    else:
+        with open(collected_filename, 'w') as collected_file:
+            collected_file.write(json.dumps(fingerprint) + '\n')
+
+    index = CrossReferenceIndex(database)
+    for schema_index, schema in enumerate(schemas):
+        filename = os.path.join(output_dir, urllib.parse.quote(schema, safe='') + '.json')
+        if schema in collected and os.path.exists(filename):
+            with open(filename) as schema_file:
+                index.add_schemas(json.load(schema_file), filename)
+            continue
+
+        print('schema {} of {}: {}'.format(schema_index + 1, len(schemas), schema))
+        db = dict()
+        checkpoint = CollectionCheckpoint(checkpoint_filename, resume)
+        try:
+            info_collect(conn, db, database, schemas_whitelist_regex, schemas_blacklist_regex, schema_tweaks,
+                         statistics, fold_partitions, column_profile, query_statistics, profiler, progress,
+                         checkpoint, throttle, only_schemas=[schema])
+        except BaseException:
+            checkpoint.save()
+            print('collection of schema {} failed, run again with --resume to continue it'.format(schema))
+            raise
+        checkpoint.remove()
+        write_json_if_changed(db, filename)
+        index.add_schemas(db, filename)
+        with open(collected_filename, 'a') as collected_file:
+            collected_file.write(json.dumps(schema) + '\n')
+    return index
+
+
+#####
+# set_fast_statistics
+#    Statistics of the fast tier. The live and dead tuple counts of the
+#    statistics collector (or reltuples if the table was never analyzed)
+#    split the size of the table, so TUPLELEN and DEADTUPLELEN include
+#    the page overhead and FREELEN is unknown.
+def set_fast_statistics(struct, schema, relname, stats):
+    live_tuples = stats['n_live_tup']
+    if live_tuples is None:
+        live_tuples = max(int(stats['reltuples']), 0)
+    dead_tuples = stats['n_dead_tup'] or 0
+    table_len = stats['table_len']
+    tuple_len = dead_tuple_len = 0
+    if live_tuples + dead_tuples > 0:
+        tuple_len = table_len * live_tuples // (live_tuples + dead_tuples)
+        dead_tuple_len = table_len - tuple_len
+
+    set_table_attribute(struct, schema, relname, 'HAS_STATISTICS', True)
+    set_table_attribute(struct, schema, relname, 'STATISTICS_TIER', 'fast')
+    set_table_attribute(struct, schema, relname, 'TABLELEN', table_len)
+    set_table_attribute(struct, schema, relname, 'TUPLECOUNT', live_tuples)
+    set_table_attribute(struct, schema, relname, 'TUPLELEN', tuple_len)
+    set_table_attribute(struct, schema, relname, 'DEADTUPLELEN', dead_tuple_len)
+    set_table_attribute(struct, schema, relname, 'FREELEN', None)
+    set_table_attribute(struct, schema, relname, 'DEADTUPLECOUNT', dead_tuples)
+    set_table_attribute(struct, schema, relname, 'PAGECOUNT', stats['relpages'])
+    set_table_attribute(struct, schema, relname, 'TOTALLEN', stats['total_len'])
+    set_table_attribute(struct, schema, relname, 'TOASTLEN', stats['toast_len'])
+    set_table_attribute(struct, schema, relname, 'INDEXLEN', stats['index_len'])
+    set_table_attribute(struct, schema, relname, 'LAST_VACUUM', stats['last_vacuum'])
+    set_table_attribute(struct, schema, relname, 'LAST_ANALYZE', stats['last_analyze'])
+
+
+#####
+# function_attributes_text
+#    Performance relevant attributes of a function, written the way
+#    CREATE FUNCTION takes them
+def function_attributes_text(function_attr):
+    if 'VOLATILITY' not in function_attr:
+        return None
+    attributes = [function_attr['VOLATILITY'].upper()]
+    if function_attr['PARALLEL'] is not None:
+        attributes.append('PARALLEL ' + function_attr['PARALLEL'].upper())
+    if function_attr['STRICT']:
+        attributes.append('STRICT')
+    if function_attr['SECURITY_DEFINER']:
+        attributes.append('SECURITY DEFINER')
+    if function_attr['LEAKPROOF']:
+        attributes.append('LEAKPROOF')
+    attributes.append('COST {:g}'.format(function_attr['COST']))
+    if function_attr['ROWS']:
+        attributes.append('ROWS {:g}'.format(function_attr['ROWS']))
+    return ' '.join(attributes)
+
+
+#####
+# column_profile_text
+#    One line summary of the PROFILE of a column
+def column_profile_text(profile):
+    if profile is None:
+        return None
+    n_distinct = profile['N_DISTINCT']
+    if n_distinct == -1:
+        distinct = 'unique'
+    elif n_distinct < 0:
+        distinct = '{:.1%} distinct'.format(-n_distinct)
+    else:
+        distinct = '{:g} distinct'.format(n_distinct)
+    parts = ['{:.1%} null'.format(profile['NULL_FRAC']), distinct, 'width {}'.format(profile['AVG_WIDTH'])]
+    if profile['CORRELATION'] is not None:
+        parts.append('correlation {:.2f}'.format(profile['CORRELATION']))
+    if profile['MOST_COMMON']:
+        parts.append('most common: ' + ', '.join('{} ({:.1%})'.format(value, freq)
+                                                for value, freq in profile['MOST_COMMON']))
+    return ', '.join(parts)
+
+
+_PARTITION_RANGE_RE = re.compile(r'^FOR VALUES FROM \((.*)\) TO \((.*)\)$')
+
+
+def partition_bound_key(value):
+    if value == 'MINVALUE':
+        return 0, 0, ''
+    if value == 'MAXVALUE':
+        return 2, 0, ''
+    value = value.strip("'")
+    try:
+        return 1, float(value), ''
+    except ValueError:
+        return 1, 0, value
+
+
+#####
+# partition_bound_range
+#    Lowest and highest values covered by a set of range partition bounds,
+#    or None if none of the bounds is a range.
+def partition_bound_range(bounds):
+    lower = upper = None
+    for bound in bounds:
+        match = _PARTITION_RANGE_RE.match(bound or '')
+        if match is None:
+            continue
+        if lower is None or partition_bound_key(match.group(1)) < partition_bound_key(lower):
+            lower = match.group(1)
+        if upper is None or partition_bound_key(match.group(2)) > partition_bound_key(upper):
+            upper = match.group(2)
+    if lower is None:
+        return None
+    return lower, upper
+
+
+#####
+# fold_child_partitions
+#    Declarative partitions, and with fold_inherited every child of table
+#    inheritance, are dropped from the tables to collect. Their topmost
+#    documented ancestor gets a summary instead: number and total size of
+#    the leaf partitions, partition key and range of the bounds. Children
+#    of multiple inheritance and children without a documented ancestor
+#    are kept. Without sizes the total size is None.
+def fold_child_partitions(tables, partitions, fold_inherited, sizes=True):
+    documented = set(table['oid'] for table in tables)
+    parents = dict()
+    for partition in partitions:
+        parents.setdefault(partition['chl_oid'], list()).append(partition)
+
+    def foldable(oid):
+        rows = parents.get(oid)
+        return rows is not None and len(rows) == 1 and (rows[0]['declarative'] or fold_inherited)
+
+    summaries = dict()
+    bounds = dict()
+    folded = set()
+    for oid in sorted(parents):
+        root = None
+        ancestor = oid
+        while foldable(ancestor):
+            ancestor = parents[ancestor][0]['par_oid']
+            if ancestor in documented:
+                root = ancestor
+        if root is None:
+            continue
+
+        partition = parents[oid][0]
+        folded.add(oid)
+        summary = summaries.setdefault(root, {
+            'COUNT': 0,
+            'SIZE': 0 if sizes else None,
+            'KEY': None,
+            'HAS_DEFAULT': False,
+            'BOUND_FROM': None,
+            'BOUND_TO': None,
+        })
+        if partition['chl_relkind'] != 'p':
+            summary['COUNT'] += 1
+            if sizes:
+                summary['SIZE'] += partition['total_size']
+        if partition['par_oid'] == root:
+            summary['KEY'] = partition['partition_key']
+            if partition['partition_bound'] == 'DEFAULT':
+                summary['HAS_DEFAULT'] = True
+            bounds.setdefault(root, list()).append(partition['partition_bound'])
+
+    for root, summary in summaries.items():
+        bound_range = partition_bound_range(bounds.get(root, list()))
+        if bound_range is not None:
+            summary['BOUND_FROM'], summary['BOUND_TO'] = bound_range
+
+    return [table for table in tables if table['oid'] not in folded], summaries
+
+
 class CommentsParser:
     def __init__(self, db, layers_url, services_url):
         self.db = db
@@ -620,7 +1564,17 @@ class CommentsParser:
 
     def parse(self):
         self.__collect_objects()
-        self.__parse_and_analyse_comments()
+        self.__parse_and_analyse_comments(self.db)
+
+    #####
+    # parse_part
+    #    Parses the comments of a part of the database, such as one schema,
+    #    with the same databases as self.db, whose objects are the targets
+    #    the keywords are looked up in. They are collected once.
+    def parse_part(self, part_db):
+        if not self.tables:
+            self.__collect_objects()
+        self.__parse_and_analyse_comments(part_db)
 
     def __collect_objects(self):
         for database in self.db:
@@ -639,9 +1593,9 @@ class CommentsParser:
                 for function in sorted(src_functions.keys(), reverse=True):
                     schema_functions[src_functions[function]['NAME']] = function
 
-    def __parse_and_analyse_comments(self):
-        for database in self.db:
-            schemas = self.db[database]['STRUCT']
+    def __parse_and_analyse_comments(self, db):
+        for database in db:
+            schemas = db[database]['STRUCT']
             for schema, schema_attr in schemas.items():
                 # .. tables
                 tables = schema_attr.get('TABLE', dict())
@@ -865,32 +1819,419 @@ class DependenciesInvestigator:
                 self.__add_childs(dependencies, child_node)
 
 
-def info_postprocess(db, layers_url, services_url):
+#####
+# IndexAdvisor
+#    Cross-references the foreign keys and the INDEX_KEYS of every table:
+#      MISSING_FK_INDEXES -> foreign keys whose columns are not the leading
+#                            columns of any plain btree index, so cascades
+#                            and key locks on the referenced table scan it
+#      REDUNDANT_INDEXES  -> indexes equal to another one, or whose columns
+#                            are a prefix of another index of the same kind
+#      UNUSED_INDEXES     -> indexes never scanned since the statistics were
+#                            reset, which don't enforce a constraint
+#    Every index is only looked up by its column lists, so the cost is linear
+#    in the number of index and foreign key columns.
+class IndexAdvisor:
+    SECTIONS = ('MISSING_FK_INDEXES', 'REDUNDANT_INDEXES', 'UNUSED_INDEXES')
+
+    def __init__(self, db):
+        self.db = db
+
+    def advise(self):
+        for database in self.db:
+            advice = self.db[database]['INDEX_ADVICE'] = {section: list() for section in self.SECTIONS}
+            schemas = self.db[database]['STRUCT']
+            for schema in sorted(schemas):
+                tables = schemas[schema].get('TABLE', dict())
+                for table in sorted(tables):
+                    self.__advise_table(schema, table, tables[table], advice)
+
+    @staticmethod
+    def __foreign_keys(table_attr):
+        foreign_keys = dict()
+        for column, column_attr in table_attr.get('COLUMN', dict()).items():
+            for con, con_attr in column_attr.get('CON', dict()).items():
+                if con_attr['TYPE'] == 'FOREIGN KEY':
+                    foreign_keys.setdefault(con, list()).append((con_attr['COLNUM'], column, con_attr))
+        return foreign_keys
+
+    def __advise_table(self, schema, table, table_attr, advice):
+        index_keys = table_attr.get('INDEX_KEYS', dict())
+
+        # Constraint enforcing indexes first, so that they are the ones kept
+        def keep_order(index):
+            index_attr = index_keys[index]
+            return not index_attr['PRIMARY'], not index_attr['UNIQUE'], not index_attr['EXCLUSION'], index
+        indexes = sorted(index_keys, key=keep_order)
+
+        # Every set of leading columns of a plain btree index
+        leading_columns = dict()
+        for index in indexes:
+            index_attr = index_keys[index]
+            if index_attr['METHOD'] != 'btree' or index_attr['PREDICATE'] is not None:
+                continue
+            for length in range(1, len(index_attr['COLUMNS']) + 1):
+                columns = index_attr['COLUMNS'][:length]
+                if None in columns:
+                    break
+                leading_columns.setdefault(frozenset(columns), index)
+
+        supporting_indexes = set()
+        foreign_keys = self.__foreign_keys(table_attr)
+        for con in sorted(foreign_keys):
+            key_columns = [column for _, column, _ in sorted(foreign_keys[con])]
+            index = leading_columns.get(frozenset(key_columns))
+            if index is not None:
+                supporting_indexes.add(index)
+                continue
+            con_attr = foreign_keys[con][0][2]
+            advice['MISSING_FK_INDEXES'].append({
+                'SCHEMA': schema,
+                'TABLE': table,
+                'CONSTRAINT': con,
+                'COLUMNS': key_columns,
+                'REFERENCED_SCHEMA': con_attr['FKSCHEMA'],
+                'REFERENCED_TABLE': con_attr['FKTABLE'],
+            })
+
+        # Indexes by their full key and by every strict prefix of their key
+        full_keys = dict()
+        prefix_keys = dict()
+        for index in indexes:
+            index_attr = index_keys[index]
+            kind = (index_attr['METHOD'], index_attr['PREDICATE'], index_attr['EXPRESSIONS'])
+            # Columns with a different operator class, or order (DESC, NULLS FIRST), don't match
+            key = tuple(zip(index_attr['COLUMNS'], index_attr['OPCLASSES'], index_attr['OPTIONS']))
+            if (kind, key) in full_keys:
+                redundant_to = full_keys[(kind, key)]
+            else:
+                full_keys[(kind, key)] = index
+                redundant_to = None
+                if index_attr['METHOD'] == 'btree' and index_attr['EXPRESSIONS'] is None:
+                    for length in range(1, len(key)):
+                        prefix_keys.setdefault((kind, key[:length]), index)
+            if redundant_to is not None and not index_attr['PRIMARY'] and not index_attr['EXCLUSION']:
+                self.__add_redundant(advice, schema, table, index, index_attr, redundant_to, 'DUPLICATE')
+
+        for index in indexes:
+            index_attr = index_keys[index]
+            if index_attr['UNIQUE'] or index_attr['EXCLUSION']:
+                continue
+            kind = (index_attr['METHOD'], index_attr['PREDICATE'], index_attr['EXPRESSIONS'])
+            key = tuple(zip(index_attr['COLUMNS'], index_attr['OPCLASSES'], index_attr['OPTIONS']))
+            if full_keys[(kind, key)] == index and (kind, key) in prefix_keys:
+                self.__add_redundant(advice, schema, table, index, index_attr, prefix_keys[(kind, key)], 'PREFIX')
+
+        for index in sorted(index_keys):
+            index_attr = index_keys[index]
+            # Indexes enforcing a constraint are never worth dropping
+            if index_attr['SCANS'] != 0 or index_attr['UNIQUE'] or index_attr['PRIMARY'] or index_attr['EXCLUSION']:
+                continue
+            advice['UNUSED_INDEXES'].append({
+                'SCHEMA': schema,
+                'TABLE': table,
+                'INDEX': index,
+                'SIZE': index_attr['SIZE'],
+                'SUPPORTS_FOREIGN_KEY': index in supporting_indexes,
+            })
+
+    @staticmethod
+    def __add_redundant(advice, schema, table, index, index_attr, redundant_to, reason):
+        advice['REDUNDANT_INDEXES'].append({
+            'SCHEMA': schema,
+            'TABLE': table,
+            'INDEX': index,
+            'COLUMNS': index_attr['COLUMNS'],
+            'REDUNDANT_TO': redundant_to,
+            'REASON': reason,
+            'SIZE': index_attr['SIZE'],
+        })
+
+
+#####
+# RowLayoutAnalyzer
+#    Estimates the bytes every row of a table loses to alignment padding
+#    between its columns in their current order, and what the row would
+#    take with the fixed width columns ordered by decreasing alignment
+#    ahead of the variable width ones. The difference scaled by reltuples
+#    ranks the tables worth rewriting (ROW_LAYOUT, largest savings first).
+#    Variable width values are counted with their average width from
+#    pg_stats; values shorter than 127 bytes are stored with a one byte
+#    header and are not aligned.
+ROW_ALIGNMENT = {'c': 1, 's': 2, 'i': 4, 'd': 8}
+ROW_MAXALIGN = 8
+
+
+class RowLayoutAnalyzer:
+    def __init__(self, db):
+        self.db = db
+
+    def analyze(self):
+        for database in self.db:
+            layouts = list()
+            schemas = self.db[database]['STRUCT']
+            for schema in sorted(schemas):
+                tables = schemas[schema].get('TABLE', dict())
+                for table in sorted(tables):
+                    layout = self.__analyze_table(schema, table, tables[table])
+                    if layout is not None:
+                        layouts.append(layout)
+            self.db[database]['ROW_LAYOUT'] = self.rank(layouts)
+
+    @staticmethod
+    def rank(layouts):
+        return sorted(layouts, key=lambda layout: (-layout['ESTIMATED_SAVINGS'], -layout['SAVED_PER_ROW']))
+
+    @staticmethod
+    def __column_layout(column_attr):
+        length = column_attr.get('LENGTH')
+        if length is None:
+            return None
+        if length > 0:
+            return length, ROW_ALIGNMENT[column_attr['ALIGN']], True
+        width = column_attr.get('AVG_WIDTH')
+        if width is None:
+            return None
+        if length == -1 and width < 127:
+            return width, 1, False
+        return width, ROW_ALIGNMENT[column_attr['ALIGN']], False
+
+    @staticmethod
+    def __row_width(layouts):
+        offset = padding = 0
+        for width, alignment, _ in layouts:
+            aligned = -(-offset // alignment) * alignment
+            padding += aligned - offset
+            offset = aligned + width
+        return -(-offset // ROW_MAXALIGN) * ROW_MAXALIGN, padding
+
+    def __analyze_table(self, schema, table, table_attr):
+        # Without statistics there are no rows to rank the tables by
+        if table_attr['TYPE'] != 'table' or 'COLUMN' not in table_attr or 'RELTUPLES' not in table_attr:
+            return None
+        columns = sorted(table_attr['COLUMN'].items(), key=lambda column: column[1]['ORDER'])
+        layouts = list()
+        for column, column_attr in columns:
+            layout = self.__column_layout(column_attr)
+            if layout is None:
+                return None
+            layouts.append((column, layout))
+
+        row_width, padding = self.__row_width([layout for _, layout in layouts])
+        optimal = sorted(layouts, key=lambda column: (not column[1][2], -column[1][1]))
+        optimal_row_width, optimal_padding = self.__row_width([layout for _, layout in optimal])
+        saved_per_row = row_width - optimal_row_width
+        if saved_per_row <= 0:
+            return None
+        reltuples = max(int(table_attr['RELTUPLES'] or 0), 0)
+        return {
+            'SCHEMA': schema,
+            'TABLE': table,
+            'ROW_WIDTH': row_width,
+            'PADDING': padding,
+            'OPTIMAL_ROW_WIDTH': optimal_row_width,
+            'OPTIMAL_PADDING': optimal_padding,
+            'OPTIMAL_ORDER': [column for column, _ in optimal],
+            'SAVED_PER_ROW': saved_per_row,
+            'RELTUPLES': reltuples,
+            'ESTIMATED_SAVINGS': saved_per_row * reltuples,
+        }
+
+
+#####
+# LoadOrderPlanner
+#    Orders the tables by their foreign keys for bulk loading (LOAD_ORDER)
+#    and truncating (TRUNCATE_ORDER, the reverse). Tables referencing each
+#    other in a cycle form one strongly connected component, which has to
+#    be loaded with the listed constraints deferred or disabled. WAVES groups
+#    the tables whose referenced tables are all loaded by earlier waves, so
+#    the tables of a wave can be loaded concurrently; SCHEMAS has the same
+#    plan per schema. Tables are [schema, table] pairs, foreign keys to
+#    tables which are not documented are ignored.
+class LoadOrderPlanner:
+    def __init__(self, db):
+        self.db = db
+
+    def plan(self):
+        for database in self.db:
+            self.db[database]['LOAD_ORDER'] = self.__plan(self.db[database]['STRUCT'])
+
+    @staticmethod
+    def __references(struct):
+        tables = list()
+        references = dict()
+        for schema in sorted(struct):
+            schema_tables = struct[schema].get('TABLE', dict())
+            for table in sorted(schema_tables):
+                if schema_tables[table]['TYPE'] == 'table':
+                    tables.append((schema, table))
+                    references[(schema, table)] = dict()
+        for schema, table in tables:
+            for column_attr in struct[schema]['TABLE'][table].get('COLUMN', dict()).values():
+                for con, con_attr in column_attr.get('CON', dict()).items():
+                    if con_attr['TYPE'] != 'FOREIGN KEY':
+                        continue
+                    referenced = (con_attr['FKSCHEMA'], con_attr['FKTABLE'])
+                    if referenced in references:
+                        references[(schema, table)].setdefault(referenced, set()).add(con)
+        return tables, references
+
+    @staticmethod
+    def __components(tables, references):
+        # Tarjan's algorithm without recursion; components come out with
+        # the referenced ones first
+        index = dict()
+        lowlink = dict()
+        stack = list()
+        on_stack = set()
+        components = list()
+        for root in tables:
+            if root in index:
+                continue
+            work = [(root, iter(sorted(references[root])))]
+            index[root] = lowlink[root] = len(index)
+            stack.append(root)
+            on_stack.add(root)
+            while work:
+                node, targets = work[-1]
+                for target in targets:
+                    if target not in index:
+                        index[target] = lowlink[target] = len(index)
+                        stack.append(target)
+                        on_stack.add(target)
+                        work.append((target, iter(sorted(references[target]))))
+                        break
+                    if target in on_stack:
+                        lowlink[node] = min(lowlink[node], index[target])
+                else:
+                    work.pop()
+                    if work:
+                        parent = work[-1][0]
+                        lowlink[parent] = min(lowlink[parent], lowlink[node])
+                    if lowlink[node] == index[node]:
+                        component = list()
+                        while True:
+                            member = stack.pop()
+                            on_stack.discard(member)
+                            component.append(member)
+                            if member == node:
+                                break
+                        components.append(sorted(component))
+        return components
+
+    def __plan(self, struct):
+        tables, references = self.__references(struct)
+        components = self.__components(tables, references)
+
+        component_of = dict()
+        for component_index, component in enumerate(components):
+            for table in component:
+                component_of[table] = component_index
+
+        # Referenced components always come first, so one pass assigns waves
+        waves = list()
+        component_wave = list()
+        cycles = list()
+        for component_index, component in enumerate(components):
+            wave = 0
+            constraints = list()
+            for table in component:
+                for referenced, cons in sorted(references[table].items()):
+                    if component_of[referenced] == component_index:
+                        constraints += [[table[0], table[1], con] for con in sorted(cons)]
+                    else:
+                        wave = max(wave, component_wave[component_of[referenced]] + 1)
+            component_wave.append(wave)
+            if wave == len(waves):
+                waves.append(list())
+            waves[wave] += [list(table) for table in component]
+            if constraints:
+                cycles.append({
+                    'TABLES': [list(table) for table in component],
+                    'CONSTRAINTS': constraints,
+                })
+
+        for wave in waves:
+            wave.sort()
+        load_order = [table for wave in waves for table in wave]
+
+        schemas = dict()
+        for wave_index, wave in enumerate(waves):
+            for schema, table in wave:
+                schema_waves = schemas.setdefault(schema, list())
+                if not schema_waves or schema_waves[-1]['WAVE'] != wave_index:
+                    schema_waves.append({'WAVE': wave_index, 'TABLES': list()})
+                schema_waves[-1]['TABLES'].append(table)
+
+        return {
+            'LOAD_ORDER': load_order,
+            'TRUNCATE_ORDER': load_order[::-1],
+            'WAVES': waves,
+            'CYCLES': cycles,
+            'SCHEMAS': schemas,
+        }
+
+
+def info_postprocess(db, layers_url, services_url, profiler=None):
     print('postprocessing data')
-    comments_parser = CommentsParser(db, layers_url, services_url)
-    comments_parser.parse()
-    dependencies_investigator = DependenciesInvestigator(db)
-    dependencies_investigator.investigate()
+    if profiler is None:
+        profiler = Profiler()
+    with profiler.phase('CommentsParser'):
+        comments_parser = CommentsParser(db, layers_url, services_url)
+        comments_parser.parse()
+    with profiler.phase('DependenciesInvestigator'):
+        dependencies_investigator = DependenciesInvestigator(db)
+        dependencies_investigator.investigate()
+    with profiler.phase('IndexAdvisor'):
+        index_advisor = IndexAdvisor(db)
+        index_advisor.advise()
+    with profiler.phase('RowLayoutAnalyzer'):
+        row_layout_analyzer = RowLayoutAnalyzer(db)
+        row_layout_analyzer.analyze()
+    with profiler.phase('LoadOrderPlanner'):
+        load_order_planner = LoadOrderPlanner(db)
+        load_order_planner.plan()
+
+
+# Escaping helpers are called for every schema, table, column and type name
+# written to the templates, and the same values repeat many times, so each
+# one keeps a bounded memo of its results for string input.
+ESCAPE_CACHE_SIZE = 65536
 
 
 ######
 # sgml_safe_id
 #   Safe SGML ID Character replacement
+_SGML_ID_ARRAY_RE = re.compile('\\[\\]')
+_SGML_ID_INVALID_RE = re.compile('[ "\',)(_-]+')
+_SGML_ID_TRAILING_DASH_RE = re.compile('-$')
+
+
+@functools.lru_cache(maxsize=ESCAPE_CACHE_SIZE)
 def sgml_safe_id(string):
     # Lets use the keyword ARRAY in place of the square brackets
     # to prevent duplicating a non-array equivelent
-    string = re.sub('\\[\\]', 'ARRAY-', string)
+    if '[]' in string:
+        string = _SGML_ID_ARRAY_RE.sub('ARRAY-', string)
 
     # Brackets, spaces, commas, underscores are not valid 'id' characters
     # replace with as few -'s as possible.
-    string = re.sub('[ "\',)(_-]+', '-', string)
+    string = _SGML_ID_INVALID_RE.sub('-', string)
 
     # Don't want a - at the end either.  It looks silly.
-    string = re.sub('-$', '', string)
+    string = _SGML_ID_TRAILING_DASH_RE.sub('', string)
 
     return string
 
 
+#####
+# html_fragment
+#    Anchor of an SGML id in the html outputs, encoded like the Mako u filter
+#    the templates write ids and links with, so that every link matches.
+def html_fragment(sgmlid):
+    return urllib.parse.quote_plus(sgmlid)
+
+
 #####
 # useUnits
 #    Tack on base 2 metric units
@@ -908,6 +2249,46 @@ def use_units(value):
     return '%.2f %s' % (value, units[loop])
 
 
+# Ampersands which don't start one of the entities we emit ourselves
+_AMPERSAND_RE = re.compile('&(?!(amp|lt|gt|apos|quot);)')
+
+_XML_ESCAPE_TABLE = str.maketrans({
+    '<': '&lt;',
+    '>': '&gt;',
+    "'": '&apos;',
+    '"': '&quot;',
+})
+
+_HTML_ESCAPE_TABLE = str.maketrans({
+    '<': '&lt;',
+    '>': '&gt;',
+    "'": '&apos;',
+    '"': '&quot;',
+    '\n': '<br>',
+})
+
+# Same characters as the '\\s' class of the re module; none of them lies above U+3000
+_GRAPHVIZ_ESCAPE_TABLE = str.maketrans({
+    char: '\\' + char
+    for char in map(chr, range(0x3001))
+    if char.isspace() or char in '"\''
+})
+
+
+@functools.lru_cache(maxsize=ESCAPE_CACHE_SIZE)
+def _html_escape(string):
+    if '&' in string:
+        string = _AMPERSAND_RE.sub('&amp;', string)
+    return string.translate(_HTML_ESCAPE_TABLE)
+
+
+@functools.lru_cache(maxsize=ESCAPE_CACHE_SIZE)
+def _docbook_escape(string):
+    if '&' in string:
+        string = _AMPERSAND_RE.sub('&amp;', string)
+    return string.translate(_XML_ESCAPE_TABLE)
+
+
 #####
 # html
 #    HTML output is special in that we want to escape
@@ -918,12 +2299,7 @@ def html(string):
     elif isinstance(string, int):
         return str(string)
     elif isinstance(string, str):
-        string = re.sub('&(?!(amp|lt|gt|apos|quot);)', '&amp;', string)
-        string = re.sub('<', '&lt;', string)
-        string = re.sub('>', '&gt;', string)
-        string = re.sub("'", '&apos;', string)
-        string = re.sub('"', '&quot;', string)
-        string = re.sub('\n', '<br>', string)
+        string = _html_escape(string)
     else:
         assert False
     return string
@@ -939,14 +2315,10 @@ def docbook(string):
     elif isinstance(string, int):
         return str(string)
     elif isinstance(string, str):
-        if re.match('^@DOCBOOK', string):
-            string = re.sub('^@DOCBOOK', '', string)
+        if string.startswith('@DOCBOOK'):
+            string = string[len('@DOCBOOK'):]
         else:
-            string = re.sub('&(?!(amp|lt|gt|apos|quot);)', '&amp;', string)
-            string = re.sub('<', '&lt;', string)
-            string = re.sub('>', '&gt;', string)
-            string = re.sub("'", '&apos;', string)
-            string = re.sub('"', '&quot;', string)
+            string = _docbook_escape(string)
     else:
         assert False
     return string
@@ -956,12 +2328,13 @@ def docbook(string):
 # graphviz
 #    GraphViz output requires that special characters (like " and whitespace) must be preceeded
 #    by a \ when a part of a lable.
+@functools.lru_cache(maxsize=ESCAPE_CACHE_SIZE)
 def graphviz(string):
     # Ensure we don't return an least a empty string
     if string is None:
         string = ''
 
-    string = re.sub('([\\s"\'])', '\\\\\\1', string)
+    string = string.translate(_GRAPHVIZ_ESCAPE_TABLE)
 
     return string
 
@@ -969,46 +2342,44 @@ def graphviz(string):
 #####
 # sql_prettyprint
 #    Clean up SQL into something presentable
+
+# List of tokens to split on
+_SQL_TOKENS = "SELECT|FROM|WHERE|HAVING|GROUP BY|ORDER BY|OR|AND|LEFT JOIN|RIGHT JOIN" \
+              "|LEFT OUTER JOIN|LEFT INNER JOIN|INNER JOIN|RIGHT OUTER JOIN|RIGHT INNER JOIN" \
+              "|JOIN|UNION ALL|UNION|EXCEPT|USING|ON|CAST|[\\(\\),]"
+
+# XXX: Split is wrong -- match would do
+_SQL_SPLIT_RE = re.compile('\\(\\"[^\\"]*\\"|\'[^\']*\'|' + _SQL_TOKENS)
+_SQL_TOKEN_RE = re.compile(_SQL_TOKENS)
+_SQL_JUNK_RE = re.compile('^[\\s]?$')
+
+
 def sql_prettyprint(string):
     # If nothing has been sent in, return an empty string
     if string is None:
         return ''
 
-    # Initialize Result string
-    result = ''
+    # Split the string into tokens and the values between them in one scan
+    elems = list()
+    pos = 0
+    for m in _SQL_SPLIT_RE.finditer(string):
+        elems.append(string[pos:m.start()])
+        elems.append(m.group())
+        pos = m.end()
+    if pos < len(string):
+        elems.append(string[pos:])
 
-    # List of tokens to split on
-    tok = "SELECT|FROM|WHERE|HAVING|GROUP BY|ORDER BY|OR|AND|LEFT JOIN|RIGHT JOIN" \
-          "|LEFT OUTER JOIN|LEFT INNER JOIN|INNER JOIN|RIGHT OUTER JOIN|RIGHT INNER JOIN" \
-          "|JOIN|UNION ALL|UNION|EXCEPT|USING|ON|CAST|[\\(\\),]"
+    # Result parts, joined once at the end
+    result = list()
 
     key = 0
     bracket = 0
     depth = 0
     indent = 6
 
-    # XXX: Split is wrong -- match would do
-    pattern = '\\(\\"[^\\"]*\\"|\'[^\']*\'|' + tok
-    elems = list()
-    pos = 0
-    while pos < len(string):
-        m = re.search(pattern, string[pos:])
-        if m is None:
-            tail = string[pos:]
-            elems.append(tail)
-            pos = len(string)
-        else:
-            elem_before_token = string[pos:pos + m.start()]
-            token = m.group()
-            elems.append(elem_before_token)
-            elems.append(token)
-            pos = pos + m.start() + len(token)
-
     for elem in elems:
-        format = None
-
         # Skip junk tokens
-        if re.match('^[\\s]?$', elem):
+        if _SQL_JUNK_RE.match(elem):
             continue
 
         # NOTE: Should we drop leading spaces?
@@ -1016,23 +2387,23 @@ def sql_prettyprint(string):
 
         # Close brackets are special
         # Bring depth in a level
-        if re.match('\\)', elem):
+        if elem.startswith(')'):
             depth = depth - indent
             if key == 1 or bracket == 1:
-                format = '%s%s'
+                result.append(elem)
             else:
-                format = '%s\n%{}s'.format(depth)
+                result.append('\n%*s' % (depth, elem))
 
             key = 0
             bracket = 0
 
         # Open brackets are special
         # Bump depth out a level
-        elif re.match('\\(', elem):
+        elif elem.startswith('('):
             if key == 1:
-                format = '%s %s'
+                result.append(' ' + elem)
             else:
-                format = '%s\n%{}s'.format(depth)
+                result.append('\n%*s' % (depth, elem))
             depth = depth + indent
             bracket = 1
             key = 0
@@ -1040,11 +2411,11 @@ def sql_prettyprint(string):
         # Key element
         # Token from our list -- format on left hand side of the equation
         # when appropriate.
-        elif re.match(tok, elem):
+        elif _SQL_TOKEN_RE.match(elem):
             if key == 1:
-                format = '%s%s'
+                result.append(elem)
             else:
-                format = '%s\n%{}s'.format(depth)
+                result.append('\n%*s' % (depth, elem))
 
             key = 1
             bracket = 0
@@ -1052,16 +2423,216 @@ def sql_prettyprint(string):
         # Value
         # Format for right hand side of the equation
         else:
-            format = '%s%s'
+            result.append(elem)
             key = 0
 
-        # Add the new format string to the result
-        result = format % (result, elem)
+    return ''.join(result)
 
-    return result
+
+#####
+# SqlPrettyprintCache
+#    Keeps pretty-printed view definitions between runs, keyed by the hash
+#    of the definition and of salt, by default the hash of this module, so
+#    that a changed formatter doesn't reuse old results. Only the entries
+#    used by the current run are saved.
+class SqlPrettyprintCache:
+    def __init__(self, cache_dir, salt=None):
+        self.filename = os.path.join(cache_dir, 'sql_prettyprint.json') if cache_dir else None
+        self.salt = salt if salt is not None else file_hash(__file__)
+        self.loaded = dict()
+        self.used = dict()
+        if self.filename and os.path.exists(self.filename):
+            try:
+                with open(self.filename, encoding='utf-8') as f:
+                    self.loaded = json.load(f)
+            except (OSError, ValueError):
+                self.loaded = dict()
+
+    def prettyprint(self, string):
+        if string is None:
+            return ''
+        key = hashlib.sha1((self.salt + string).encode('utf-8')).hexdigest()
+        result = self.used.get(key)
+        if result is None:
+            result = self.loaded.get(key)
+            if result is None:
+                result = sql_prettyprint(string)
+            self.used[key] = result
+        return result
+
+    def save(self):
+        if not self.filename or self.used == self.loaded:
+            return
+        os.makedirs(os.path.dirname(self.filename), exist_ok=True)
+        # An interrupted run leaves the previous cache rather than half of one
+        temporary_filename = self.filename + '.tmp'
+        with open(temporary_filename, 'w', encoding='utf-8') as f:
+            json.dump(self.used, f)
+        os.replace(temporary_filename, self.filename)
+
+
+#####
+# content_hash
+#    Hash of any JSON serializable value, independent of dictionary order
+def content_hash(*values):
+    data = json.dumps(values, sort_keys=True, ensure_ascii=False, cls=collect_info.PgJsonEncoder)
+    return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+
+def file_hash(filename):
+    result = hashlib.sha1()
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(OUTPUT_BUFFER_SIZE), b''):
+            result.update(block)
+    return result.hexdigest()
+
+
+#####
+# replace_if_changed
+#    Moves a freshly written temporary file over the output file unless both
+#    have the same contents, so unchanged outputs keep their modification time.
+#    Returns the hash of the contents.
+def replace_if_changed(temporary_filename, filename, previous_hash=None):
+    new_hash = file_hash(temporary_filename)
+    if previous_hash is None and os.path.exists(filename):
+        previous_hash = file_hash(filename)
+    if new_hash == previous_hash:
+        os.remove(temporary_filename)
+    else:
+        os.replace(temporary_filename, filename)
+    return new_hash
+
+
+def write_json_if_changed(data, filename):
+    temporary_filename = filename + '.tmp'
+    with open(temporary_filename, 'w') as outfile:
+        json.dump(data, outfile, indent=2, cls=collect_info.PgJsonEncoder)
+    replace_if_changed(temporary_filename, filename)
+
+
+#####
+# OutputManifest
+#    Remembers for every output file the hash of what it was rendered from
+#    and of what it contains. Outputs whose inputs didn't change are neither
+#    rendered nor written again, and the dump date only moves when the
+#    documented catalog changed.
+class OutputManifest:
+    def __init__(self, cache_dir, output_filename_base):
+        self.filename = None
+        self.fragments_dir = None
+        if cache_dir:
+            output_key = hashlib.sha1(os.path.abspath(output_filename_base).encode('utf-8')).hexdigest()[:16]
+            self.filename = os.path.join(cache_dir, 'outputs', output_key + '.json')
+            self.fragments_dir = os.path.join(cache_dir, 'fragments', output_key)
+        self.previous = {'fingerprint': None, 'dumped_on': None, 'outputs': dict()}
+        self.outputs = dict()
+        if self.filename and os.path.exists(self.filename):
+            try:
+                with open(self.filename, encoding='utf-8') as f:
+                    self.previous = json.load(f)
+            except (OSError, ValueError):
+                pass
+
+    def dumped_on(self, fingerprint, today):
+        if fingerprint == self.previous['fingerprint'] and self.previous['dumped_on']:
+            return self.previous['dumped_on']
+        return today
+
+    def __entry(self, output_filename):
+        entry = self.previous['outputs'].get(output_filename)
+        if entry is None:
+            return None
+        try:
+            stat = os.stat(output_filename)
+        except OSError:
+            return None
+        if stat.st_size != entry['size'] or stat.st_mtime_ns != entry['mtime_ns']:
+            return None
+        return entry
+
+    def is_up_to_date(self, output_filename, inputs_hash):
+        entry = self.__entry(output_filename)
+        if entry is None or entry['inputs'] != inputs_hash:
+            return False
+        self.outputs[output_filename] = entry
+        return True
+
+    def content_hash(self, output_filename):
+        entry = self.__entry(output_filename)
+        return entry['content'] if entry is not None else None
+
+    def fragments_directory(self, output_filename):
+        if not self.fragments_dir:
+            return None
+        return os.path.join(self.fragments_dir, os.path.basename(output_filename))
+
+    def record(self, output_filename, inputs_hash, content):
+        stat = os.stat(output_filename)
+        self.outputs[output_filename] = {
+            'inputs': inputs_hash,
+            'content': content,
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+        }
+
+    def save(self, fingerprint, dumped_on):
+        if not self.filename:
+            return
+        # Keep the outputs which were not requested by this run
+        outputs = dict()
+        for output_filename, entry in self.previous['outputs'].items():
+            if output_filename not in self.outputs and os.path.exists(output_filename):
+                outputs[output_filename] = entry
+        outputs.update(self.outputs)
+        os.makedirs(os.path.dirname(self.filename), exist_ok=True)
+        temporary_filename = self.filename + '.tmp'
+        with open(temporary_filename, 'w', encoding='utf-8') as f:
+            json.dump({'fingerprint': fingerprint, 'dumped_on': dumped_on, 'outputs': outputs}, f, indent=2)
+        os.replace(temporary_filename, self.filename)
+
+
+#####
+# FragmentCache
+#    Rendered parts of a document (a table or a function section), keyed by
+#    the hash of the data they were rendered from. Templates call
+#    fragments.render(data, render) where render() produces the fragment.
+#    Every fragment is a file of the directory named by its key, so that only
+#    the keys are held in memory; the fragments the document no longer uses
+#    are removed once it is rendered.
+class FragmentCache:
+    def __init__(self, directory, salt):
+        self.directory = directory
+        self.salt = salt
+        self.used = set()
+
+    def render(self, data, render):
+        if not self.directory:
+            return render()
+        key = content_hash(self.salt, data)
+        filename = os.path.join(self.directory, key + '.html')
+        try:
+            with open(filename, encoding='utf-8', newline='') as f:
+                result = f.read()
+        except OSError:
+            result = render()
+            os.makedirs(self.directory, exist_ok=True)
+            # An interrupted run leaves no fragment rather than half of one
+            temporary_filename = filename + '.tmp'
+            with open(temporary_filename, 'w', encoding='utf-8', newline='') as f:
+                f.write(result)
+            os.replace(temporary_filename, filename)
+        self.used.add(key)
+        return result
+
+    def remove_unused(self):
+        if not self.directory or not os.path.isdir(self.directory):
+            return
+        for filename in os.listdir(self.directory):
+            if os.path.splitext(filename)[0] not in self.used:
+                os.remove(os.path.join(self.directory, filename))
 
 
-def make_comment_html(comment, is_function_comment: bool, keywords: list):
+def make_comment_html(comment, is_function_comment: bool, keywords: list, object_registry=None):
     if comment is None:
         return None
     result = str()
@@ -1121,8 +2692,12 @@ def make_comment_html(comment, is_function_comment: bool, keywords: list):
             else:
                 raise RuntimeError('unexpected object type: {}'.format(object_type))
             if add_inner_reference:
-                inner_reference = sgml_safe_id('.'.join((schema_name, object_type.lower(), object_name)))
-                html_target = '{} <a href="#{}">{}</a>'.format(prefix, inner_reference, full_object_name)
+                if object_registry is not None:
+                    inner_reference = object_registry.reference_id(object_type, schema_name, object_name)
+                else:
+                    inner_reference = sgml_safe_id('.'.join((schema_name, object_type.lower(), object_name)))
+                html_target = '{} <a href="#{}">{}</a>'.format(prefix, html_fragment(inner_reference),
+                                                               full_object_name)
             elif outer_reference:
                 html_target = '{} <a href="{}">{}</a>'.format(prefix, outer_reference, full_object_name)
             else:
@@ -1144,406 +2719,748 @@ def make_comment_html(comment, is_function_comment: bool, keywords: list):
     return result
 
 
-def make_table_comment_html(comment: str, keywords: list):
-    return make_comment_html(comment, False, keywords)
+def make_table_comment_html(comment: str, keywords: list, object_registry=None):
+    return make_comment_html(comment, False, keywords, object_registry)
 
 
-def make_function_comment_html(comment: str, keywords: list):
-    return make_comment_html(comment, True, keywords)
+def make_function_comment_html(comment: str, keywords: list, object_registry=None):
+    return make_comment_html(comment, True, keywords, object_registry)
 
 
 #####
-# write_using_templates
-#
-# Generate structure that HTML::Template requires out of the
-# 'STRUCT' for table related information, and 'STRUCT' for
-# the schema and function information
-def write_using_templates(db, database, template_path, output_filename_base, wanted_output):
-    print('write using templates')
-    struct = db[database]['STRUCT']
+# ObjectRegistry
+#    Assigns every documented schema, table and function its SGML id, and
+#    every table and foreign key link its object id, exactly once. Names
+#    which map to the same SGML id get a numeric suffix in the order of the
+#    sorted catalog, so ids are unique and stay the same between runs.
+class ObjectRegistry:
+    def __init__(self, database, struct):
+        self.used_ids = set()
+        self.ids = dict()
+        self.ids_lower = dict()
+        self.object_ids = dict()
+
+        self.database_id = self.__assign(('DATABASE', None, database), database)
+        for schema in sorted(struct):
+            self.__assign(('SCHEMA', None, schema), schema + '.schema')
+        for schema in sorted(struct):
+            tables = struct[schema].get('TABLE', dict())
+            for table in sorted(tables):
+                self.__assign(('TABLE', schema, table), '.'.join((schema, tables[table]['TYPE'], table)))
+                self.object_ids[('TABLE', schema, table)] = len(self.object_ids) + 1
+            for function in sorted(struct[schema].get('FUNCTION', dict())):
+                self.__assign(('FUNCTION', schema, function), '.'.join((schema, 'function', function)))
+
+    def __assign(self, key, name):
+        base_id = sgml_safe_id(name)
+        sgmlid = base_id
+        suffix = 1
+        while sgmlid in self.used_ids:
+            suffix += 1
+            sgmlid = '{}-{}'.format(base_id, suffix)
+        self.used_ids.add(sgmlid)
+        self.ids[key] = sgmlid
+        kind, schema, name = key
+        self.ids_lower.setdefault((kind, schema.lower() if schema else schema, name.lower()), sgmlid)
+        return sgmlid
+
+    def add_links(self, links):
+        for link in links:
+            self.object_ids[('LINK', link['schema'], link['table'], link['con'])] = len(self.object_ids) + 1
+
+    def schema_id(self, schema):
+        return self.ids[('SCHEMA', None, schema)]
+
+    def table_id(self, schema, table):
+        return self.ids[('TABLE', schema, table)]
+
+    def function_id(self, schema, function):
+        return self.ids[('FUNCTION', schema, function)]
+
+    def table_object_id(self, schema, table):
+        return self.object_ids[('TABLE', schema, table)]
+
+    def link_object_id(self, link):
+        return self.object_ids[('LINK', link['schema'], link['table'], link['con'])]
+
+    #####
+    # reference_id
+    #    Id of the target of a reference by object type (as in comment keywords
+    #    and dependencies), schema and name, which may differ in case from the
+    #    catalog. Unknown targets get the id they would have if documented.
+    def reference_id(self, object_type, schema, name):
+        kind = 'FUNCTION' if object_type.upper() == 'FUNCTION' else 'TABLE'
+        sgmlid = self.ids.get((kind, schema, name))
+        if sgmlid is None:
+            sgmlid = self.ids_lower.get((kind, schema.lower() if schema else schema, name.lower()))
+        if sgmlid is None:
+            sgmlid = sgml_safe_id('.'.join((schema or '', object_type.lower(), name)))
+        return sgmlid
 
-    schemas = list()
 
-    # Foreign Key Discovery
-    foreign_keys = dict()
-    for fk_schema in sorted(struct.keys()):
-        fk_schema_attr = struct[fk_schema]
-        for fk_table in sorted(fk_schema_attr['TABLE'] if 'TABLE' in fk_schema_attr else []):
-            fk_table_attr = fk_schema_attr['TABLE'][fk_table]
-            for fk_column in sorted(fk_table_attr['COLUMN'] if 'COLUMN' in fk_table_attr else []):
-                fk_column_attr = fk_table_attr['COLUMN'][fk_column]
-                for fk_con in sorted(fk_column_attr['CON'] if 'CON' in fk_column_attr else []):
-                    con_attr = fk_column_attr['CON'][fk_con]
-                    if con_attr['TYPE'] == 'FOREIGN KEY':
-                        table = con_attr['FKTABLE']
-                        schema = con_attr['FKSCHEMA']
-                        fksgmlid = sgml_safe_id('.'.join((fk_schema, fk_table_attr['TYPE'], fk_table)))
-                        table_foreign_keys = foreign_keys.setdefault(schema, dict()).setdefault(table, list())
-                        table_foreign_keys.append({
-                            'fk_column_number': fk_column_attr['ORDER'],
-                            'fk_sgmlid': fksgmlid,
-                            'fk_schema': fk_schema,
-                            'fk_schema_dbk': docbook(fk_schema),
-                            'fk_schema_dot': graphviz(fk_schema),
-                            'fk_table': fk_table,
-                            'fk_table_dbk': docbook(fk_table),
-                            'fk_table_dot': graphviz(fk_table),
-                        })
-
-                        # only have the count if there is more than 1 schema
-                        if len(struct) > 1:
-                            table_foreign_keys[-1]["number_of_schemas"] = len(struct)
-
-    # Start at 0, increment to 1 prior to use.
-    object_id = 0
-    tableids = dict()
-    for schema in sorted(struct.keys()):
-        schema_attr = struct[schema]
-        tables = list()
-        tablenames = sorted(schema_attr['TABLE'].keys()) if 'TABLE' in schema_attr else []
-        for table in tablenames:
-            table_attr = schema_attr['TABLE'][table]
-            # Column List
-            columns = list()
-            columnnames = sorted(table_attr['COLUMN'].keys(),
-                                 key=lambda column_name: table_attr['COLUMN'][column_name]['ORDER'])
-            for column in columnnames:
-                column_attr = table_attr['COLUMN'][column]
-                inferrednotnull = 0
-
-                # Have a shorter default for places that require it
-                shortdefault = column_attr['DEFAULT']
-                if shortdefault:
-                    shortdefault = elided(shortdefault, 17, 5)
-
-                # Deal with column constraints
-                colconstraints = list()
-                connames = sorted(column_attr['CON'].keys()) if 'CON' in column_attr else []
-                for con in connames:
-                    con_attr = column_attr['CON'][con]
-                    if con_attr['TYPE'] == 'UNIQUE':
-                        unq = con_attr['TYPE']
-                        unqcol = con_attr['COLNUM']
-                        unqgroup = con_attr['KEYGROUP'] if 'KEYGROUP' in con_attr else None
-                        colconstraints.append({
-                            'column_unique': unq,
-                            'column_unique_colnum': unqcol,
-                            'column_unique_keygroup': unqgroup,
-                        })
-                    elif con_attr['TYPE'] == 'PRIMARY KEY':
-                        inferrednotnull = 1
-                        colconstraints.append({
-                            'column_primary_key': 'PRIMARY KEY',
-                        })
-                    elif con_attr['TYPE'] == 'FOREIGN KEY':
-                        fksgmlid = sgml_safe_id(
-                            '.'.join((con_attr['FKSCHEMA'], table_attr['TYPE'], con_attr['FKTABLE'])))
-                        fkgroup = con_attr['KEYGROUP'] if 'KEYGROUP' in con_attr else None
-                        fktable = con_attr['FKTABLE']
-                        fkcol = con_attr['FK-COL NAME']
-                        fkschema = con_attr['FKSCHEMA']
-                        colconstraints.append({
-                            'column_fk': 'FOREIGN KEY',
-                            'column_fk_column': fkcol,
-                            'column_fk_keygroup': fkgroup,
-                            'column_fk_schema': fkschema,
-                            'column_fk_schema_dbk': docbook(fkschema),
-                            'column_fk_schema_dot': graphviz(fkschema),
-                            'column_fk_sgmlid': fksgmlid,
-                            'column_fk_table': fktable,
-                            'column_fk_table_dbk': docbook(fktable),
-                        })
-
-                        # only have the count if there is more than 1 schema
-                        if len(struct) > 1:
-                            colconstraints[-1]['number_of_schemas'] = len(struct)
-
-                # Generate the Column array
-                columns.append({
-                    'column': column,
-                    'column_dbk': docbook(column),
-                    'column_dot': graphviz(column),
-                    'column_default': column_attr['DEFAULT'],
-                    'column_default_dbk': docbook(column_attr['DEFAULT']),
-                    'column_default_short': shortdefault,
-                    'column_default_short_dbk': docbook(shortdefault),
-
-                    'column_comment': column_attr['DESCRIPTION'],
-                    'column_comment_dbk': docbook(column_attr['DESCRIPTION']),
-                    'column_comment_html': html(column_attr['DESCRIPTION']),
-
-                    'column_number': column_attr['ORDER'],
-
-                    'column_type': column_attr['TYPE'],
-                    'column_type_dbk': docbook(column_attr['TYPE']),
-                    'column_type_dot': graphviz(column_attr['TYPE']),
-
-                    'column_constraints': colconstraints,
-                })
-
-                if inferrednotnull == 0:
-                    columns[-1]["column_constraint_notnull"] = column_attr['NULL']
+#####
+# ForeignKeyIndex
+#    Index of the foreign keys of STRUCT, built in one pass. There is an edge
+#    for every column of every foreign key with the SGML ids of both tables
+#    assigned once:
+#      edges     -> in order of schema, table, column name and constraint name
+#      by_column -> (schema, table, column, constraint) -> edge
+#      by_target -> (referenced schema, referenced table) -> edges in the order above
+#      links     -> edges of the first column of every foreign key to a documented
+#                   table, in order of schema, table, column number and constraint name
+class ForeignKeyIndex:
+    def __init__(self, struct, object_registry):
+        self.edges = list()
+        self.by_column = dict()
+        self.by_target = dict()
+        self.links = list()
+
+        for schema in sorted(struct):
+            tables = struct[schema].get('TABLE', dict())
+            for table in sorted(tables):
+                table_attr = tables[table]
+                table_sgmlid = object_registry.table_id(schema, table)
+                table_links = list()
+                for column, column_attr in sorted(table_attr.get('COLUMN', dict()).items()):
+                    for con, con_attr in sorted(column_attr.get('CON', dict()).items()):
+                        if con_attr['TYPE'] != 'FOREIGN KEY':
+                            continue
+                        edge = self.__make_edge(struct, object_registry, schema, table, table_sgmlid, column,
+                                                column_attr, con, con_attr)
+                        self.edges.append(edge)
+                        self.by_column[(schema, table, column, con)] = edge
+                        self.by_target.setdefault((edge['ref_schema'], edge['ref_table']), list()).append(edge)
+                        if edge['colnum'] == 1 and edge['ref_documented']:
+                            table_links.append(edge)
+                table_links.sort(key=lambda edge: (edge['column_order'], edge['con']))
+                self.links += table_links
+
+    @staticmethod
+    def __make_edge(struct, object_registry, schema, table, table_sgmlid, column, column_attr, con, con_attr):
+        ref_schema = con_attr['FKSCHEMA']
+        ref_table = con_attr['FKTABLE']
+        ref_column = con_attr['FK-COL NAME']
+        # The referenced table may be left out by the tables blacklist
+        ref_table_attr = struct.get(ref_schema, dict()).get('TABLE', dict()).get(ref_table)
+        ref_column_order = None
+        if ref_table_attr is not None and ref_column in ref_table_attr.get('COLUMN', dict()):
+            ref_column_order = ref_table_attr['COLUMN'][ref_column]['ORDER']
+        return {
+            'schema': schema,
+            'table': table,
+            'sgmlid': table_sgmlid,
+            'column': column,
+            'column_order': column_attr['ORDER'],
+            'con': con,
+            'colnum': con_attr['COLNUM'],
+            'keygroup': con_attr.get('KEYGROUP'),
+            'ref_schema': ref_schema,
+            'ref_table': ref_table,
+            'ref_sgmlid': object_registry.reference_id('TABLE', ref_schema, ref_table),
+            'ref_column': ref_column,
+            'ref_column_order': ref_column_order,
+            'ref_documented': ref_table_attr is not None,
+        }
 
-            # Constraint List
-            constraints = list()
-            for constraint in sorted(table_attr['CONSTRAINT'].keys() if 'CONSTRAINT' in table_attr else []):
-                shortcon = table_attr['CONSTRAINT'][constraint]
-                shortcon = elided(shortcon, 30, 5)
-                constraints.append({
-                    'constraint': table_attr['CONSTRAINT'][constraint],
-                    'constraint_dbk': docbook(table_attr['CONSTRAINT'][constraint]),
-                    'constraint_name': constraint,
-                    'constraint_name_dbk': docbook(constraint),
-                    'constraint_short': shortcon,
-                    'constraint_short_dbk': docbook(shortcon),
-                    'table': table,
-                    'table_dbk': docbook(table),
-                    'table_dot': graphviz(table),
-                })
 
-            # Index List
-            indexes = list()
-            for index in sorted(table_attr['INDEX'].keys() if 'INDEX' in table_attr else []):
-                indexes.append({
-                    'index_definition': table_attr['INDEX'][index],
-                    'index_definition_dbk': docbook(table_attr['INDEX'][index]),
-                    'index_name': index,
-                    'index_name_dbk': docbook(index),
-                    'table': table,
-                    'table_dbk': docbook(table),
-                    'table_dot': graphviz(table),
-                    'schema': schema,
-                    'schema_dbk': docbook(schema),
-                    'schema_dot': graphviz(schema),
-                })
+#####
+# referencing_foreign_keys
+#    Template data of the foreign keys referencing a table, from its edges in
+#    ForeignKeyIndex.by_target
+def referencing_foreign_keys(edges, number_of_schemas):
+    table_foreign_keys = list()
+    for edge in edges:
+        table_foreign_keys.append({
+            'fk_column_number': edge['column_order'],
+            'fk_sgmlid': edge['sgmlid'],
+            'fk_schema': edge['schema'],
+            'fk_schema_dbk': docbook(edge['schema']),
+            'fk_schema_dot': graphviz(edge['schema']),
+            'fk_table': edge['table'],
+            'fk_table_dbk': docbook(edge['table']),
+            'fk_table_dot': graphviz(edge['table']),
+        })
 
-            inherits = list()
-            for inhSch in sorted(table_attr['INHERIT'].keys() if 'INHERIT' in table_attr else []):
-                for inhTab in sorted(table_attr['INHERIT'][inhSch].keys()):
-                    inherits.append({
-                        'table': table,
-                        'table_dbk': docbook(table),
-                        'table_dot': graphviz(table),
-                        'schema': schema,
-                        'schema_dbk': docbook(schema),
-                        'schema_dot': graphviz(schema),
-                        'sgmlid': sgml_safe_id('.'.join((schema, 'table', table,))),
-                        'parent_sgmlid': sgml_safe_id('.'.join((inhSch, 'table', inhTab))),
-                        'parent_table': inhTab,
-                        'parent_table_dbk': docbook(inhTab),
-                        'parent_table_dot': graphviz(inhTab),
-                        'parent_schema': inhSch,
-                        'parent_schema_dbk': docbook(inhSch),
-                        'parent_schema_dot': graphviz(inhSch),
-                    })
+        # only have the count if there is more than 1 schema
+        if number_of_schemas > 1:
+            table_foreign_keys[-1]["number_of_schemas"] = number_of_schemas
+    return table_foreign_keys
 
-            # Foreign Keys
-            table_foreign_keys = foreign_keys.get(schema, dict()).get(table, list())
 
-            # List off permissions
-            permissions = list()
-            for user in sorted(table_attr['ACL'] if 'ACL' in table_attr else []):
-                permissions.append({
-                    'schema': schema,
-                    'schema_dbk': docbook(schema),
-                    'schema_dot': graphviz(schema),
-                    'table': table,
-                    'table_dbk': docbook(table),
-                    'table_dot': graphviz(table),
-                    'user': user,
-                    'user_dbk': docbook(user),
-                })
+#####
+# make_schema_context
+#    Template data of one schema: its tables, functions, sequences, enums
+#    and domains
+def make_schema_context(schema, schema_attr, object_registry, foreign_key_index, view_definitions, number_of_schemas,
+                        profiler):
+    tables = list()
+    tablenames = sorted(schema_attr['TABLE'].keys()) if 'TABLE' in schema_attr else []
+    for table in tablenames:
+        profiler.begin_step(table, 'table', schema=schema)
+        table_attr = schema_attr['TABLE'][table]
+        # Column List
+        columns = list()
+        columnnames = sorted(table_attr['COLUMN'].keys(),
+                             key=lambda column_name: table_attr['COLUMN'][column_name]['ORDER'])
+        for column in columnnames:
+            column_attr = table_attr['COLUMN'][column]
+            inferrednotnull = 0
+
+            # Have a shorter default for places that require it
+            shortdefault = column_attr['DEFAULT']
+            if shortdefault:
+                shortdefault = elided(shortdefault, 17, 5)
+
+            # Deal with column constraints
+            colconstraints = list()
+            connames = sorted(column_attr['CON'].keys()) if 'CON' in column_attr else []
+            for con in connames:
+                con_attr = column_attr['CON'][con]
+                if con_attr['TYPE'] == 'UNIQUE':
+                    unq = con_attr['TYPE']
+                    unqcol = con_attr['COLNUM']
+                    unqgroup = con_attr['KEYGROUP'] if 'KEYGROUP' in con_attr else None
+                    colconstraints.append({
+                        'column_unique': unq,
+                        'column_unique_colnum': unqcol,
+                        'column_unique_keygroup': unqgroup,
+                    })
+                elif con_attr['TYPE'] == 'PRIMARY KEY':
+                    inferrednotnull = 1
+                    colconstraints.append({
+                        'column_primary_key': 'PRIMARY KEY',
+                    })
+                elif con_attr['TYPE'] == 'FOREIGN KEY':
+                    edge = foreign_key_index.by_column[(schema, table, column, con)]
+                    fksgmlid = edge['ref_sgmlid']
+                    fkgroup = edge['keygroup']
+                    fktable = edge['ref_table']
+                    fkcol = edge['ref_column']
+                    fkschema = edge['ref_schema']
+                    colconstraints.append({
+                        'column_fk': 'FOREIGN KEY',
+                        'column_fk_column': fkcol,
+                        'column_fk_keygroup': fkgroup,
+                        'column_fk_schema': fkschema,
+                        'column_fk_schema_dbk': docbook(fkschema),
+                        'column_fk_schema_dot': graphviz(fkschema),
+                        'column_fk_sgmlid': fksgmlid,
+                        'column_fk_table': fktable,
+                        'column_fk_table_dbk': docbook(fktable),
+                    })
 
-                # only have the count if there is more than 1 schema
-                if len(struct) > 1:
-                    permissions[-1]["number_of_schemas"] = len(struct)
+                    # only have the count if there is more than 1 schema
+                    if number_of_schemas > 1:
+                        colconstraints[-1]['number_of_schemas'] = number_of_schemas
 
-                for perm in table_attr['ACL'][user].keys():
-                    if table_attr['ACL'][user][perm] == 1:
-                        perm_lower = re.sub('^FLAG_', 'flag_', perm) if perm.startswith('FLAG_') else perm.lower()
-                        permissions[-1][perm_lower] = 1
+            # Generate the Column array
+            columns.append({
+                'column': column,
+                'column_dbk': docbook(column),
+                'column_dot': graphviz(column),
+                'column_default': column_attr['DEFAULT'],
+                'column_default_dbk': docbook(column_attr['DEFAULT']),
+                'column_default_short': shortdefault,
+                'column_default_short_dbk': docbook(shortdefault),
 
-            # Increment and record the object ID
-            object_id = object_id + 1
-            tableids[schema + '.' + table] = object_id
-            viewdef = sql_prettyprint(table_attr['VIEW_DEF'])
+                'column_comment': column_attr['DESCRIPTION'],
+                'column_comment_dbk': docbook(column_attr['DESCRIPTION']),
+                'column_comment_html': html(column_attr['DESCRIPTION']),
 
-            # Truncate comment for Dia
-            comment_dia = table_attr['DESCRIPTION']
-            if comment_dia:
-                comment_dia = elided(comment_dia, 35, 5)
+                'column_number': column_attr['ORDER'],
 
-            def table_stat_attr(name):
-                return table_attr[name] if name in table_attr else None
+                'column_type': column_attr['TYPE'],
+                'column_type_dbk': docbook(column_attr['TYPE']),
+                'column_type_dot': graphviz(column_attr['TYPE']),
 
-            keywords = table_attr.get('KEYWORDS', list())
-            table_comment_html = make_table_comment_html(table_attr['DESCRIPTION'], keywords)
+                'column_constraints': colconstraints,
+            })
 
-            stats_enabled = table_stat_attr('HAS_STATISTICS')
-            tables.append({
-                'object_id': object_id,
-                'object_id_dbk': docbook(object_id),
+            column_profile = column_profile_text(column_attr.get('PROFILE'))
+            if column_profile is not None:
+                columns[-1]['column_profile'] = column_profile
+                columns[-1]['column_profile_dbk'] = docbook(column_profile)
+
+            if inferrednotnull == 0:
+                columns[-1]["column_constraint_notnull"] = column_attr['NULL']
+
+        # Constraint List
+        constraints = list()
+        for constraint in sorted(table_attr['CONSTRAINT'].keys() if 'CONSTRAINT' in table_attr else []):
+            shortcon = table_attr['CONSTRAINT'][constraint]
+            shortcon = elided(shortcon, 30, 5)
+            constraints.append({
+                'constraint': table_attr['CONSTRAINT'][constraint],
+                'constraint_dbk': docbook(table_attr['CONSTRAINT'][constraint]),
+                'constraint_name': constraint,
+                'constraint_name_dbk': docbook(constraint),
+                'constraint_short': shortcon,
+                'constraint_short_dbk': docbook(shortcon),
+                'table': table,
+                'table_dbk': docbook(table),
+                'table_dot': graphviz(table),
+            })
 
+        # Index List
+        indexes = list()
+        for index in sorted(table_attr['INDEX'].keys() if 'INDEX' in table_attr else []):
+            indexes.append({
+                'index_definition': table_attr['INDEX'][index],
+                'index_definition_dbk': docbook(table_attr['INDEX'][index]),
+                'index_name': index,
+                'index_name_dbk': docbook(index),
+                'table': table,
+                'table_dbk': docbook(table),
+                'table_dot': graphviz(table),
                 'schema': schema,
                 'schema_dbk': docbook(schema),
                 'schema_dot': graphviz(schema),
-                'schema_sgmlid': sgml_safe_id(schema + '.schema'),
-
-                # Statistics
-                'stats_enabled': stats_enabled,
+            })
 
-                'table': table,
-                'table_dbk': docbook(table),
-                'table_dot': graphviz(table),
-                'table_type': table_attr['TYPE'],
-                'table_type_dbk': docbook(table_attr['TYPE']),
-                'table_sgmlid': sgml_safe_id('.'.join((schema, table_attr['TYPE'], table))),
-                'table_comment': table_attr['DESCRIPTION'],
-                'table_comment_dbk': docbook(table_attr['DESCRIPTION']),
-                'table_comment_dia': comment_dia,
-                'table_comment_html': table_comment_html,
-                'view_definition': viewdef,
-                'view_definition_dbk': docbook(viewdef),
-
-                # lists
-                'columns': columns,
-                'constraints': constraints,
-                'fk_schemas': table_foreign_keys,
-                'indexes': indexes,
-                'inherits': inherits,
-                'permissions': permissions,
+        # Trigger List
+        triggers = list()
+        for trigger in sorted(table_attr['TRIGGER'].keys() if 'TRIGGER' in table_attr else []):
+            trigger_attr = table_attr['TRIGGER'][trigger]
+            triggers.append({
+                'trigger': trigger,
+                'trigger_definition': trigger_attr['DEFINITION'],
+                'trigger_enabled': trigger_attr['ENABLED'],
+                'trigger_comment': trigger_attr['DESCRIPTION'],
             })
 
-            if stats_enabled:
-                tables[-1]['stats_dead_bytes'] = use_units(table_stat_attr('DEADTUPLELEN'))
-                tables[-1]['stats_dead_bytes_dbk'] = docbook(use_units(table_stat_attr('DEADTUPLELEN')))
-                tables[-1]['stats_free_bytes'] = use_units(table_stat_attr('FREELEN'))
-                tables[-1]['stats_free_bytes_dbk'] = docbook(use_units(table_stat_attr('FREELEN')))
-                tables[-1]['stats_table_bytes'] = use_units(table_stat_attr('TABLELEN'))
-                tables[-1]['stats_table_bytes_dbk'] = docbook(use_units(table_stat_attr('TABLELEN')))
-                tables[-1]['stats_tuple_count'] = table_stat_attr('TUPLECOUNT')
-                tables[-1]['stats_tuple_count_dbk'] = docbook(table_stat_attr('TUPLECOUNT'))
-                tables[-1]['stats_tuple_bytes'] = use_units(table_stat_attr('TUPLELEN'))
-                tables[-1]['stats_tuple_bytes_dbk'] = docbook(use_units(table_stat_attr('TUPLELEN')))
+        inherits = list()
+        for inhSch in sorted(table_attr['INHERIT'].keys() if 'INHERIT' in table_attr else []):
+            for inhTab in sorted(table_attr['INHERIT'][inhSch].keys()):
+                inherits.append({
+                    'table': table,
+                    'table_dbk': docbook(table),
+                    'table_dot': graphviz(table),
+                    'schema': schema,
+                    'schema_dbk': docbook(schema),
+                    'schema_dot': graphviz(schema),
+                    'sgmlid': object_registry.table_id(schema, table),
+                    'parent_sgmlid': object_registry.reference_id('TABLE', inhSch, inhTab),
+                    'parent_table': inhTab,
+                    'parent_table_dbk': docbook(inhTab),
+                    'parent_table_dot': graphviz(inhTab),
+                    'parent_schema': inhSch,
+                    'parent_schema_dbk': docbook(inhSch),
+                    'parent_schema_dot': graphviz(inhSch),
+                })
 
-            # only have the count if there is more than 1 schema
-            if len(struct) > 1:
-                tables[-1]["number_of_schemas"] = len(struct)
-
-        # Dump out list of functions
-        functions = list()
-        for function in sorted(schema_attr['FUNCTION'].keys() if 'FUNCTION' in schema_attr else []):
-            function_attr = schema_attr['FUNCTION'][function]
-            keywords = function_attr.get('KEYWORDS', list())
-            function_comment_html = make_function_comment_html(function_attr['COMMENT'], keywords)
-            functions.append({
-                'function': function,
-                'function_dbk': docbook(function),
-                'function_sgmlid': sgml_safe_id('.'.join((schema, 'function', function))),
-                'function_comment': function_attr['COMMENT'],
-                'function_comment_dbk': docbook(function_attr['COMMENT']),
-                'function_comment_html': function_comment_html,
-                'function_language': function_attr['LANGUAGE'].upper(),
-                'function_returns': function_attr['RETURNS'],
-                'function_source': function_attr['SOURCE'],
+        # Foreign Keys
+        table_foreign_keys = referencing_foreign_keys(foreign_key_index.by_target.get((schema, table), list()),
+                                                      number_of_schemas)
+
+        # List off permissions
+        permissions = list()
+        for user in sorted(table_attr['ACL'] if 'ACL' in table_attr else []):
+            permissions.append({
                 'schema': schema,
                 'schema_dbk': docbook(schema),
                 'schema_dot': graphviz(schema),
-                'schema_sgmlid': sgml_safe_id(schema + '.schema'),
+                'table': table,
+                'table_dbk': docbook(table),
+                'table_dot': graphviz(table),
+                'user': user,
+                'user_dbk': docbook(user),
             })
 
             # only have the count if there is more than 1 schema
-            if len(struct) > 1:
-                functions[-1]["number_of_schemas"] = len(struct)
+            if number_of_schemas > 1:
+                permissions[-1]["number_of_schemas"] = number_of_schemas
+
+            for perm in table_attr['ACL'][user].keys():
+                if table_attr['ACL'][user][perm] == 1:
+                    perm_lower = re.sub('^FLAG_', 'flag_', perm) if perm.startswith('FLAG_') else perm.lower()
+                    permissions[-1][perm_lower] = 1
+
+        object_id = object_registry.table_object_id(schema, table)
+        viewdef = view_definitions.prettyprint(table_attr['VIEW_DEF'])
+
+        # Truncate comment for Dia
+        comment_dia = table_attr['DESCRIPTION']
+        if comment_dia:
+            comment_dia = elided(comment_dia, 35, 5)
+
+        def table_stat_attr(name):
+            return table_attr[name] if name in table_attr else None
+
+        keywords = table_attr.get('KEYWORDS', list())
+        table_comment_html = make_table_comment_html(table_attr['DESCRIPTION'], keywords, object_registry)
+
+        stats_enabled = table_stat_attr('HAS_STATISTICS')
+        partitions = table_stat_attr('PARTITIONS')
+        tables.append({
+            'object_id': object_id,
+            'object_id_dbk': docbook(object_id),
 
-        schemas.append({
             'schema': schema,
             'schema_dbk': docbook(schema),
             'schema_dot': graphviz(schema),
-            'schema_sgmlid': sgml_safe_id(schema + '.schema'),
-            'schema_comment': schema_attr['SCHEMA']['COMMENT'],
-            'schema_comment_dbk': docbook(schema_attr['SCHEMA']['COMMENT']),
-            'schema_comment_html': html(schema_attr['SCHEMA']['COMMENT']),
+            'schema_sgmlid': object_registry.schema_id(schema),
+
+            # Statistics
+            'stats_enabled': stats_enabled,
+
+            # Summary of folded partitions
+            'partitioned': partitions is not None,
+
+            'table': table,
+            'table_dbk': docbook(table),
+            'table_dot': graphviz(table),
+            'table_type': table_attr['TYPE'],
+            'table_type_dbk': docbook(table_attr['TYPE']),
+            'table_sgmlid': object_registry.table_id(schema, table),
+            'table_comment': table_attr['DESCRIPTION'],
+            'table_comment_dbk': docbook(table_attr['DESCRIPTION']),
+            'table_comment_dia': comment_dia,
+            'table_comment_html': table_comment_html,
+            'view_definition': viewdef,
+            'view_definition_dbk': docbook(viewdef),
 
             # lists
-            'functions': functions,
-            'tables': tables,
+            'columns': columns,
+            'columns_profiled': any('column_profile' in column for column in columns),
+            'constraints': constraints,
+            'fk_schemas': table_foreign_keys,
+            'indexes': indexes,
+            'inherits': inherits,
+            'permissions': permissions,
+            'triggers': triggers,
         })
 
-        # Build the array of schemas
-        if len(struct) > 1:
-            schemas[-1]["number_of_schemas"] = len(struct)
+        if stats_enabled:
+            tables[-1]['stats_dead_bytes'] = use_units(table_stat_attr('DEADTUPLELEN'))
+            tables[-1]['stats_dead_bytes_dbk'] = docbook(use_units(table_stat_attr('DEADTUPLELEN')))
+            tables[-1]['stats_free_bytes'] = use_units(table_stat_attr('FREELEN'))
+            tables[-1]['stats_free_bytes_dbk'] = docbook(use_units(table_stat_attr('FREELEN')))
+            tables[-1]['stats_table_bytes'] = use_units(table_stat_attr('TABLELEN'))
+            tables[-1]['stats_table_bytes_dbk'] = docbook(use_units(table_stat_attr('TABLELEN')))
+            tables[-1]['stats_tuple_count'] = table_stat_attr('TUPLECOUNT')
+            tables[-1]['stats_tuple_count_dbk'] = docbook(table_stat_attr('TUPLECOUNT'))
+            tables[-1]['stats_tuple_bytes'] = use_units(table_stat_attr('TUPLELEN'))
+            tables[-1]['stats_tuple_bytes_dbk'] = docbook(use_units(table_stat_attr('TUPLELEN')))
+            tables[-1]['stats_fast'] = table_stat_attr('STATISTICS_TIER') == 'fast'
+            if tables[-1]['stats_fast']:
+                tables[-1]['stats_dead_count'] = table_stat_attr('DEADTUPLECOUNT')
+                tables[-1]['stats_total_bytes'] = use_units(table_stat_attr('TOTALLEN'))
+                tables[-1]['stats_toast_bytes'] = use_units(table_stat_attr('TOASTLEN'))
+                tables[-1]['stats_index_bytes'] = use_units(table_stat_attr('INDEXLEN'))
+                tables[-1]['stats_last_vacuum'] = table_stat_attr('LAST_VACUUM') or 'never'
+                tables[-1]['stats_last_analyze'] = table_stat_attr('LAST_ANALYZE') or 'never'
+
+        if partitions is not None:
+            bound_range = None
+            if partitions['BOUND_FROM'] is not None:
+                bound_range = 'from {} to {}'.format(partitions['BOUND_FROM'], partitions['BOUND_TO'])
+            tables[-1]['partition_count'] = partitions['COUNT']
+            tables[-1]['partition_key'] = partitions['KEY']
+            tables[-1]['partition_key_dbk'] = docbook(partitions['KEY'])
+            tables[-1]['partition_has_default'] = partitions['HAS_DEFAULT']
+            tables[-1]['partition_range'] = bound_range
+            tables[-1]['partition_range_dbk'] = docbook(bound_range)
+            tables[-1]['partition_bytes'] = use_units(partitions['SIZE'])
+            tables[-1]['partition_bytes_dbk'] = docbook(use_units(partitions['SIZE']))
+
+        # only have the count if there is more than 1 schema
+        if number_of_schemas > 1:
+            tables[-1]["number_of_schemas"] = number_of_schemas
+
+    # Dump out list of functions
+    functions = list()
+    for function in sorted(schema_attr['FUNCTION'].keys() if 'FUNCTION' in schema_attr else []):
+        function_attr = schema_attr['FUNCTION'][function]
+        keywords = function_attr.get('KEYWORDS', list())
+        function_comment_html = make_function_comment_html(function_attr['COMMENT'], keywords, object_registry)
+        functions.append({
+            'function': function,
+            'function_attributes': function_attributes_text(function_attr),
+            'function_dbk': docbook(function),
+            'function_sgmlid': object_registry.function_id(schema, function),
+            'function_comment': function_attr['COMMENT'],
+            'function_comment_dbk': docbook(function_attr['COMMENT']),
+            'function_comment_html': function_comment_html,
+            'function_language': function_attr['LANGUAGE'].upper(),
+            'function_returns': function_attr['RETURNS'],
+            'function_source': function_attr['SOURCE'],
+            'schema': schema,
+            'schema_dbk': docbook(schema),
+            'schema_dot': graphviz(schema),
+            'schema_sgmlid': object_registry.schema_id(schema),
+        })
+
+        # only have the count if there is more than 1 schema
+        if number_of_schemas > 1:
+            functions[-1]["number_of_schemas"] = number_of_schemas
+
+    # Sequences, enums and domains of the schema
+    sequences = list()
+    for sequence in sorted(schema_attr.get('SEQUENCE', dict())):
+        sequence_attr = schema_attr['SEQUENCE'][sequence]
+        owned_by = None
+        if sequence_attr['OWNER_TABLE'] is not None:
+            owned_by = '.'.join(part for part in (sequence_attr['OWNER_TABLE'], sequence_attr['OWNER_COLUMN'])
+                                if part)
+        sequences.append({
+            'sequence': sequence,
+            'sequence_comment': sequence_attr['DESCRIPTION'],
+            'sequence_type': sequence_attr['DATA_TYPE'],
+            'sequence_start': sequence_attr['START'],
+            'sequence_increment': sequence_attr['INCREMENT'],
+            'sequence_min': sequence_attr['MIN'],
+            'sequence_max': sequence_attr['MAX'],
+            'sequence_cache': sequence_attr['CACHE'],
+            'sequence_cycle': sequence_attr['CYCLE'],
+            'sequence_owned_by': owned_by,
+        })
+    enums = list()
+    for enum in sorted(schema_attr.get('ENUM', dict())):
+        enum_attr = schema_attr['ENUM'][enum]
+        enums.append({
+            'enum': enum,
+            'enum_comment': enum_attr['DESCRIPTION'],
+            'enum_labels': ', '.join(enum_attr['LABELS']),
+        })
+    domains = list()
+    for domain in sorted(schema_attr.get('DOMAIN', dict())):
+        domain_attr = schema_attr['DOMAIN'][domain]
+        domains.append({
+            'domain': domain,
+            'domain_comment': domain_attr['DESCRIPTION'],
+            'domain_type': domain_attr['BASE_TYPE'],
+            'domain_not_null': domain_attr['NOT_NULL'],
+            'domain_default': domain_attr['DEFAULT'],
+            'domain_constraints': ' '.join(domain_attr['CONSTRAINTS']),
+        })
+
+    schema_context = {
+        'schema': schema,
+        'schema_dbk': docbook(schema),
+        'schema_dot': graphviz(schema),
+        'schema_sgmlid': object_registry.schema_id(schema),
+        'schema_comment': schema_attr['SCHEMA']['COMMENT'],
+        'schema_comment_dbk': docbook(schema_attr['SCHEMA']['COMMENT']),
+        'schema_comment_html': html(schema_attr['SCHEMA']['COMMENT']),
+
+        # lists
+        'domains': domains,
+        'enums': enums,
+        'functions': functions,
+        'sequences': sequences,
+        'tables': tables,
+    }
+
+    # Build the array of schemas
+    if number_of_schemas > 1:
+        schema_context["number_of_schemas"] = number_of_schemas
+    return schema_context
+
+
+#####
+# make_function_usage
+#    Template data of the views and column defaults calling the volatile
+#    and the parallel unsafe functions of a schema
+def make_function_usage(schema, schema_functions, object_registry):
+    function_usage = list()
+    for function in sorted(schema_functions):
+        function_attr = schema_functions[function]
+        if function_attr.get('VOLATILITY') != 'volatile' and function_attr.get('PARALLEL') != 'unsafe':
+            continue
+        for usage in function_attr.get('USED_BY', list()):
+            used_by = '.'.join(part for part in (usage['SCHEMA'], usage['TABLE'], usage['COLUMN']) if part)
+            function_usage.append({
+                'schema': schema,
+                'function': function,
+                'function_sgmlid': object_registry.function_id(schema, function),
+                'function_attributes': function_attributes_text(function_attr),
+                'usage': usage['TYPE'],
+                'used_by': used_by,
+                'used_by_sgmlid': object_registry.reference_id('TABLE', usage['SCHEMA'], usage['TABLE']),
+            })
+    return function_usage
+
+
+#####
+# make_database_sections
+#    Template data of the sections about the whole database: index advice,
+#    row layout, load order and extensions
+def make_database_sections(database_attr, object_registry):
+    # Findings of the index advisor, linked to their tables
+    index_advice = dict()
+    for section, entries in database_attr.get('INDEX_ADVICE', dict()).items():
+        index_advice[section.lower()] = [{
+            'schema': entry['SCHEMA'],
+            'table': entry['TABLE'],
+            'table_sgmlid': object_registry.table_id(entry['SCHEMA'], entry['TABLE']),
+            'index': entry.get('INDEX'),
+            'constraint': entry.get('CONSTRAINT'),
+            'columns': ', '.join(column or '(expression)' for column in entry.get('COLUMNS', list())),
+            'referenced': '.'.join((entry['REFERENCED_SCHEMA'], entry['REFERENCED_TABLE']))
+                          if 'REFERENCED_TABLE' in entry else None,
+            'redundant_to': entry.get('REDUNDANT_TO'),
+            'reason': entry.get('REASON', '').lower(),
+            'size': use_units(entry.get('SIZE')),
+            'supports_foreign_key': entry.get('SUPPORTS_FOREIGN_KEY', False),
+        } for entry in entries]
+
+    # Extensions installed in the database
+    extensions = list()
+    for extension in sorted(database_attr.get('EXTENSION', dict())):
+        extension_attr = database_attr['EXTENSION'][extension]
+        extensions.append({
+            'extension': extension,
+            'extension_version': extension_attr['VERSION'],
+            'extension_schema': extension_attr['SCHEMA'],
+            'extension_comment': extension_attr['DESCRIPTION'],
+        })
+
+    # Waves of the bulk load plan and the foreign key cycles
+    load_order = database_attr.get('LOAD_ORDER', dict())
+
+    def load_order_table(schema, table):
+        return {
+            'schema': schema,
+            'table': table,
+            'table_sgmlid': object_registry.table_id(schema, table),
+        }
+    load_waves = [[load_order_table(*table) for table in wave] for wave in load_order.get('WAVES', list())]
+    load_cycles = [{
+        'tables': [load_order_table(*table) for table in cycle['TABLES']],
+        'constraints': ', '.join('{}.{}.{}'.format(*con) for con in cycle['CONSTRAINTS']),
+    } for cycle in load_order.get('CYCLES', list())]
+
+    # Tables ranked by the space a column reorder saves
+    row_layout = list()
+    for entry in database_attr.get('ROW_LAYOUT', list()):
+        row_layout.append({
+            'schema': entry['SCHEMA'],
+            'table': entry['TABLE'],
+            'table_sgmlid': object_registry.table_id(entry['SCHEMA'], entry['TABLE']),
+            'row_width': entry['ROW_WIDTH'],
+            'padding': entry['PADDING'],
+            'optimal_row_width': entry['OPTIMAL_ROW_WIDTH'],
+            'optimal_order': ', '.join(entry['OPTIMAL_ORDER']),
+            'reltuples': entry['RELTUPLES'],
+            'estimated_savings': use_units(entry['ESTIMATED_SAVINGS']),
+        })
+
+    return {
+        'index_advice': index_advice,
+        'row_layout': row_layout,
+        'load_waves': load_waves,
+        'load_cycles': load_cycles,
+        'extensions': extensions,
+    }
+
+
+#####
+# render_html_dependencies
+#    The table of the layers and services dependencies, or None without any
+def render_html_dependencies(template_lookup, dependencies, object_registry):
+    if not dependencies:
+        return None
+    template = template_lookup.get_template('make_html_dependencies.mako')
+    return template.render(dependencies=dependencies, reference_id=object_registry.reference_id,
+                           html_fragment=html_fragment)
+
+
+# Templates which are used by other templates or by a special output mode
+# instead of producing an output on their own
+AUXILIARY_TEMPLATES = ('make_html_dependencies', 'html_defs', 'html_shard_index', 'html_shard_page')
+
+
+#####
+# write_using_templates
+#
+# Generate structure that HTML::Template requires out of the
+# 'STRUCT' for table related information, and 'STRUCT' for
+# the schema and function information
+def write_using_templates(db, database, template_path, output_filename_base, wanted_output, cache_dir=None,
+                          jobs=1, html_shards=None, profiler=None):
+    print('write using templates')
+    struct = db[database]['STRUCT']
+    if profiler is None:
+        profiler = Profiler()
+
+    view_definitions = SqlPrettyprintCache(cache_dir)
+
+    schemas = list()
+
+    # SGML ids and object ids of everything documented, assigned once
+    object_registry = ObjectRegistry(database, struct)
+
+    # Every foreign key column of the documented tables, indexed once
+    foreign_key_index = ForeignKeyIndex(struct, object_registry)
+    object_registry.add_links(foreign_key_index.links)
+
+    profiler.begin('template context')
+    for schema in sorted(struct.keys()):
+        profiler.begin_step(schema, 'schema')
+        schemas.append(make_schema_context(schema, struct[schema], object_registry, foreign_key_index,
+                                           view_definitions, len(struct), profiler))
+
+    profiler.end_steps('schema')
+    view_definitions.save()
 
     # Link the various components together via the template.
     fk_links = list()
-    fkeys = list()
-    for schema in sorted(struct.keys()):
-        schema_attr = struct[schema]
-        for table in sorted(schema_attr['TABLE'].keys() if 'TABLE' in schema_attr else []):
-            table_attr = schema_attr['TABLE'][table]
-            columnnames = sorted(table_attr['COLUMN'].keys(),
-                                 key=lambda column_name: table_attr['COLUMN'][column_name]['ORDER'])
-            for column in columnnames:
-                column_attr = table_attr['COLUMN'][column]
-                for con in sorted(column_attr['CON'].keys() if 'CON' in column_attr else []):
-                    con_attr = column_attr['CON'][con]
-                    # To prevent a multi-column foreign key from appearing
-                    # several times, we've opted
-                    # to simply display the first column of any given key.
-                    #  Since column numbering always starts at 1
-                    # for foreign keys.
-                    if con_attr['TYPE'] == 'FOREIGN KEY' and con_attr['COLNUM'] == 1:
-                        # Pull out some of the longer keys
-                        ref_table = con_attr['FKTABLE']
-                        ref_schema = con_attr['FKSCHEMA']
-                        ref_column = con_attr['FK-COL NAME']
-
-                        # Default values cause these elements to attach
-                        # to the bottom in Dia
-                        # If a KEYGROUP is not defined, it's a single column.
-                        #  Modify the ref_con and key_con variables to attach
-                        # the to the columns connection point directly.
-                        ref_con = 0
-                        key_con = 0
-                        keycon_offset = 0
-                        if 'KEYGROUP' not in con_attr:
-                            ref_con = struct[ref_schema]['TABLE'][ref_table]['COLUMN'][ref_column]['ORDER']
-                            key_con = column_attr['ORDER']
-                            keycon_offset = 1
-
-                        # Bump object_id
-                        object_id = object_id + 1
-
-                        fk_links.append({
-                            'fk_link_name': con,
-                            'fk_link_name_dbk': docbook(con),
-                            'fk_link_name_dot': graphviz(con),
-                            'handle0_connection': key_con,
-                            'handle0_connection_dbk': docbook(key_con),
-                            'handle0_connection_dia': 6 + (key_con * 2),
-                            'handle0_name': table,
-                            'handle0_name_dbk': docbook(table),
-                            'handle0_schema': schema,
-                            'handle0_to': tableids[schema + '.' + table],
-                            'handle0_to_dbk': docbook(tableids[schema + '.' + table]),
-                            'handle1_connection': ref_con,
-                            'handle1_connection_dbk': docbook(ref_con),
-                            'handle1_connection_dia': 6 + (ref_con * 2) + keycon_offset,
-                            'handle1_name': ref_table,
-                            'handle1_name_dbk': docbook(ref_table),
-                            'handle1_schema': ref_schema,
-                            'handle1_to': tableids[ref_schema + '.' + ref_table],
-                            'handle1_to_dbk': docbook(tableids[ref_schema + '.' + ref_table]),
-                            'object_id': object_id,
-                            'object_id_dbk': docbook(object_id),
-                        })
-
-                        # Build the array of schemas
-                        if len(struct) > 1:
-                            fk_links[-1]["number_of_schemas"] = len(struct)
+    for edge in foreign_key_index.links:
+        # Default values cause these elements to attach
+        # to the bottom in Dia
+        # If a KEYGROUP is not defined, it's a single column.
+        #  Modify the ref_con and key_con variables to attach
+        # the to the columns connection point directly.
+        ref_con = 0
+        key_con = 0
+        keycon_offset = 0
+        if edge['keygroup'] is None:
+            ref_con = edge['ref_column_order']
+            key_con = edge['column_order']
+            keycon_offset = 1
+
+        object_id = object_registry.link_object_id(edge)
+
+        table = edge['table']
+        schema = edge['schema']
+        ref_table = edge['ref_table']
+        ref_schema = edge['ref_schema']
+        con = edge['con']
+        fk_links.append({
+            'fk_link_name': con,
+            'fk_link_name_dbk': docbook(con),
+            'fk_link_name_dot': graphviz(con),
+            'handle0_connection': key_con,
+            'handle0_connection_dbk': docbook(key_con),
+            'handle0_connection_dia': 6 + (key_con * 2),
+            'handle0_name': table,
+            'handle0_name_dbk': docbook(table),
+            'handle0_schema': schema,
+            'handle0_to': object_registry.table_object_id(schema, table),
+            'handle0_to_dbk': docbook(object_registry.table_object_id(schema, table)),
+            'handle1_connection': ref_con,
+            'handle1_connection_dbk': docbook(ref_con),
+            'handle1_connection_dia': 6 + (ref_con * 2) + keycon_offset,
+            'handle1_name': ref_table,
+            'handle1_name_dbk': docbook(ref_table),
+            'handle1_schema': ref_schema,
+            'handle1_to': object_registry.table_object_id(ref_schema, ref_table),
+            'handle1_to_dbk': docbook(object_registry.table_object_id(ref_schema, ref_table)),
+            'object_id': object_id,
+            'object_id_dbk': docbook(object_id),
+        })
+
+        # Build the array of schemas
+        if len(struct) > 1:
+            fk_links[-1]["number_of_schemas"] = len(struct)
+
+    # The dump date only moves when the documented catalog changed, so the
+    # outputs of an unchanged database stay the same between runs.
+    manifest = OutputManifest(cache_dir, output_filename_base)
+    fingerprint = content_hash(db[database])
+    dumped_on = manifest.dumped_on(fingerprint, datetime.now().strftime('%Y-%m-%d'))
 
     # Make database level comment information
-    dumped_on = datetime.now().strftime('%Y-%m-%d')
     database_comment = db[database]['COMMENT']
     if database_comment is None:
         database_comment = ''
@@ -1554,49 +3471,596 @@ def write_using_templates(db, database, template_path, output_filename_base, wan
     mako_templates = list()
     for dir, _, files in os.walk(template_path):
         for file in files:
-            if os.path.splitext(file)[1] == '.mako' and os.path.splitext(file)[0] != 'make_html_dependencies':
+            if os.path.splitext(file)[1] == '.mako' and os.path.splitext(file)[0] not in AUXILIARY_TEMPLATES:
                 mako_templates.append(file)
 
     # Ensure we've told the user if we don't find any files.
     if not mako_templates:
         raise RuntimeError('Templates files not found in {}'.format(template_path))
 
-    template_lookup = mako.lookup.TemplateLookup(directories=[template_path], input_encoding='utf-8')
-
-    def make_html_dependencies(dependencies, root=None):
-        if not dependencies:
-            return None
-        template = template_lookup.get_template('make_html_dependencies.mako')
-        return template.render(dependencies=dependencies)
+    template_lookup = make_template_lookup(template_path, cache_dir)
+
+    html_dependencies = render_html_dependencies(template_lookup, db[database]['DEPENDENCIES'], object_registry)
+
+    # Volatile and parallel unsafe functions called by views and defaults,
+    # which keep the queries using them from being inlined or run in parallel
+    function_usage = list()
+    for schema in sorted(struct):
+        function_usage += make_function_usage(schema, struct[schema].get('FUNCTION', dict()), object_registry)
+
+    template_context = {
+        'database': database,
+        'database_dbk': docbook(database),
+        'database_sgmlid': object_registry.database_id,
+        'database_comment': database_comment,
+        'database_comment_dbk': docbook(database_comment),
+        'database_comment_html': html(database_comment),
+        'dumped_on': dumped_on,
+        'dumped_on_dbk': docbook(dumped_on),
+        'fk_links': fk_links,
+        'schemas': schemas,
+        'dependencies': html_dependencies,
+        'function_usage': function_usage,
+    }
+    template_context.update(make_database_sections(db[database], object_registry))
 
-    dependencies = db[database]['DEPENDENCIES']
-    html_dependencies = make_html_dependencies(dependencies)
+    # Outputs are rendered again only when the data or the code they are
+    # rendered by changed.
+    renderer_hash = template_library_hash(template_path)
+    document_inputs = content_hash(renderer_hash, fingerprint, dumped_on)
 
     # Process all found templates.
+    render_jobs = list()
     for template_file in mako_templates:
         file_extension = os.path.splitext(os.path.split(template_file)[1])[0]
         if wanted_output and file_extension != wanted_output:
             continue
+        if file_extension == 'html' and html_shards:
+            output_dir = output_filename_base + '_html'
+            shard_context, shard_jobs = prepare_html_shards(schemas, html_dependencies, html_shards, output_dir,
+                                                            content_hash(renderer_hash, database), document_inputs)
+            template_context.update(shard_context)
+            print('Producing {} from {} ({} pages)'.format(output_dir, HTML_SHARD_PAGE_TEMPLATE, len(shard_jobs)))
+            render_jobs += shard_jobs
+            continue
         output_filename = output_filename_base + '.' + file_extension
         print('Producing {} from {}'.format(output_filename, template_file))
+        render_jobs.append({
+            'template': template_file,
+            'output': output_filename,
+            'inputs': content_hash(document_inputs, template_file),
+        })
+
+    profiler.end()
+
+    up_to_date = render_pending_jobs(render_jobs, template_context, template_lookup, template_path, cache_dir, manifest,
+                                     renderer_hash, jobs, profiler)
+    if up_to_date:
+        print('{} of {} outputs are up to date'.format(up_to_date, len(render_jobs)))
+    manifest.save(fingerprint, dumped_on)
+
+
+#####
+# write_by_schema
+#    The html shards of a database collected by info_collect_by_schema().
+#    Every schema is read back from its file, postprocessed, saved next to it
+#    as <schema>.postprocessed.json and its pages written before the next one
+#    is read; then the index page with the sections about the whole database.
+#    Besides the CrossReferenceIndex, only what these sections and the search
+#    index need is kept of every schema. DEPENDENCIES, INDEX_ADVICE,
+#    ROW_LAYOUT and LOAD_ORDER of the whole database are added to index.db.
+def write_by_schema(index, layers_url, services_url, template_path, output_filename_base, cache_dir=None, jobs=1,
+                    html_shards='schema', profiler=None):
+    print('postprocess and write schema by schema')
+    database = index.database
+    database_attr = index.db[database]
+    struct = database_attr['STRUCT']
+    if profiler is None:
+        profiler = Profiler()
+
+    view_definitions = SqlPrettyprintCache(cache_dir)
+    object_registry = ObjectRegistry(database, struct)
+    foreign_key_index = ForeignKeyIndex(struct, object_registry)
+    comments_parser = CommentsParser(index.db, layers_url, services_url)
+
+    template_lookup = make_template_lookup(template_path, cache_dir)
+    renderer_hash = template_library_hash(template_path)
+    manifest = OutputManifest(cache_dir, output_filename_base)
+
+    # Assign a page to every anchor before the first schema is written, so
+    # that links to the schemas written later can be resolved
+    output_dir = output_filename_base + '_html'
+    os.makedirs(output_dir, exist_ok=True)
+    shard_schemas = list()
+    for schema in sorted(struct):
+        shard_schemas.append((object_registry.schema_id(schema), [
+            object_registry.table_id(schema, table) for table in sorted(struct[schema].get('TABLE', dict()))
+        ] + [
+            object_registry.function_id(schema, function) for function in sorted(struct[schema].get('FUNCTION', dict()))
+        ]))
+    html_files = html_shard_files(shard_schemas, html_shards)
+    html_pages = {sgmlid: urllib.parse.quote(filename) for sgmlid, filename in html_files.items()}
+    pages_inputs = content_hash(content_hash(renderer_hash, database), html_shards, html_pages)
+    print('Producing {} from {} ({} pages)'.format(output_dir, HTML_SHARD_PAGE_TEMPLATE, len(set(html_files.values()))))
+
+    # Make database level comment information
+    database_comment = database_attr['COMMENT']
+    if database_comment is None:
+        database_comment = ''
+
+    template_context = {
+        'database': database,
+        'database_dbk': docbook(database),
+        'database_sgmlid': object_registry.database_id,
+        'database_comment': database_comment,
+        'database_comment_dbk': docbook(database_comment),
+        'database_comment_html': html(database_comment),
+        'html_shards': html_shards,
+        'html_pages': html_pages,
+    }
+
+    index_advice = {section: list() for section in IndexAdvisor.SECTIONS}
+    row_layout = list()
+    function_usage = list()
+    html_schemas = list()
+    search_index = HtmlSearchIndex()
+    schema_hashes = list()
+    page_count = up_to_date = 0
+
+    # One pool renders the pages of all schemas. Its workers are started
+    # before any schema is read and every page job brings what it shows.
+    render_pool = contextlib.nullcontext()
+    if jobs > 1:
+        render_pool = make_render_pool(jobs, [HTML_SHARD_PAGE_TEMPLATE], template_context, template_lookup,
+                                    template_path, cache_dir)
+    with render_pool as executor:
+        for schema in sorted(struct):
+            profiler.begin_step(schema, 'schema')
+            filename = index.files[schema]
+            with open(filename) as schema_file:
+                db = json.load(schema_file)
+
+            comments_parser.parse_part(db)
+            index.add_keywords(db)
+            IndexAdvisor(db).advise()
+            RowLayoutAnalyzer(db).analyze()
+            write_json_if_changed(db, os.path.splitext(filename)[0] + '.postprocessed.json')
+            schema_hashes.append(content_hash(db[database]))
+            for section, entries in db[database]['INDEX_ADVICE'].items():
+                index_advice[section] += entries
+            row_layout += db[database]['ROW_LAYOUT']
+
+            schema_attr = db[database]['STRUCT'][schema]
+            schema_context = make_schema_context(schema, schema_attr, object_registry, foreign_key_index,
+                                                 view_definitions, len(struct), profiler)
+            profiler.end_steps('table')
+            function_usage += make_function_usage(schema, schema_attr.get('FUNCTION', dict()), object_registry)
+
+            html_schema = relink_schema(schema_context, html_pages)
+            search_index.add_schema(html_schema, html_pages)
+            # The index page only counts the tables and functions of the schemas
+            html_schemas.append({
+                'schema': schema,
+                'schema_sgmlid': html_schema['schema_sgmlid'],
+                'tables': [table['table_sgmlid'] for table in html_schema['tables']],
+                'functions': [function['function_sgmlid'] for function in html_schema['functions']],
+            })
+
+            schema_jobs = html_shard_jobs(schema_context, 0, html_shards, html_files, output_dir, pages_inputs)
+            for job in schema_jobs:
+                job['context'] = html_page_context(html_schema, job['page_args'])
+            page_count += len(schema_jobs)
+            up_to_date += render_pending_jobs(schema_jobs, template_context, template_lookup, template_path, cache_dir,
+                                              manifest, renderer_hash, jobs, profiler, executor)
+    profiler.end_steps('schema')
+    view_definitions.save()
+
+    DependenciesInvestigator(index.db).investigate()
+    LoadOrderPlanner(index.db).plan()
+    database_attr['INDEX_ADVICE'] = index_advice
+    database_attr['ROW_LAYOUT'] = RowLayoutAnalyzer.rank(row_layout)
+
+    # The dump date only moves when the documented catalog changed
+    fingerprint = content_hash(schema_hashes, {key: value for key, value in database_attr.items() if key != 'STRUCT'})
+    dumped_on = manifest.dumped_on(fingerprint, datetime.now().strftime('%Y-%m-%d'))
+
+    html_dependencies = render_html_dependencies(template_lookup, database_attr['DEPENDENCIES'], object_registry)
+    template_context.update(make_database_sections(database_attr, object_registry))
+    template_context.update({
+        'dumped_on': dumped_on,
+        'dumped_on_dbk': docbook(dumped_on),
+        'dependencies': html_dependencies,
+        'function_usage': function_usage,
+        'html_schemas': html_schemas,
+        'html_dependencies': relink_html(html_dependencies, html_pages),
+    })
+    search_index.write(os.path.join(output_dir, HTML_SEARCH_INDEX))
+
+    index_job = {
+        'template': HTML_SHARD_INDEX_TEMPLATE,
+        'output': os.path.join(output_dir, 'index.html'),
+        'inputs': content_hash(content_hash(renderer_hash, fingerprint, dumped_on), HTML_SHARD_INDEX_TEMPLATE,
+                               html_shards),
+    }
+    page_count += 1
+    up_to_date += render_pending_jobs([index_job], template_context, template_lookup, template_path, cache_dir,
+                                      manifest, renderer_hash, jobs, profiler)
+    if up_to_date:
+        print('{} of {} outputs are up to date'.format(up_to_date, page_count))
+    manifest.save(fingerprint, dumped_on)
+
+
+#####
+# render_pending_jobs
+#    Renders the jobs whose inputs changed since the manifest recorded them,
+#    in this process or in a pool of up to jobs processes, and records their
+#    outputs in the manifest. Returns the number of jobs which were up to date.
+#    With executor, a pool made by make_render_pool() for several calls, the
+#    jobs are rendered by it and template_context is the one of its workers.
+def render_pending_jobs(render_jobs, template_context, template_lookup, template_path, cache_dir, manifest,
+                        renderer_hash, jobs=1, profiler=None, executor=None):
+    if profiler is None:
+        profiler = Profiler()
+
+    pending_jobs = list()
+    for job in render_jobs:
+        if manifest.is_up_to_date(job['output'], job['inputs']):
+            continue
+        job['previous_content'] = manifest.content_hash(job['output'])
+        job['fragments'] = manifest.fragments_directory(job['output'])
+        job['fragments_salt'] = renderer_hash
+        pending_jobs.append(job)
+
+    if executor is None and (jobs <= 1 or len(pending_jobs) <= 1):
+        for job in pending_jobs:
+            # Pages of html shards are too many to be phases of their own
+            profiler.begin(os.path.basename(job['output']),
+                           'template' if job['template'] == HTML_SHARD_PAGE_TEMPLATE else 'phase',
+                           template=job['template'])
+            content = render_template(template_lookup, job, template_context)
+            profiler.end()
+            manifest.record(job['output'], job['inputs'], content)
+        return len(render_jobs) - len(pending_jobs)
+
+    if executor is None:
+        with make_render_pool(min(jobs, len(pending_jobs)), set(job['template'] for job in pending_jobs),
+                              template_context, template_lookup, template_path, cache_dir) as executor:
+            return render_pending_jobs(render_jobs, template_context, template_lookup, template_path, cache_dir,
+                                       manifest, renderer_hash, jobs, profiler, executor)
+
+    futures = list()
+    for job in pending_jobs:
+        futures.append(executor.submit(_render_worker_run, job))
+    for job, future in zip(pending_jobs, futures):
+        manifest.record(job['output'], job['inputs'], future.result())
+    return len(render_jobs) - len(pending_jobs)
+
+
+#####
+# make_render_pool
+#    Every template only reads the shared context, so they are rendered by a
+#    pool of processes. With 'fork' the workers inherit the context without
+#    copying it, otherwise it is pickled once per worker. What differs between
+#    the jobs of the pool goes in the context of every job.
+def make_render_pool(jobs, template_files, template_context, template_lookup, template_path, cache_dir):
+    import concurrent.futures
+    import multiprocessing
+
+    # Compile the templates once here rather than in every worker
+    for template_file in template_files:
+        template_lookup.get_template(template_file)
+
+    if 'fork' in multiprocessing.get_all_start_methods():
+        mp_context = multiprocessing.get_context('fork')
+    else:
+        mp_context = multiprocessing.get_context()
+    return concurrent.futures.ProcessPoolExecutor(max_workers=jobs, mp_context=mp_context,
+                                                  initializer=_render_worker_init,
+                                                  initargs=(template_path, cache_dir, template_context))
+
+
+#####
+# template_library_hash
+#    Hash of everything the outputs are rendered by: the templates and this
+#    module, which prepares their context.
+def template_library_hash(template_path):
+    result = hashlib.sha1()
+    for filename in sorted(os.listdir(template_path)) + [__file__]:
+        filename = os.path.join(template_path, filename)
+        if os.path.isfile(filename):
+            result.update(filename.encode('utf-8'))
+            result.update(file_hash(filename).encode('ascii'))
+    return result.hexdigest()
+
+
+#####
+# make_template_lookup
+#    Compiled templates are kept in the cache directory, one subdirectory per
+#    template library. Mako recompiles a template when its source is newer
+#    than the compiled module.
+def make_template_lookup(template_path, cache_dir=None):
+    import mako.lookup
+
+    module_directory = None
+    if cache_dir:
+        library_key = hashlib.sha1(os.path.abspath(template_path).encode('utf-8')).hexdigest()[:16]
+        module_directory = os.path.join(cache_dir, 'templates', library_key)
+    return mako.lookup.TemplateLookup(directories=[template_path], module_directory=module_directory,
+                                      input_encoding='utf-8')
+
+
+# Size of the buffer between the rendered template and the output file
+OUTPUT_BUFFER_SIZE = 1024 * 1024
+
+
+#####
+# NewlineNormalizingWriter
+#    Receives the rendered template chunk by chunk and writes it to the file
+#    with os.linesep replaced by '\n'. A line separator split between two
+#    chunks is held back until the next chunk arrives.
+class NewlineNormalizingWriter:
+    def __init__(self, file):
+        self.file = file
+        self.linesep = os.linesep
+        self.pending = ''
+
+    def write(self, text):
+        if self.linesep == '\n':
+            self.file.write(text)
+            return
+        text = self.pending + text
+        self.pending = ''
+        for length in range(len(self.linesep) - 1, 0, -1):
+            if text.endswith(self.linesep[:length]):
+                self.pending = text[-length:]
+                text = text[:-length]
+                break
+        self.file.write(text.replace(self.linesep, '\n'))
+
+    def close(self):
+        self.file.write(self.pending)
+        self.pending = ''
+
+
+#####
+# render_template
+#    Renders one job into its output file and returns the hash of the output.
+#    The output file is only replaced when its contents changed. The context
+#    of the job, if any, is added last.
+def render_template(template_lookup, job, template_context):
+    import mako.runtime
+
+    template = template_lookup.get_template(job['template'])
+    fragments = FragmentCache(job.get('fragments'), job.get('fragments_salt'))
+    template_context = dict(template_context, fragments=fragments, **(job.get('page_args') or dict()))
+    template_context.update(job.get('context') or dict())
+
+    # Print the processed template while it is being rendered, so the whole
+    # document is never held in memory.
+    temporary_filename = job['output'] + '.tmp'
+    with open(temporary_filename, mode='w', newline='\n', encoding='utf-8', buffering=OUTPUT_BUFFER_SIZE) as f:
+        writer = NewlineNormalizingWriter(f)
+        template.render_context(mako.runtime.Context(writer, **template_context))
+        writer.close()
+
+    fragments.remove_unused()
+    return replace_if_changed(temporary_filename, job['output'], job.get('previous_content'))
+
+
+# State of a template rendering worker process
+_render_worker = dict()
+
 
-        template = template_lookup.get_template(template_file)
-        filled_template = template.render(database=database,
-                                          database_dbk=docbook(database),
-                                          database_sgmlid=sgml_safe_id(database),
-                                          database_comment=database_comment,
-                                          database_comment_dbk=docbook(database_comment),
-                                          database_comment_html=html(database_comment),
-                                          dumped_on=dumped_on,
-                                          dumped_on_dbk=docbook(dumped_on),
-                                          fk_links=fk_links,
-                                          schemas=schemas,
-                                          dependencies=html_dependencies)
-        filled_template = filled_template.replace(os.linesep, '\n')
-
-        # Print the processed template.
-        with open(output_filename, mode='w', newline='\n', encoding='utf-8') as f:
-            f.write(filled_template)
+def _render_worker_init(template_path, cache_dir, template_context):
+    _render_worker['template_lookup'] = make_template_lookup(template_path, cache_dir)
+    _render_worker['template_context'] = template_context
+
+
+def _render_worker_run(job):
+    return render_template(_render_worker['template_lookup'], job, _render_worker['template_context'])
+
+
+#####
+# HTML shards
+#    Instead of one document, the html output can be written as a directory
+#    with an index page, one page per schema and, optionally, one page per
+#    table or function, plus a prebuilt search index for the index page.
+HTML_SHARD_INDEX_TEMPLATE = 'html_shard_index.mako'
+HTML_SHARD_PAGE_TEMPLATE = 'html_shard_page.mako'
+HTML_SEARCH_INDEX = 'search_index.js'
+
+_INNER_HREF_RE = re.compile('href="#([^"]*)"')
+_SEARCH_TERM_RE = re.compile('\\w+')
+
+# Bytes of a page file name taken from the SGML id; the file systems allow 255
+HTML_SHARD_FILENAME_BYTES = 120
+
+
+def html_shard_filename(sgmlid, used_filenames):
+    filename = re.sub('[^\\w.-]', '_', sgmlid) or '_'
+    # Long ids, of functions with many arguments, are cut and told apart by
+    # a hash of the whole id
+    if len(filename.encode('utf-8')) > HTML_SHARD_FILENAME_BYTES:
+        filename = '{}-{}'.format(filename.encode('utf-8')[:HTML_SHARD_FILENAME_BYTES].decode('utf-8', 'ignore'),
+                                  hashlib.sha1(sgmlid.encode('utf-8')).hexdigest()[:10])
+    candidate = filename
+    suffix = 1
+    while candidate.lower() in used_filenames:
+        suffix += 1
+        candidate = '{}-{}'.format(filename, suffix)
+    used_filenames.add(candidate.lower())
+    return candidate + '.html'
+
+
+def relink_html(text, html_pages):
+    if not text:
+        return text
+    return _INNER_HREF_RE.sub(
+        lambda m: 'href="{}#{}"'.format(html_pages.get(urllib.parse.unquote_plus(m.group(1)), ''), m.group(1)), text)
+
+
+def search_terms(*texts):
+    terms = set()
+    for text in texts:
+        if not text:
+            continue
+        for term in _SEARCH_TERM_RE.findall(text.lower()):
+            terms.add(term)
+            if '_' in term:
+                terms.update(part for part in term.split('_') if part)
+    return terms
+
+
+#####
+# html_shard_files
+#    File of every page by the SGML id of the schema, table or function it
+#    shows. schemas are (SGML id of the schema, SGML ids of its tables and
+#    functions) in the order of the document.
+def html_shard_files(schemas, html_shards):
+    used_filenames = set()
+    html_files = {'index': 'index.html'}
+    for schema_sgmlid, object_sgmlids in schemas:
+        schema_file = html_files[schema_sgmlid] = html_shard_filename(schema_sgmlid, used_filenames)
+        for sgmlid in object_sgmlids:
+            html_files[sgmlid] = html_shard_filename(sgmlid, used_filenames) if html_shards == 'object' else schema_file
+    return html_files
+
+
+#####
+# html_shard_jobs
+#    Render jobs of the page of a schema and, with html_shards == 'object', of
+#    the pages of its tables and functions. schema_index is the position of the
+#    schema in html_schemas of the template context.
+def html_shard_jobs(schema, schema_index, html_shards, html_files, output_dir, pages_inputs):
+    jobs = list()
+
+    def add_job(sgmlid, page_args, page_data):
+        jobs.append({
+            'template': HTML_SHARD_PAGE_TEMPLATE,
+            'output': os.path.join(output_dir, html_files[sgmlid]),
+            'page_args': page_args,
+            'inputs': content_hash(pages_inputs, page_args, page_data),
+        })
+
+    add_job(schema['schema_sgmlid'], {'page_kind': 'schema', 'schema_index': schema_index}, schema)
+    if html_shards == 'object':
+        for kind, sgmlid_key in (('table', 'table_sgmlid'), ('function', 'function_sgmlid')):
+            for object_index, obj in enumerate(schema[kind + 's']):
+                add_job(obj[sgmlid_key], {'page_kind': kind, 'schema_index': schema_index,
+                                          'object_index': object_index}, obj)
+    return jobs
+
+
+#####
+# html_page_context
+#    The html_schemas a page job of the schema needs: the page of a table or
+#    function only shows that object, so only it is sent to the worker.
+def html_page_context(schema, page_args):
+    if page_args['page_kind'] == 'schema':
+        return {'html_schemas': [schema]}
+    page_object = schema[page_args['page_kind'] + 's'][page_args['object_index']]
+    return {'html_schemas': [{page_args['page_kind'] + 's': [page_object]}], 'object_index': 0}
+
+
+#####
+# relink_schema
+#    Comments are rendered with links inside a single document, point them
+#    to the pages their targets are written to.
+def relink_schema(schema, html_pages):
+    return dict(
+        schema,
+        schema_comment_html=relink_html(schema['schema_comment_html'], html_pages),
+        tables=[dict(table, table_comment_html=relink_html(table['table_comment_html'], html_pages))
+                for table in schema['tables']],
+        functions=[dict(function, function_comment_html=relink_html(function['function_comment_html'], html_pages))
+                   for function in schema['functions']],
+    )
+
+
+#####
+# prepare_html_shards
+#    Returns the additional template context of the shard templates and the
+#    render jobs of all pages. A page is rendered again when the data it shows,
+#    the set of pages it can link to or the renderer changed; the index page
+#    whenever any document is.
+def prepare_html_shards(schemas, html_dependencies, html_shards, output_dir, renderer_hash, document_inputs):
+    os.makedirs(output_dir, exist_ok=True)
+
+    # Assign a page to every anchor first, so that links between pages can
+    # be resolved while rendering.
+    html_files = html_shard_files([(schema['schema_sgmlid'], [table['table_sgmlid'] for table in schema['tables']]
+                                    + [function['function_sgmlid'] for function in schema['functions']])
+                                   for schema in schemas], html_shards)
+    html_pages = {sgmlid: urllib.parse.quote(filename) for sgmlid, filename in html_files.items()}
+    pages_inputs = content_hash(renderer_hash, html_shards, html_pages)
+
+    jobs = [{
+        'template': HTML_SHARD_INDEX_TEMPLATE,
+        'output': os.path.join(output_dir, 'index.html'),
+        'inputs': content_hash(document_inputs, HTML_SHARD_INDEX_TEMPLATE, html_shards),
+    }]
+    html_schemas = list()
+    search_index = HtmlSearchIndex()
+    for schema_index, schema in enumerate(schemas):
+        jobs += html_shard_jobs(schema, schema_index, html_shards, html_files, output_dir, pages_inputs)
+        html_schemas.append(relink_schema(schema, html_pages))
+        search_index.add_schema(html_schemas[-1], html_pages)
+    search_index.write(os.path.join(output_dir, HTML_SEARCH_INDEX))
+
+    shard_context = {
+        'html_shards': html_shards,
+        'html_pages': html_pages,
+        'html_schemas': html_schemas,
+        'html_dependencies': relink_html(html_dependencies, html_pages),
+    }
+    return shard_context, jobs
+
+
+#####
+# HtmlSearchIndex
+#    Inverted index over object names, column names and comments:
+#      docs  -> list of [title, kind, url]
+#      terms -> lower case word -> sorted list of positions in docs
+#    It is written as a script assigning it to searchIndex, which the index
+#    page loads with a script element: browsers don't let pages opened from
+#    the file system fetch() files.
+class HtmlSearchIndex:
+    def __init__(self):
+        self.docs = list()
+        self.terms = dict()
+
+    def __add_doc(self, title, kind, url, doc_terms):
+        doc = len(self.docs)
+        self.docs.append([title, kind, url])
+        for term in doc_terms:
+            self.terms.setdefault(term, list()).append(doc)
+
+    def add_schema(self, html_schema, html_pages):
+        def url(sgmlid):
+            return '{}#{}'.format(html_pages[sgmlid], html_fragment(sgmlid))
+
+        self.__add_doc(html_schema['schema'], 'schema', url(html_schema['schema_sgmlid']),
+                       search_terms(html_schema['schema'], html_schema['schema_comment']))
+        for table in html_schema['tables']:
+            texts = [table['schema'], table['table'], table['table_comment']]
+            for column in table['columns']:
+                texts.append(column['column'])
+                texts.append(column['column_comment'])
+            self.__add_doc(table['schema'] + '.' + table['table'], table['table_type'], url(table['table_sgmlid']),
+                           search_terms(*texts))
+        for function in html_schema['functions']:
+            self.__add_doc(function['schema'] + '.' + function['function'], 'function',
+                           url(function['function_sgmlid']),
+                           search_terms(function['schema'], function['function'], function['function_comment']))
+
+    def write(self, filename):
+        temporary_filename = filename + '.tmp'
+        with open(temporary_filename, 'w', encoding='utf-8') as f:
+            f.write('var searchIndex = ')
+            json.dump({'docs': self.docs, 'terms': self.terms}, f, ensure_ascii=False, separators=(',', ':'),
+                      sort_keys=True)
+            f.write(';\n')
+        replace_if_changed(temporary_filename, filename)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,724 @@
+<%def name="permission_cell(permissions, aspect)">\
+% if aspect in permissions:
+<td style="text-align:center">&diams;</td>\
+% else:
+<td></td>\
+% endif
+</%def>
+
+<%def name="head(title)">\
+<!DOCTYPE html>
+
+<html lang="ru">
+<head>
+  <title>${title | h}</title>
+  <meta http-equiv="Content-Type" content="text/html; charset=utf-8">
+  <style>
+  BODY {
+    color:	#000000;
+    background-color: #FFFFFF;
+    font-family: Helvetica, sans-serif;
+  }
+
+  P {
+    margin-top: 5px;
+    margin-bottom: 5px;
+  }
+
+  P.w3ref {
+    font-size: 8pt;
+    font-style: italic;
+    text-align: right;
+  }
+
+  P.detail {
+    font-size: 10pt;
+  }
+
+  .error {
+    color: #FFFFFF;
+    background-color: #FF0000;
+  }
+
+  H1, H2, H3, H4, H5, H6 {
+  }
+
+  OL {
+    list-style-type: upper-alpha;
+  }
+
+  UL.topic {
+    list-style-type: upper-alpha;
+  }
+
+  LI.topic {
+    font-weight : bold;
+  }
+
+  HR {
+    color: #00FF00;
+    background-color: #808080;
+  }
+
+  TABLE {
+    border-width: medium;
+    padding: 3px;
+    background-color: #000000;
+    width: 90%;
+  }
+
+  CAPTION {
+    text-transform: capitalize;
+    font-weight : bold;
+    font-size: 14pt;
+  }
+
+  TH {
+    padding: 3px;
+    color: #FFFFFF;
+    background-color: #000000;
+    text-align: left;
+  }
+
+  TR {
+    color: #000000;
+    background-color: #FFFFFF;
+    vertical-align: top;
+  }
+
+  TR.tr0 {
+    background-color: #F0F0F0;
+  }
+
+  TR.tr1 {
+    background-color: #D8D8D8;
+  }
+
+  TD {
+    padding: 3px;
+    font-size: 12pt;
+  }
+
+  TD.inactive0 {
+    background-color: #B8B8B8;
+  }
+
+  TD.inactive1 {
+    background-color: #B0B0B0;
+  }
+
+  TD.col0 {
+    font-weight : bold;
+    width: 20%;
+  }
+
+  TD.col1 {
+    font-style: italic;
+    width: 15%;
+  }
+
+  TD.col2 {
+    font-size: 12px;
+  }
+
+  </style>
+  <link rel="stylesheet" type="text/css" media="all" href="all.css">
+  <link rel="stylesheet" type="text/css" media="screen" href="screen.css">
+  <link rel="stylesheet" type="text/css" media="print" href="print.css">
+</head>
+<body>
+</%def>
+
+<%def name="table_section(table, link)">\
+<hr>
+<h2>${table['table_type']}  \
+  % if 'number_of_schemas' in table:
+<a href="${link(table['schema_sgmlid'])}#${table['schema_sgmlid'] | u}">${table['schema'] | h}</a>.\
+  % endif
+<a id="${table['table_sgmlid'] | u}">${table['table'] | h}</a>
+</h2>
+% if table['table_comment_html']:
+<p class="table_comment_html">${table['table_comment_html']}</p>
+% endif
+
+
+<table class="schema" style="width:100%; border-spacing: 0;">
+  <caption>\
+% if 'number_of_schemas' in table:
+${table['schema'] | h}.\
+% endif
+${table['table'] | h} Structure</caption>
+  <tr>
+    <th>F-Key</th>
+    <th>Name</th>
+    <th>Type</th>
+    <th>Description</th>
+  % if table['columns_profiled']:
+    <th>Data Profile</th>
+  % endif
+  </tr>
+  % for index, column in enumerate(table['columns']):
+  <tr class="tr${index % 2}">
+    <td>
+      % for column_constraint in column['column_constraints']:
+      % if 'column_fk' in column_constraint:
+      <a href="${link(column_constraint['column_fk_sgmlid'])}#${column_constraint['column_fk_sgmlid'] | u}">\
+      % if 'number_of_schemas' in column_constraint:
+${column_constraint['column_fk_schema'] | h}.\
+      % endif
+${column_constraint['column_fk_table'] | h}.\
+${column_constraint['column_fk_column'] | h}\
+      % if column_constraint['column_fk_keygroup']:
+#${column_constraint['column_fk_keygroup']}\
+      % endif
+</a>
+      % endif
+      % endfor
+    </td>
+    <td>${column['column'] | h}</td>
+    <td>${column['column_type'] | h}</td>
+    <td>
+      <i> \
+        % for column_constraint in column['column_constraints']:
+          % if 'column_primary_key' in column_constraint:
+PRIMARY KEY \
+          % endif
+          % if 'column_unique' in column_constraint:
+UNIQUE \
+            % if column_constraint['column_unique_keygroup']:
+#${column_constraint['column_unique_keygroup']}
+            % endif
+          % endif
+        % endfor
+        % if column.get('column_constraint_notnull'):
+NOT NULL \
+        % endif
+        % if column['column_default']:
+DEFAULT ${column['column_default'] | h} \
+        % endif
+</i>
+      % if column['column_comment_html']:
+      <br><br>${column['column_comment_html']}
+      % endif
+    </td>
+    % if table['columns_profiled']:
+    <td>${column.get('column_profile', '') | h}</td>
+    % endif
+  </tr>
+  % endfor
+</table>
+
+<!-- Inherits -->
+% if table['inherits']:
+<p>Table \
+% if 'number_of_schemas' in table:
+${table['schema'] | h}.\
+% endif
+${table['table'] | h} Inherits
+  % for inherit in table['inherits']:
+  <a href="${link(inherit['parent_sgmlid'])}#${inherit['parent_sgmlid'] | u}">\
+    % if 'number_of_schemas' in inherit:
+${inherit['parent_schema'] | h}.\
+    % endif
+${inherit['parent_table'] | h}</a>,
+  % endfor
+</p>
+% endif
+
+% if table['partitioned']:
+<!-- Partitions -->
+<p>Table \
+% if 'number_of_schemas' in table:
+${table['schema'] | h}.\
+% endif
+${table['table'] | h} has ${table['partition_count'] | h} partitions\
+  % if table['partition_key']:
+ by ${table['partition_key'] | h}\
+  % endif
+  % if table['partition_range']:
+, ${table['partition_range'] | h}\
+  % endif
+  % if table['partition_has_default']:
+, with a default partition\
+  % endif
+  % if table['partition_bytes']:
+, ${table['partition_bytes'] | h} in total\
+  % endif
+</p>
+
+% endif
+<!-- Statistics -->
+% if table['stats_enabled'] and table['stats_fast']:
+<p>&nbsp;</p>
+<table style="width:100%; border-spacing: 0;">
+  <caption>Statistics (estimated)</caption>
+  <tr>
+    <th>Table Space</th>
+    <th>TOAST Space</th>
+    <th>Index Space</th>
+    <th>Total Space (disk usage)</th>
+    <th>Tuple Count</th>
+    <th>Dead Tuple Count</th>
+    <th>Dead Space</th>
+    <th>Last Vacuum</th>
+    <th>Last Analyze</th>
+  </tr>
+  <tr class="tr0">
+    <td>${table['stats_table_bytes'] | h}</td>
+    <td>${table['stats_toast_bytes'] | h}</td>
+    <td>${table['stats_index_bytes'] | h}</td>
+    <td>${table['stats_total_bytes'] | h}</td>
+    <td>${table['stats_tuple_count'] | h}</td>
+    <td>${table['stats_dead_count'] | h}</td>
+    <td>${table['stats_dead_bytes'] | h}</td>
+    <td>${table['stats_last_vacuum'] | h}</td>
+    <td>${table['stats_last_analyze'] | h}</td>
+  </tr>
+</table>
+% elif table['stats_enabled']:
+<p>&nbsp;</p>
+<table style="width:100%; border-spacing: 0;">
+  <caption>Statistics</caption>
+  <tr>
+    <th>Total Space (disk usage)</th>
+    <th>Tuple Count</th>
+    <th>Active Space</th>
+    <th>Dead Space</th>
+    <th>Free Space</th>
+  </tr>
+  <tr class="tr0">
+    <td>${table['stats_table_bytes'] | h}</td>
+    <td>${table['stats_tuple_count'] | h}</td>
+    <td>${table['stats_tuple_bytes'] | h}</td>
+    <td>${table['stats_dead_bytes'] | h}</td>
+    <td>${table['stats_free_bytes'] | h}</td>
+  </tr>
+</table>
+% endif
+
+<!-- Constraint List -->
+% if table['constraints']:
+<p>&nbsp;</p>
+<table class="constraints" style="width:100%; border-spacing: 0;">
+  <caption>\
+  % if 'number_of_schemas' in table:
+${table['schema'] | h}.\
+  % endif
+${table['table'] | h} Constraints</caption>
+  <tr>
+    <th>Name</th>
+    <th>Constraint</th>
+  </tr>
+  % for index, constraint in enumerate(table['constraints']):
+  <tr class="tr${index % 2}">
+    <td>${constraint['constraint_name'] | h}</td>
+    <td>${constraint['constraint'] | h}</td>
+  </tr>
+  % endfor
+</table>
+% endif
+
+<!-- Foreign Key Discovery -->
+% if table['fk_schemas']:
+<div class="fk_schemas">
+  <p>Tables referencing this one via Foreign Key Constraints:</p>
+% for fk_schema in table['fk_schemas']:
+  <ul>
+    <li><a href="${link(fk_schema['fk_sgmlid'])}#${fk_schema['fk_sgmlid'] | u}">\
+    % if 'number_of_schemas' in fk_schema:
+${fk_schema['fk_schema'] | h}.\
+    % endif
+${fk_schema['fk_table'] | h}</a></li>
+  </ul>
+% endfor
+</div>
+% endif
+<ul class="indexes">
+<!-- Indexes -->
+% for index in table['indexes']:
+    <li><b>${index['index_name']}</b> ${index['index_definition']}</li>
+% endfor
+</ul>
+% if table['triggers']:
+<!-- Triggers -->
+<ul class="triggers">
+% for trigger in table['triggers']:
+    <li><b>${trigger['trigger'] | h}</b> ${trigger['trigger_definition'] | h}\
+  % if trigger['trigger_enabled'] != 'enabled':
+ (${trigger['trigger_enabled'] | h})\
+  % endif
+  % if trigger['trigger_comment']:
+<br>${trigger['trigger_comment'] | h}\
+  % endif
+</li>
+% endfor
+</ul>
+% endif
+<!-- View Definition -->
+% if table['view_definition']:
+<details>
+<summary>Исходный код представления</summary>
+<pre>${table['view_definition'] | h}</pre>
+</details>
+% endif
+
+<!-- List off permissions -->
+% if table['permissions']:
+<p>&nbsp;</p>
+<table style="width:100%; border-spacing: 0;">
+  <caption>Permissions which apply to \
+% if 'number_of_schemas' in table:
+${table['schema'] | h}.\
+% endif
+${table['table'] | h}</caption>
+  <tr>
+    <th>User</th>
+    <th style="text-align:center">Select</th>
+    <th style="text-align:center">Insert</th>
+    <th style="text-align:center">Update</th>
+    <th style="text-align:center">Delete</th>
+    <th style="text-align:center">Reference</th>
+    <th style="text-align:center">Rule</th>
+    <th style="text-align:center">Trigger</th>
+  </tr>
+  % for index, permission in enumerate(table['permissions']):
+  <tr class="tr${index % 2}">
+    <td>${permission['user'] | h}</td>
+    ${permission_cell(permission, 'select')}
+    ${permission_cell(permission, 'insert')}
+    ${permission_cell(permission, 'update')}
+    ${permission_cell(permission, 'delete')}
+    ${permission_cell(permission, 'references')}
+    ${permission_cell(permission, 'rule')}
+    ${permission_cell(permission, 'trigger')}
+  </tr>
+  % endfor
+</table>
+% endif
+<p>
+  <a href="${link('index')}#index">Index</a> -
+  <a href="${link(table['schema_sgmlid'])}#${table['schema_sgmlid'] | u}">Schema ${table['schema'] | h}</a>
+</p>
+</%def>
+
+<%def name="function_section(function, link)">\
+<hr>
+<h2>Function:
+<a href="${link(function['schema_sgmlid'])}#${function['schema_sgmlid'] | u}">\
+  % if 'number_of_schemas' in function:
+${function['schema'] | h}</a>.\
+  % endif
+<a id="${function['function_sgmlid'] | u}">${function['function'] | h}</a>
+</h2>
+<h3>Returns: ${function['function_returns'] | h}</h3>
+<h3>Language: ${function['function_language'] | h}</h3>
+% if function['function_attributes']:
+<h3>Attributes: ${function['function_attributes'] | h}</h3>
+% endif
+% if function['function_comment_html']:
+<p>${function['function_comment_html']}</p>
+% endif
+<details>
+<summary>Исходный код функции</summary>
+<pre>\
+% if function['function_source']:
+${function['function_source'] | h}\
+% endif
+</pre>
+</details>
+</%def>
+
+<%def name="schema_objects_section(schema)">\
+% if schema['sequences']:
+<hr>
+<table style="width:100%; border-spacing: 0;">
+  <caption>\
+% if 'number_of_schemas' in schema:
+${schema['schema'] | h}.\
+% endif
+Sequences</caption>
+  <tr>
+    <th>Name</th>
+    <th>Type</th>
+    <th>Start</th>
+    <th>Increment</th>
+    <th>Min</th>
+    <th>Max</th>
+    <th>Cache</th>
+    <th>Owned by</th>
+    <th>Description</th>
+  </tr>
+  % for index, sequence in enumerate(schema['sequences']):
+  <tr class="tr${index % 2}">
+    <td>${sequence['sequence'] | h}</td>
+    <td>${sequence['sequence_type'] or '' | h}</td>
+    <td>${'' if sequence['sequence_start'] is None else sequence['sequence_start'] | h}</td>
+    <td>${'' if sequence['sequence_increment'] is None else sequence['sequence_increment'] | h}</td>
+    <td>${'' if sequence['sequence_min'] is None else sequence['sequence_min'] | h}</td>
+    <td>${'' if sequence['sequence_max'] is None else sequence['sequence_max'] | h}\
+    % if sequence['sequence_cycle']:
+ (cycle)\
+    % endif
+</td>
+    <td>${'' if sequence['sequence_cache'] is None else sequence['sequence_cache'] | h}</td>
+    <td>${sequence['sequence_owned_by'] or '' | h}</td>
+    <td>${sequence['sequence_comment'] or '' | h}</td>
+  </tr>
+  % endfor
+</table>
+% endif
+% if schema['enums']:
+<hr>
+<table style="width:100%; border-spacing: 0;">
+  <caption>\
+% if 'number_of_schemas' in schema:
+${schema['schema'] | h}.\
+% endif
+Enumerated types</caption>
+  <tr>
+    <th>Name</th>
+    <th>Values</th>
+    <th>Description</th>
+  </tr>
+  % for index, enum in enumerate(schema['enums']):
+  <tr class="tr${index % 2}">
+    <td>${enum['enum'] | h}</td>
+    <td>${enum['enum_labels'] | h}</td>
+    <td>${enum['enum_comment'] or '' | h}</td>
+  </tr>
+  % endfor
+</table>
+% endif
+% if schema['domains']:
+<hr>
+<table style="width:100%; border-spacing: 0;">
+  <caption>\
+% if 'number_of_schemas' in schema:
+${schema['schema'] | h}.\
+% endif
+Domains</caption>
+  <tr>
+    <th>Name</th>
+    <th>Type</th>
+    <th>Constraints</th>
+    <th>Description</th>
+  </tr>
+  % for index, domain in enumerate(schema['domains']):
+  <tr class="tr${index % 2}">
+    <td>${domain['domain'] | h}</td>
+    <td>${domain['domain_type'] | h}</td>
+    <td>\
+    % if domain['domain_not_null']:
+NOT NULL \
+    % endif
+    % if domain['domain_default']:
+DEFAULT ${domain['domain_default'] | h} \
+    % endif
+${domain['domain_constraints'] | h}</td>
+    <td>${domain['domain_comment'] or '' | h}</td>
+  </tr>
+  % endfor
+</table>
+% endif
+</%def>
+
+<%def name="extensions_section(extensions)">\
+% if extensions:
+<h1><a id="extensions">Extensions</a></h1>
+<table style="width:100%; border-spacing: 0;">
+  <tr>
+    <th>Name</th>
+    <th>Version</th>
+    <th>Schema</th>
+    <th>Description</th>
+  </tr>
+  % for index, extension in enumerate(extensions):
+  <tr class="tr${index % 2}">
+    <td>${extension['extension'] | h}</td>
+    <td>${extension['extension_version'] | h}</td>
+    <td>${extension['extension_schema'] | h}</td>
+    <td>${extension['extension_comment'] or '' | h}</td>
+  </tr>
+  % endfor
+</table>
+% endif
+</%def>
+
+<%def name="index_advice_section(index_advice, link)">\
+<%def name="table_link(entry)">\
+<a href="${link(entry['table_sgmlid'])}#${entry['table_sgmlid'] | u}">${entry['schema'] | h}.${entry['table'] | h}</a>\
+</%def>
+% if any(index_advice.values()):
+<hr>
+<h1><a id="index_advice">Index advice</a></h1>
+% if index_advice['missing_fk_indexes']:
+<table style="width:100%; border-spacing: 0;">
+  <caption>Foreign keys without an index</caption>
+  <tr>
+    <th>Table</th>
+    <th>Constraint</th>
+    <th>Columns</th>
+    <th>References</th>
+  </tr>
+  % for index, entry in enumerate(index_advice['missing_fk_indexes']):
+  <tr class="tr${index % 2}">
+    <td>${table_link(entry)}</td>
+    <td>${entry['constraint'] | h}</td>
+    <td>${entry['columns'] | h}</td>
+    <td>${entry['referenced'] | h}</td>
+  </tr>
+  % endfor
+</table>
+<p>&nbsp;</p>
+% endif
+% if index_advice['redundant_indexes']:
+<table style="width:100%; border-spacing: 0;">
+  <caption>Redundant indexes</caption>
+  <tr>
+    <th>Table</th>
+    <th>Index</th>
+    <th>Columns</th>
+    <th>Covered by</th>
+    <th>Size</th>
+  </tr>
+  % for index, entry in enumerate(index_advice['redundant_indexes']):
+  <tr class="tr${index % 2}">
+    <td>${table_link(entry)}</td>
+    <td>${entry['index'] | h}</td>
+    <td>${entry['columns'] | h}</td>
+    <td>${entry['redundant_to'] | h} (${entry['reason'] | h})</td>
+    <td>${entry['size'] | h}</td>
+  </tr>
+  % endfor
+</table>
+<p>&nbsp;</p>
+% endif
+% if index_advice['unused_indexes']:
+<table style="width:100%; border-spacing: 0;">
+  <caption>Unused indexes</caption>
+  <tr>
+    <th>Table</th>
+    <th>Index</th>
+    <th>Size</th>
+  </tr>
+  % for index, entry in enumerate(index_advice['unused_indexes']):
+  <tr class="tr${index % 2}">
+    <td>${table_link(entry)}</td>
+    <td>${entry['index'] | h}\
+    % if entry['supports_foreign_key']:
+ (supports a foreign key)\
+    % endif
+</td>
+    <td>${entry['size'] | h}</td>
+  </tr>
+  % endfor
+</table>
+<p>&nbsp;</p>
+% endif
+% endif
+</%def>
+
+<%def name="row_layout_section(row_layout, link)">\
+% if row_layout:
+<hr>
+<h1><a id="row_layout">Row layout</a></h1>
+<table style="width:100%; border-spacing: 0;">
+  <caption>Space saved by reordering columns</caption>
+  <tr>
+    <th>Table</th>
+    <th>Row Width</th>
+    <th>Padding</th>
+    <th>Reordered Row Width</th>
+    <th>Rows</th>
+    <th>Estimated Savings</th>
+    <th>Column Order</th>
+  </tr>
+  % for index, entry in enumerate(row_layout):
+  <tr class="tr${index % 2}">
+    <td><a href="${link(entry['table_sgmlid'])}#${entry['table_sgmlid'] | u}">${entry['schema'] | h}.${entry['table'] | h}</a></td>
+    <td>${entry['row_width'] | h}</td>
+    <td>${entry['padding'] | h}</td>
+    <td>${entry['optimal_row_width'] | h}</td>
+    <td>${entry['reltuples'] | h}</td>
+    <td>${entry['estimated_savings'] | h}</td>
+    <td>${entry['optimal_order'] | h}</td>
+  </tr>
+  % endfor
+</table>
+% endif
+</%def>
+
+<%def name="function_usage_section(function_usage, link)">\
+% if function_usage:
+<hr>
+<h1><a id="function_usage">Volatile and parallel unsafe functions in views and defaults</a></h1>
+<table style="width:100%; border-spacing: 0;">
+  <caption>Calls which prevent inlining and parallel plans</caption>
+  <tr>
+    <th>Function</th>
+    <th>Attributes</th>
+    <th>Used by</th>
+  </tr>
+  % for index, entry in enumerate(function_usage):
+  <tr class="tr${index % 2}">
+    <td><a href="${link(entry['function_sgmlid'])}#${entry['function_sgmlid'] | u}">${entry['schema'] | h}.${entry['function'] | h}</a></td>
+    <td>${entry['function_attributes'] | h}</td>
+    <td>${entry['usage'] | h} <a href="${link(entry['used_by_sgmlid'])}#${entry['used_by_sgmlid'] | u}">${entry['used_by'] | h}</a></td>
+  </tr>
+  % endfor
+</table>
+% endif
+</%def>
+
+<%def name="load_order_section(load_waves, load_cycles, link)">\
+<%def name="table_link(entry)">\
+<a href="${link(entry['table_sgmlid'])}#${entry['table_sgmlid'] | u}">${entry['schema'] | h}.${entry['table'] | h}</a>\
+</%def>
+% if len(load_waves) > 1 or load_cycles:
+<hr>
+<h1><a id="load_order">Load order</a></h1>
+<table style="width:100%; border-spacing: 0;">
+  <caption>Tables which can be loaded concurrently, wave after wave</caption>
+  <tr>
+    <th>Wave</th>
+    <th>Tables</th>
+  </tr>
+  % for index, wave in enumerate(load_waves):
+  <tr class="tr${index % 2}">
+    <td>${index + 1}</td>
+    <td>\
+    % for entry in wave:
+${table_link(entry)}${'' if loop.last else ', '}\
+    % endfor
+</td>
+  </tr>
+  % endfor
+</table>
+% if load_cycles:
+<p>&nbsp;</p>
+<table style="width:100%; border-spacing: 0;">
+  <caption>Foreign key cycles, loaded with these constraints deferred or disabled</caption>
+  <tr>
+    <th>Tables</th>
+    <th>Constraints</th>
+  </tr>
+  % for index, cycle in enumerate(load_cycles):
+  <tr class="tr${index % 2}">
+    <td>\
+    % for entry in cycle['tables']:
+${table_link(entry)}${'' if loop.last else ', '}\
+    % endfor
+</td>
+    <td>${cycle['constraints'] | h}</td>
+  </tr>
+  % endfor
+</table>
+% endif
+% endif
+</%def>
+
+<%def name="footer()">\
+<p class="w3ref">Generated by <a href="http://github.com/cbbrowne/autodoc/">PostgreSQL Autodoc</a></p>
+<p class="w3ref"><a href="http://validator.w3.org/check?uri=referer">W3C HTML 5.2 Strict</a></p>
+</body></html>
+</%def>
@@ -0,0 +1,83 @@
+<%namespace name="defs" file="html_defs.mako"/>
+<% link = lambda sgmlid: html_pages.get(sgmlid, '') %>\
+
+${defs.head('Index for ' + database)}\
+
+<!-- Primary Index -->
+<p>${database_comment_html}<br><br>Dumped on ${dumped_on | h}</p>
+<h1><a id="index">Index of database - ${database | h}</a></h1>
+
+<!-- Search over the prebuilt index -->
+<p><input type="search" id="search" placeholder="Поиск" style="width:50%" disabled></p>
+<ul id="search_results"></ul>
+
+<ul>
+% for schema in html_schemas:
+  <li><a href="${link(schema['schema_sgmlid'])}#${schema['schema_sgmlid'] | u}">${schema['schema'] | h}</a>
+    (таблиц: ${len(schema['tables'])}, функций: ${len(schema['functions'])})</li>
+% endfor
+</ul>
+
+<!-- Dependencies table -->
+% if html_dependencies:
+<h1>Layers and services dependencies</h1>
+${html_dependencies}
+% endif
+
+<!-- Extensions -->
+${defs.extensions_section(extensions)}\
+
+<!-- Index advice -->
+${defs.index_advice_section(index_advice, link)}\
+
+<!-- Row layout -->
+${defs.row_layout_section(row_layout, link)}\
+
+<!-- Function usage -->
+${defs.function_usage_section(function_usage, link)}\
+
+<!-- Load order -->
+${defs.load_order_section(load_waves, load_cycles, link)}\
+
+<script src="search_index.js"></script>
+<script>
+(function () {
+  var input = document.getElementById('search');
+  var results = document.getElementById('search_results');
+  var limit = 100;
+  var index = window.searchIndex;
+  if (index) {
+    var terms = Object.keys(index.terms);
+    input.disabled = false;
+    input.addEventListener('input', function () {
+      var words = input.value.toLowerCase().match(/[\p{L}\p{N}_]+/gu) || [];
+      var found = null;
+      words.forEach(function (word) {
+        var docs = {};
+        terms.forEach(function (term) {
+          if (term.startsWith(word)) {
+            index.terms[term].forEach(function (doc) { docs[doc] = true; });
+          }
+        });
+        if (found === null) {
+          found = docs;
+        } else {
+          Object.keys(found).forEach(function (doc) { if (!docs[doc]) delete found[doc]; });
+        }
+      });
+      results.textContent = '';
+      Object.keys(found || {}).slice(0, limit).forEach(function (doc) {
+        var entry = index.docs[doc];
+        var item = document.createElement('li');
+        var anchor = document.createElement('a');
+        anchor.href = entry[2];
+        anchor.textContent = entry[0];
+        item.appendChild(anchor);
+        item.appendChild(document.createTextNode(' (' + entry[1] + ')'));
+        results.appendChild(item);
+      });
+    });
+  }
+})();
+</script>
+${defs.footer()}\
@@ -0,0 +1,47 @@
+<%namespace name="defs" file="html_defs.mako"/>
+<%
+    link = lambda sgmlid: html_pages.get(sgmlid, '')
+    schema = html_schemas[schema_index]
+%>\
+
+% if page_kind == 'schema':
+${defs.head('Schema ' + schema['schema'] + ' - ' + database)}\
+
+<p><a href="${link('index')}#index">Index of database - ${database | h}</a></p>
+<h1><a id="${schema['schema_sgmlid'] | u}">Schema ${schema['schema'] | h}</a></h1>
+% if schema['schema_comment_html']:
+<p class="schema_comment_html">${schema['schema_comment_html']}</p>
+% endif
+
+% if html_shards == 'object':
+<ul>
+% for table in schema['tables']:
+  <li><a href="${link(table['table_sgmlid'])}#${table['table_sgmlid'] | u}">${table['table'] | h}</a></li>
+% endfor
+% for function in schema['functions']:
+  <li><a href="${link(function['function_sgmlid'])}#${function['function_sgmlid'] | u}">${function['function'] | h}</a></li>
+% endfor
+</ul>
+% else:
+% for table in schema['tables']:
+${defs.table_section(table, link)}\
+% endfor
+% for function in schema['functions']:
+${defs.function_section(function, link)}\
+% endfor
+% endif
+${defs.schema_objects_section(schema)}\
+% elif page_kind == 'table':
+<% table = schema['tables'][object_index] %>\
+${defs.head(table['schema'] + '.' + table['table'] + ' - ' + database)}\
+
+<p><a href="${link('index')}#index">Index of database - ${database | h}</a></p>
+${defs.table_section(table, link)}\
+% elif page_kind == 'function':
+<% function = schema['functions'][object_index] %>\
+${defs.head(function['schema'] + '.' + function['function'] + ' - ' + database)}\
+
+<p><a href="${link('index')}#index">Index of database - ${database | h}</a></p>
+${defs.function_section(function, link)}\
+% endif
+${defs.footer()}\
@@ -1,19 +1,4 @@
 <%
-import re
-
-def sgml_safe_id(string):
-    # Lets use the keyword ARRAY in place of the square brackets
-    # to prevent duplicating a non-array equivelent
-    string = re.sub('\\[\\]', 'ARRAY-', string.lower())
-
-    # Brackets, spaces, commas, underscores are not valid 'id' characters
-    # replace with as few -'s as possible.
-    string = re.sub('[ "\',)(_-]+', '-', string)
-
-    # Don't want a - at the end either.  It looks silly.
-    string = re.sub('-$', '', string)
-    return string
-
 def get_text(node_attr):
     result = str()
     if 'ERROR' in node_attr:
@@ -25,7 +10,7 @@ def get_text(node_attr):
     elif 'SERVICE_URL' in node_attr:
         url = node_attr['SERVICE_URL']
     elif node_attr['TYPE'] not in ('LAYER', 'SERVICE'):
-        url = '#' + sgml_safe_id('.'.join((node_attr['SCHEMA'], node_attr['TYPE'], node_attr['OBJECT'])))
+        url = '#' + html_fragment(reference_id(node_attr['TYPE'], node_attr['SCHEMA'], node_attr['OBJECT']))
     result += node_attr['TYPE'] + '<br>'
     if url is not None:
         before = result
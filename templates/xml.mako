@@ -30,6 +30,24 @@ ${table['table_type_dbk']}:
 ${table['table_comment_dbk']}
         </para>
     % endif
+    % if table['partitioned']:
+        <para>
+          Partitions: ${table['partition_count']}\
+      % if table['partition_key']:
+ by ${table['partition_key_dbk']}\
+      % endif
+      % if table['partition_range']:
+, ${table['partition_range_dbk']}\
+      % endif
+      % if table['partition_has_default']:
+, with a default partition\
+      % endif
+      % if table['partition_bytes_dbk']:
+, ${table['partition_bytes_dbk']} in total\
+      % endif
+
+        </para>
+    % endif
 
         <para>
           <variablelist>
@@ -72,6 +90,9 @@ ${table['table_comment_dbk']}
               </para>
       % if column['column_comment']:
               <para>${column['column_comment_dbk']}</para>
+      % endif
+      % if 'column_profile' in column:
+              <para>Data profile: ${column['column_profile_dbk']}</para>
       % endif
             </listitem>
           </varlistentry>
@@ -198,9 +219,15 @@ ${function['function_dbk']}\
         <?dbhtml list-presentation="list"?>
         <segtitle>Language</segtitle>
         <segtitle>Return Type</segtitle>
+    % if function['function_attributes']:
+        <segtitle>Attributes</segtitle>
+    % endif
         <seglistitem>
          <seg>${function['function_language'] | h}</seg>
          <seg>${function['function_returns'] | h}</seg>
+    % if function['function_attributes']:
+         <seg>${function['function_attributes'] | h}</seg>
+    % endif
         </seglistitem>
        </segmentedlist>
  
@@ -0,0 +1,133 @@
+import collections
+import copy
+import os
+import sys
+
+# The modules of the tool are plain files at the top of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest  # noqa: E402
+
+import collect_info  # noqa: E402
+
+
+class FakeCursor:
+    # Cursor of a server of the given version returning a single row of one
+    # column
+    Column = collections.namedtuple('Column', 'name')
+
+    def __init__(self, name, value, server_version=150000):
+        self.connection = self
+        self.server_version = server_version
+        self.description = [self.Column(name)]
+        self.value = value
+        self.requests = list()
+
+    def execute(self, request, arguments=None):
+        self.requests.append(request)
+
+    def fetchall(self):
+        return [(self.value,)]
+
+
+class FakeConnection:
+    server_version = 150000
+
+    def cursor(self):
+        return self
+
+    def close(self):
+        pass
+
+    def commit(self):
+        pass
+
+
+#####
+# FakeCatalog
+#    Stands in for the catalog queries of collect_info that info_collect()
+#    runs, with two tables, an index and two functions in schema 'sch'. rows
+#    are the results of the queries by name, calls counts the calls of every
+#    query; a query named in fail raises on that call. Like the catalog, the
+#    queries of a schema or a list of schemas only return rows of them.
+class FakeCatalog:
+    SCHEMA_QUERIES = ('get_tables', 'get_functions', 'get_partitions', 'get_fast_statistics', 'get_index_keys',
+                      'get_column_widths', 'get_column_profiles', 'get_function_usage', 'get_schemas_comment')
+
+    def __init__(self, monkeypatch):
+        self.calls = collections.Counter()
+        self.fail = dict()
+        rows = {
+            'get_database_description': 'test database',
+            'get_schemas': ['sch'],
+            'get_tables': [self.table(1001, 'flights'), self.table(1002, 'routes')],
+            'get_columns': [{'column_name': 'id', 'attnum': 1, 'column_type': 'integer', 'column_null': 'NOT NULL',
+                             'column_description': None, 'column_default': None, 'column_length': 4,
+                             'column_align': 'i'}],
+            'get_functions': [self.function(5001, 'refresh'), self.function(5002, 'next_id')],
+            'get_function_arg': [{'namespace': 'pg_catalog', 'type_name': 'integer'}],
+            'get_function_usage': [
+                {'function_oid': 5002, 'usage': 'DEFAULT', 'schemaname': 'sch', 'tablename': 'flights',
+                 'column_name': 'id'},
+                {'function_oid': 5002, 'usage': 'DEFAULT', 'schemaname': 'sch', 'tablename': 'routes',
+                 'column_name': 'id'},
+            ],
+            'get_column_widths': [self.column_stats('flights'), self.column_stats('routes')],
+            'get_column_profiles': [self.column_stats('flights'), self.column_stats('routes')],
+            'get_index_keys': [{'schemaname': 'sch', 'tablename': 'flights', 'indexname': 'flights_id_idx',
+                                'index_columns': ['id'], 'key_count': 1, 'index_opclasses': ['3124'],
+                                'index_options': [0], 'indisunique': False, 'indisprimary': False,
+                                'indisexclusion': False, 'index_method': 'btree', 'index_predicate': None,
+                                'index_expressions': None, 'index_len': 16384, 'idx_scan': 12}],
+            'get_schemas_comment': [{'namespace': 'sch', 'comment': 'Рейсы'}],
+        }
+        for name in ('get_partitions', 'get_constraint', 'get_primary_keys', 'get_foreign_keys', 'get_indexes',
+                     'get_inheritance', 'get_triggers', 'get_sequences', 'get_enums',
+                     'get_domains', 'get_extensions', 'get_fast_statistics'):
+            rows[name] = list()
+        for name, result in rows.items():
+            monkeypatch.setattr(collect_info, name, self.query(name, result))
+        self.rows = rows
+
+    @staticmethod
+    def table(oid, tablename, namespace='sch'):
+        return {'oid': oid, 'namespace': namespace, 'tablename': tablename, 'tableowner': 'owner',
+                'table_description': None, 'relacl': None, 'relkind': 'r', 'reltuples': 100, 'reltype': 'table',
+                'view_definition': None}
+
+    @staticmethod
+    def function(oid, function_name):
+        return {'function_oid': oid, 'namespace': 'sch', 'comment': None, 'function_args': '23',
+                'function_arg_names': ['value'], 'function_name': function_name, 'returns_set': False,
+                'return_type': '23', 'source_code': 'SELECT 1', 'language_name': 'sql', 'volatility': 'v',
+                'parallel': 'u', 'cost': 100, 'rows': 0, 'security_definer': False, 'leakproof': False,
+                'strict': False}
+
+    @staticmethod
+    def column_stats(tablename):
+        return {'schemaname': 'sch', 'tablename': tablename, 'column_name': 'id', 'avg_width': 4,
+                'null_frac': 0.0, 'n_distinct': -1.0, 'correlation': 1.0, 'most_common_vals': None,
+                'most_common_freqs': None}
+
+    def query(self, name, result):
+        def run(*args):
+            self.calls[name] += 1
+            if self.fail.get(name) == self.calls[name]:
+                raise RuntimeError('connection lost in {}'.format(name))
+            # Fresh rows, as from the server
+            rows = copy.deepcopy(result)
+            if name in self.SCHEMA_QUERIES:
+                schemas = [args[1]] if isinstance(args[1], str) else args[1]
+                rows = [row for row in rows if row.get('namespace', row.get('schemaname')) in schemas]
+            return rows
+        return run
+
+
+@pytest.fixture
+def fake_catalog(monkeypatch):
+    return FakeCatalog(monkeypatch)
+
+
+@pytest.fixture
+def fake_connection():
+    return FakeConnection()
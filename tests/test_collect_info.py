@@ -0,0 +1,61 @@
+import collect_info
+from conftest import FakeCursor
+
+
+def request_of(query, server_version, *args):
+    cur = FakeCursor('namespace', 'sch', server_version)
+    query(cur, *args)
+    return ' '.join(cur.requests[0].split())
+
+
+def test_function_attributes_of_older_servers():
+    request = request_of(collect_info.get_functions, 150000, 'sch', None, None)
+    assert 'proparallel AS parallel' in request
+    assert 'proleakproof AS leakproof' in request
+
+    # Leakproof functions exist since 9.2
+    request = request_of(collect_info.get_functions, 90100, 'sch', None, None)
+    assert 'NULL AS parallel' in request
+    assert 'NULL AS leakproof' in request
+    assert 'proleakproof' not in request
+
+
+def test_bulk_queries_of_older_servers():
+    request = request_of(collect_info.get_triggers, 150000, [('sch', '^', '^$')])
+    assert 'WHERE NOT (tgisinternal)' in request
+    assert 'tgenabled AS trigger_enabled' in request
+    # Before 9.0 the triggers of foreign keys are told by their constraint
+    request = request_of(collect_info.get_triggers, 80400, [('sch', '^', '^$')])
+    assert 'tgisinternal' not in request
+    assert "WHERE NOT (tgisconstraint AND EXISTS" in request
+    request = request_of(collect_info.get_triggers, 80200, [('sch', '^', '^$')])
+    assert "CASE WHEN tgenabled THEN 'O' ELSE 'D' END AS trigger_enabled" in request
+
+    assert 'ORDER BY enumsortorder' in request_of(collect_info.get_enums, 90100, [('sch', '^', '^$')])
+    request = request_of(collect_info.get_enums, 90000, [('sch', '^', '^$')])
+    assert 'enumsortorder' not in request
+    assert 'ORDER BY pg_enum.oid' in request
+
+    assert 'pg_catalog.pg_extension' in request_of(collect_info.get_extensions, 90100)
+
+
+def test_objects_older_servers_do_not_have():
+    for query, server_version, args in ((collect_info.get_enums, 80200, ([('sch', '^', '^$')],)),
+                                        (collect_info.get_extensions, 90000, ())):
+        cur = FakeCursor('namespace', 'sch', server_version)
+        assert query(cur, *args) == list()
+        assert cur.requests == list()
+
+
+def test_queries_are_recorded_under_the_function_running_them():
+    query_statistics = collect_info.QueryStatistics()
+    cur = collect_info.InstrumentedCursor(FakeCursor('comment', 'Рейсы'), query_statistics)
+    assert collect_info.get_schemas_comment(cur, ['sch']) == [{'comment': 'Рейсы'}]
+    collect_info.get_extensions(cur)
+    cur.execute('SELECT 1')
+    cur.fetchall()
+    kinds = query_statistics.report()['kinds']
+    assert sorted(kinds) == ['get_extensions', 'get_schemas_comment', 'other']
+    assert cur.kind is None
+    # The bytes of the values in UTF-8
+    assert kinds['get_schemas_comment']['bytes'] == len('Рейсы'.encode('utf-8'))
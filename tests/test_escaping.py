@@ -0,0 +1,179 @@
+# Differential tests of the escaping helpers and of sql_prettyprint against
+# the regular expression implementations they replaced, kept here verbatim
+# as reference oracles.
+
+import random
+import re
+
+import pytest
+
+import postgresql_autodoc
+
+
+def reference_sgml_safe_id(string):
+    string = re.sub('\\[\\]', 'ARRAY-', string)
+    string = re.sub('[ "\',)(_-]+', '-', string)
+    string = re.sub('-$', '', string)
+    return string
+
+
+def reference_html(string):
+    if string is None:
+        return ''
+    elif isinstance(string, int):
+        return str(string)
+    string = re.sub('&(?!(amp|lt|gt|apos|quot);)', '&amp;', string)
+    string = re.sub('<', '&lt;', string)
+    string = re.sub('>', '&gt;', string)
+    string = re.sub("'", '&apos;', string)
+    string = re.sub('"', '&quot;', string)
+    string = re.sub('\n', '<br>', string)
+    return string
+
+
+def reference_docbook(string):
+    if string is None:
+        return ''
+    elif isinstance(string, int):
+        return str(string)
+    if re.match('^@DOCBOOK', string):
+        return re.sub('^@DOCBOOK', '', string)
+    string = re.sub('&(?!(amp|lt|gt|apos|quot);)', '&amp;', string)
+    string = re.sub('<', '&lt;', string)
+    string = re.sub('>', '&gt;', string)
+    string = re.sub("'", '&apos;', string)
+    string = re.sub('"', '&quot;', string)
+    return string
+
+
+def reference_graphviz(string):
+    if string is None:
+        string = ''
+    return re.sub('([\\s"\'])', '\\\\\\1', string)
+
+
+def reference_sql_prettyprint(string):
+    if string is None:
+        return ''
+    result = ''
+    tok = "SELECT|FROM|WHERE|HAVING|GROUP BY|ORDER BY|OR|AND|LEFT JOIN|RIGHT JOIN" \
+          "|LEFT OUTER JOIN|LEFT INNER JOIN|INNER JOIN|RIGHT OUTER JOIN|RIGHT INNER JOIN" \
+          "|JOIN|UNION ALL|UNION|EXCEPT|USING|ON|CAST|[\\(\\),]"
+    key = 0
+    bracket = 0
+    depth = 0
+    indent = 6
+    pattern = '\\(\\"[^\\"]*\\"|\'[^\']*\'|' + tok
+    elems = list()
+    pos = 0
+    while pos < len(string):
+        m = re.search(pattern, string[pos:])
+        if m is None:
+            elems.append(string[pos:])
+            pos = len(string)
+        else:
+            elems.append(string[pos:pos + m.start()])
+            elems.append(m.group())
+            pos = pos + m.start() + len(m.group())
+    for elem in elems:
+        if re.match('^[\\s]?$', elem):
+            continue
+        if re.match('\\)', elem):
+            depth = depth - indent
+            format = '%s%s' if key == 1 or bracket == 1 else '%s\n%{}s'.format(depth)
+            key = 0
+            bracket = 0
+        elif re.match('\\(', elem):
+            format = '%s %s' if key == 1 else '%s\n%{}s'.format(depth)
+            depth = depth + indent
+            bracket = 1
+            key = 0
+        elif re.match(tok, elem):
+            format = '%s%s' if key == 1 else '%s\n%{}s'.format(depth)
+            key = 1
+            bracket = 0
+        else:
+            format = '%s%s'
+            key = 0
+        result = format % (result, elem)
+    return result
+
+
+ESCAPERS = [
+    (reference_sgml_safe_id, postgresql_autodoc.sgml_safe_id),
+    (reference_html, postgresql_autodoc.html),
+    (reference_docbook, postgresql_autodoc.docbook),
+    (reference_graphviz, postgresql_autodoc.graphviz),
+]
+ESCAPER_IDS = [escaper.__name__ for _, escaper in ESCAPERS]
+
+# Every character some helper escapes or replaces, entities which must not
+# be escaped again, near misses of them, and non-ASCII letters and spaces
+ALPHABET = list('ab_-[]() ,"\'&<>;\n\t\r\x0b\x0c\x1c\x85\xa0 　Жя@') + [
+    '&amp;', '&lt;', '&gt;', '&apos;', '&quot;', '&am', '&ampx', '&#39;', '@DOCBOOK', '[]', '-\n', 'таблица']
+
+EDGE_CASES = ['', ' ', '-', '--', '[]', '[][]', 'a[]', '_a_', 'a-', '@DOCBOOK', '@DOCBOOK<b>', 'x@DOCBOOK',
+              '&', '&amp;', '&amp', '&&lt;', '\n', '\n\n', 'Таблица "Маршруты" (R&D)', "it's", '　']
+
+
+def generated_strings(alphabet, count, length, seed=0):
+    rnd = random.Random(seed)
+    for _ in range(count):
+        yield ''.join(rnd.choice(alphabet) for _ in range(rnd.randint(0, length)))
+
+
+@pytest.fixture(autouse=True)
+def cold_memo():
+    for helper in (postgresql_autodoc._html_escape, postgresql_autodoc._docbook_escape,
+                   postgresql_autodoc.graphviz, postgresql_autodoc.sgml_safe_id):
+        helper.cache_clear()
+
+
+@pytest.mark.parametrize('reference, escaper', ESCAPERS, ids=ESCAPER_IDS)
+def test_edge_cases(reference, escaper):
+    for string in EDGE_CASES + ALPHABET:
+        assert escaper(string) == reference(string), string
+
+
+@pytest.mark.parametrize('reference, escaper', ESCAPERS, ids=ESCAPER_IDS)
+def test_generated(reference, escaper):
+    for string in generated_strings(ALPHABET, 20000, 12):
+        assert escaper(string) == reference(string), string
+
+
+@pytest.mark.parametrize('reference, escaper', ESCAPERS, ids=ESCAPER_IDS)
+def test_memoized_result_is_the_same(reference, escaper):
+    for string in EDGE_CASES:
+        assert escaper(string) == escaper(string) == reference(string), string
+
+
+@pytest.mark.parametrize('value', [None, 0, 17, -3])
+def test_none_and_integers(value):
+    assert postgresql_autodoc.html(value) == reference_html(value)
+    assert postgresql_autodoc.docbook(value) == reference_docbook(value)
+    if value is None:
+        assert postgresql_autodoc.graphviz(value) == reference_graphviz(value)
+
+
+def test_graphviz_every_character():
+    # Escaping is per character, so blocks of characters are compared
+    characters = [chr(code) for code in range(0x110000) if not 0xd800 <= code < 0xe000]
+    for start in range(0, len(characters), 4096):
+        block = ''.join(characters[start:start + 4096])
+        assert postgresql_autodoc.graphviz(block) == reference_graphviz(block), hex(start)
+
+
+SQL_ALPHABET = ['SELECT', ' ', 'FROM', 'WHERE', '(', ')', ',', '"x"', "'a b'", 'OR', 'ORDER BY', 'GROUP BY', 'x',
+                '\n', 'AND', 'UNION ALL', 'UNION', 'CAST', '%', 'LEFT OUTER JOIN', 'JOIN', 'ON', 'USING', 'FOR',
+                '("q"', '"', "'", 'ab', ' \n', 'таблица', '::text']
+
+
+def test_sql_prettyprint_edge_cases():
+    for string in [None, '', ' ', '\n', '()', '(((', ')))', "'unclosed", '"', 'SELECT', 'SELECT 1;',
+                   ' SELECT t.id FROM (s.t t LEFT JOIN s.u u ON ((u.id = t.id))) WHERE (t.id > 0);']:
+        assert postgresql_autodoc.sql_prettyprint(string) == reference_sql_prettyprint(string), string
+
+
+def test_sql_prettyprint_generated():
+    for string in generated_strings(SQL_ALPHABET, 20000, 25):
+        assert postgresql_autodoc.sql_prettyprint(string) == reference_sql_prettyprint(string), string
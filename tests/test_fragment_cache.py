@@ -0,0 +1,72 @@
+import json
+import os
+
+import pytest
+
+import postgresql_autodoc
+
+
+def render_all(directory, tables, rendered):
+    fragments = postgresql_autodoc.FragmentCache(directory, 'salt')
+    results = list()
+    for table in tables:
+        results.append(fragments.render(table, lambda: rendered.append(table['name']) or table['name'] + '\r\n'))
+    fragments.remove_unused()
+    return fragments, results
+
+
+def test_fragments_are_kept_on_disk_by_hash(tmp_path):
+    directory = str(tmp_path / 'fragments' / 'test.html')
+    tables = [{'name': 'flights'}, {'name': 'routes'}]
+    rendered = list()
+    fragments, results = render_all(directory, tables, rendered)
+    assert results == ['flights\r\n', 'routes\r\n']
+    assert rendered == ['flights', 'routes']
+    # Only the keys are held in memory
+    assert fragments.used == set(os.path.splitext(filename)[0] for filename in os.listdir(directory))
+
+    rendered = list()
+    fragments, results = render_all(directory, tables, rendered)
+    assert results == ['flights\r\n', 'routes\r\n']
+    assert rendered == list()
+
+
+def test_unused_fragments_are_removed(tmp_path):
+    directory = str(tmp_path / 'fragments' / 'test.html')
+    render_all(directory, [{'name': 'flights'}, {'name': 'routes'}], list())
+    rendered = list()
+    render_all(directory, [{'name': 'routes', 'comment': 'changed'}], rendered)
+    assert rendered == ['routes']
+    assert len(os.listdir(directory)) == 1
+
+
+def test_without_cache_directory_every_fragment_is_rendered():
+    rendered = list()
+    render_all(None, [{'name': 'flights'}, {'name': 'flights'}], rendered)
+    assert rendered == ['flights', 'flights']
+
+
+def test_interrupted_manifest_save_keeps_the_previous_manifest(tmp_path, monkeypatch):
+    cache_dir = str(tmp_path / 'cache')
+    output_filename = str(tmp_path / 'test.html')
+    with open(output_filename, 'w') as f:
+        f.write('document')
+    manifest = postgresql_autodoc.OutputManifest(cache_dir, str(tmp_path / 'test'))
+    manifest.record(output_filename, 'inputs', 'content')
+    manifest.save('fingerprint', '2026-10-19')
+    with open(manifest.filename) as f:
+        saved = f.read()
+
+    def interrupted_dump(data, f, **kwargs):
+        f.write('{"fingerprint": ')
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(postgresql_autodoc.json, 'dump', interrupted_dump)
+    with pytest.raises(KeyboardInterrupt):
+        manifest.save('changed', '2026-10-20')
+    monkeypatch.undo()
+    with open(manifest.filename) as f:
+        assert f.read() == saved
+    assert postgresql_autodoc.OutputManifest(cache_dir, str(tmp_path / 'test')).previous['fingerprint'] == \
+        'fingerprint'
+    assert json.loads(saved)['outputs'][output_filename]['inputs'] == 'inputs'
@@ -0,0 +1,86 @@
+import json
+import os
+import urllib.parse
+
+import postgresql_autodoc
+
+TEMPLATE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'templates')
+
+TABLE = 'маршруты'
+COMMENT = 'Список рейсов\n\\depends TABLE: sch.маршруты обновляется ежедневно'
+
+
+def parsed_catalog():
+    struct = dict()
+    for table in (TABLE, 'flights'):
+        postgresql_autodoc.set_table_attribute(struct, 'sch', table, 'TYPE', 'table')
+        postgresql_autodoc.set_table_attribute(struct, 'sch', table, 'DESCRIPTION', None)
+    postgresql_autodoc.set_table_attribute(struct, 'sch', 'flights', 'DESCRIPTION', COMMENT)
+    db = {'test': {'STRUCT': struct}}
+    postgresql_autodoc.CommentsParser(db, dict(), dict()).parse()
+    return db
+
+
+def test_comment_links_use_the_encoding_of_the_template_ids():
+    db = parsed_catalog()
+    object_registry = postgresql_autodoc.ObjectRegistry('test', db['test']['STRUCT'])
+    table_attr = db['test']['STRUCT']['sch']['TABLE']['flights']
+    comment_html = postgresql_autodoc.make_table_comment_html(table_attr['DESCRIPTION'], table_attr['KEYWORDS'],
+                                                              object_registry)
+
+    sgmlid = object_registry.table_id('sch', TABLE)
+    # Templates write ids and links with the Mako u filter, which is quote_plus
+    fragment = urllib.parse.quote_plus(sgmlid)
+    assert postgresql_autodoc.html_fragment(sgmlid) == fragment
+    assert 'href="#{}"'.format(fragment) in comment_html
+
+    relinked = postgresql_autodoc.relink_html(comment_html, {sgmlid: 'page.html'})
+    assert 'href="page.html#{}"'.format(fragment) in relinked
+
+
+def test_relink_decodes_reserved_characters():
+    sgmlid = 'sch.table.a+b/c&d'
+    text = '<a href="#{}">x</a>'.format(postgresql_autodoc.html_fragment(sgmlid))
+    assert postgresql_autodoc.relink_html(text, {sgmlid: 'a%2Bb.html'}) == \
+        '<a href="a%2Bb.html#sch.table.a%2Bb%2Fc%26d">x</a>'
+
+
+def test_page_names_of_long_ids_are_cut_and_distinct(tmp_path):
+    # Functions with many arguments, which differ only at the end
+    sgmlids = [postgresql_autodoc.sgml_safe_id('sch.function.обновить({}, {})'.format(
+        ', '.join(['аргумент_{} character varying'.format(index) for index in range(8)]), last_type))
+        for last_type in ('integer', 'bigint')]
+    html_files = postgresql_autodoc.html_shard_files([('sch', sgmlids)], 'object')
+    filenames = [html_files[sgmlid] for sgmlid in sgmlids]
+    assert filenames[0] != filenames[1]
+    for filename in filenames:
+        assert len(filename.encode('utf-8')) < 255
+        (tmp_path / filename).write_text('page')
+
+
+def test_dependency_links_use_the_encoding_of_the_template_ids():
+    struct = dict()
+    postgresql_autodoc.set_table_attribute(struct, 'sch', 'a+b/c&d', 'TYPE', 'table')
+    object_registry = postgresql_autodoc.ObjectRegistry('test', struct)
+    sgmlid = object_registry.table_id('sch', 'a+b/c&d')
+    dependencies = {'sch.a+b/c&d': {'ATTR': {'TYPE': 'TABLE', 'SCHEMA': 'sch', 'OBJECT': 'a+b/c&d'}}}
+    template_lookup = postgresql_autodoc.make_template_lookup(TEMPLATE_PATH)
+    html_dependencies = postgresql_autodoc.render_html_dependencies(template_lookup, dependencies, object_registry)
+    assert 'href="#{}"'.format(urllib.parse.quote_plus(sgmlid)) in html_dependencies
+
+    relinked = postgresql_autodoc.relink_html(html_dependencies, {sgmlid: 'page.html'})
+    assert 'href="page.html#sch.table.a%2Bb%2Fc%26d"' in relinked
+
+
+def test_search_index_is_a_script(tmp_path):
+    search_index = postgresql_autodoc.HtmlSearchIndex()
+    search_index.add_schema({'schema': 'sch', 'schema_sgmlid': 'sch.schema', 'schema_comment': 'Рейсы',
+                             'tables': list(), 'functions': list()}, {'sch.schema': 'sch.html'})
+    filename = tmp_path / postgresql_autodoc.HTML_SEARCH_INDEX
+    search_index.write(str(filename))
+    # Pages opened from the file system can load scripts but not fetch() files
+    prefix, suffix = 'var searchIndex = ', ';\n'
+    text = filename.read_text(encoding='utf-8')
+    assert text.startswith(prefix) and text.endswith(suffix)
+    assert json.loads(text[len(prefix):-len(suffix)]) == {
+        'docs': [['sch', 'schema', 'sch.html#sch.schema']], 'terms': {'sch': [0], 'рейсы': [0]}}
@@ -0,0 +1,97 @@
+import collect_info
+import postgresql_autodoc
+from conftest import FakeCursor
+
+
+def index(columns, unique=False, primary=False, exclusion=False, method='btree', options=None, scans=10):
+    return {
+        'COLUMNS': columns,
+        'OPCLASSES': ['int4_ops'] * len(columns),
+        'OPTIONS': options or [0] * len(columns),
+        'UNIQUE': unique,
+        'PRIMARY': primary,
+        'EXCLUSION': exclusion,
+        'METHOD': method,
+        'PREDICATE': None,
+        'EXPRESSIONS': None,
+        'SIZE': 8192,
+        'SCANS': scans,
+    }
+
+
+def advise(index_keys):
+    struct = dict()
+    postgresql_autodoc.set_table_attribute(struct, 'sch', 'bookings', 'TYPE', 'table')
+    postgresql_autodoc.set_table_attribute(struct, 'sch', 'bookings', 'INDEX_KEYS', index_keys)
+    db = {'test': {'STRUCT': struct}}
+    postgresql_autodoc.IndexAdvisor(db).advise()
+    return db['test']['INDEX_ADVICE']
+
+
+def redundant(advice):
+    return {(entry['INDEX'], entry['REDUNDANT_TO'], entry['REASON']) for entry in advice['REDUNDANT_INDEXES']}
+
+
+def test_duplicates_and_prefixes_are_reported():
+    advice = advise({
+        'bookings_a': index(['a']),
+        'bookings_a_copy': index(['a']),
+        'bookings_a_b': index(['a', 'b']),
+    })
+    assert redundant(advice) == {('bookings_a_copy', 'bookings_a', 'DUPLICATE'),
+                                 ('bookings_a', 'bookings_a_b', 'PREFIX')}
+
+
+def test_exclusion_indexes_are_never_droppable():
+    advice = advise({
+        'bookings_room_during_excl': index(['room', 'during'], exclusion=True, method='gist', scans=0),
+        'bookings_room_during_copy': index(['room', 'during'], method='gist', scans=0),
+        'bookings_room_excl': index(['room'], exclusion=True, scans=0),
+        'bookings_room_rate': index(['room', 'rate']),
+    })
+    # The exclusion index is kept, the plain copy of it reported
+    assert redundant(advice) == {('bookings_room_during_copy', 'bookings_room_during_excl', 'DUPLICATE')}
+    assert [entry['INDEX'] for entry in advice['UNUSED_INDEXES']] == ['bookings_room_during_copy']
+
+
+def test_sort_order_is_compared():
+    # indoption 3 is DESC NULLS FIRST
+    advice = advise({
+        'bookings_a_desc': index(['a'], options=[3]),
+        'bookings_a_b': index(['a', 'b']),
+        'bookings_a_b_desc': index(['a', 'b'], options=[0, 3]),
+        'bookings_a_desc_b': index(['a', 'b'], options=[3, 0]),
+    })
+    assert redundant(advice) == {('bookings_a_desc', 'bookings_a_desc_b', 'PREFIX')}
+
+
+def index_keys_request(server_version):
+    cur = FakeCursor('schemaname', 'sch', server_version)
+    rows = collect_info.get_index_keys(cur, ['sch'])
+    return rows, ' '.join(' '.join(cur.requests).split())
+
+
+def test_index_keys_are_collected_on_older_servers():
+    rows, request = index_keys_request(150000)
+    assert rows == [{'schemaname': 'sch'}]
+    assert 'indnkeyatts AS key_count' in request
+    assert 'indisexclusion AS indisexclusion' in request
+    assert 'CAST(indoption AS int2[]) AS index_options' in request
+    # unnest WITH ORDINALITY exists since 9.4 only
+    assert 'ORDINALITY' not in request
+
+    rows, request = index_keys_request(90300)
+    assert 'indnatts AS key_count' in request
+    assert 'indisexclusion AS indisexclusion' in request
+
+    rows, request = index_keys_request(80400)
+    assert 'false AS indisexclusion' in request
+    assert 'CAST(indoption AS int2[])' in request
+
+    rows, request = index_keys_request(80200)
+    assert 'indoption' not in request
+
+    # Without pg_relation_size there is no advice
+    rows, request = index_keys_request(80000)
+    assert rows == list()
+    assert request == ''
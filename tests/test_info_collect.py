@@ -0,0 +1,76 @@
+import postgresql_autodoc
+
+
+def collect(connection, column_profile=None, checkpoint=None, statistics=None, db=None):
+    if db is None:
+        db = dict()
+    postgresql_autodoc.info_collect(connection, db, 'test', None, None, None, statistics,
+                                    column_profile=column_profile, progress=None, checkpoint=checkpoint)
+    return db['test']['STRUCT']
+
+
+def test_widths_without_profiles_scan_pg_stats_once(fake_catalog, fake_connection):
+    struct = collect(fake_connection, statistics='fast')
+    assert fake_catalog.calls['get_column_widths'] == 1
+    assert fake_catalog.calls['get_column_profiles'] == 0
+    column_attr = struct['sch']['TABLE']['flights']['COLUMN']['id']
+    assert column_attr['AVG_WIDTH'] == 4
+    assert 'PROFILE' not in column_attr
+
+
+def test_profiles_give_the_widths_too(fake_catalog, fake_connection):
+    struct = collect(fake_connection, column_profile=5)
+    assert fake_catalog.calls['get_column_profiles'] == 1
+    assert fake_catalog.calls['get_column_widths'] == 0
+    column_attr = struct['sch']['TABLE']['flights']['COLUMN']['id']
+    assert column_attr['AVG_WIDTH'] == 4
+    assert column_attr['PROFILE']['AVG_WIDTH'] == 4
+
+
+def test_resume_after_a_failure_in_the_bulk_phase(fake_catalog, fake_connection, tmp_path):
+    checkpoint_filename = str(tmp_path / 'test.checkpoint.json')
+    # Triggers are read after the function usage
+    fake_catalog.fail['get_triggers'] = 1
+    checkpoint = postgresql_autodoc.CollectionCheckpoint(checkpoint_filename)
+    try:
+        collect(fake_connection, checkpoint=checkpoint)
+    except RuntimeError:
+        checkpoint.save()
+    else:
+        assert False, 'the injected failure did not happen'
+
+    struct = collect(fake_connection, checkpoint=postgresql_autodoc.CollectionCheckpoint(checkpoint_filename, True))
+    # Every table and function came from the checkpoint
+    assert fake_catalog.calls['get_columns'] == 2
+    assert fake_catalog.calls['get_function_usage'] == 2
+    used_by = struct['sch']['FUNCTION']['next_id(value integer)']['USED_BY']
+    assert [(usage['TABLE'], usage['COLUMN']) for usage in used_by] == [('flights', 'id'), ('routes', 'id')]
+
+
+def test_documentation_of_an_unchanged_catalog_stays_the_same(fake_catalog, fake_connection):
+    # Without statistics, estimates and usage which change with every write
+    # are not collected
+    first = dict()
+    struct = collect(fake_connection, db=first)
+    assert 'RELTUPLES' not in struct['sch']['TABLE']['flights']
+    assert 'AVG_WIDTH' not in struct['sch']['TABLE']['flights']['COLUMN']['id']
+    index_keys = struct['sch']['TABLE']['flights']['INDEX_KEYS']['flights_id_idx']
+    assert (index_keys['SIZE'], index_keys['SCANS']) == (None, None)
+    assert fake_catalog.calls['get_column_widths'] == 0
+
+    fake_catalog.rows['get_tables'][0]['reltuples'] = 2500
+    fake_catalog.rows['get_index_keys'][0]['idx_scan'] = 40
+    fake_catalog.rows['get_index_keys'][0]['index_len'] = 32768
+    second = dict()
+    collect(fake_connection, db=second)
+    for db in (first, second):
+        postgresql_autodoc.info_postprocess(db, dict(), dict())
+    assert postgresql_autodoc.content_hash(first['test']) == postgresql_autodoc.content_hash(second['test'])
+    assert first['test']['ROW_LAYOUT'] == list()
+    assert first['test']['INDEX_ADVICE']['UNUSED_INDEXES'] == list()
+
+    # With statistics they are
+    struct = collect(fake_connection, statistics='fast')
+    assert struct['sch']['TABLE']['flights']['RELTUPLES'] == 2500
+    assert struct['sch']['TABLE']['flights']['COLUMN']['id']['AVG_WIDTH'] == 4
+    assert struct['sch']['TABLE']['flights']['INDEX_KEYS']['flights_id_idx']['SCANS'] == 40
@@ -0,0 +1,77 @@
+import postgresql_autodoc
+
+
+def plan(foreign_keys, tables=('airports', 'bookings', 'flights', 'tickets')):
+    # foreign_keys are (table, column, referenced schema, referenced table)
+    struct = dict()
+    for table in tables:
+        postgresql_autodoc.set_table_attribute(struct, 'sch', table, 'TYPE', 'table')
+        postgresql_autodoc.set_table_attribute(struct, 'sch', table, 'COLUMN', dict())
+    for table, column, fkschema, fktable in foreign_keys:
+        struct['sch']['TABLE'][table]['COLUMN'][column] = {'ORDER': 1, 'CON': {
+            '{}_{}_fkey'.format(table, column): {'TYPE': 'FOREIGN KEY', 'FKSCHEMA': fkschema, 'FKTABLE': fktable},
+        }}
+    db = {'test': {'STRUCT': struct}}
+    postgresql_autodoc.LoadOrderPlanner(db).plan()
+    return db['test']['LOAD_ORDER']
+
+
+def test_referenced_tables_are_loaded_first():
+    load_order = plan([
+        ('flights', 'departure_airport', 'sch', 'airports'),
+        ('tickets', 'flight_id', 'sch', 'flights'),
+        ('tickets', 'book_ref', 'sch', 'bookings'),
+        # Not documented, so not waited for
+        ('bookings', 'agent_id', 'crm', 'agents'),
+    ])
+    assert load_order['WAVES'] == [[['sch', 'airports'], ['sch', 'bookings']], [['sch', 'flights']],
+                                   [['sch', 'tickets']]]
+    assert load_order['LOAD_ORDER'] == [['sch', 'airports'], ['sch', 'bookings'], ['sch', 'flights'],
+                                        ['sch', 'tickets']]
+    assert load_order['TRUNCATE_ORDER'] == load_order['LOAD_ORDER'][::-1]
+    assert load_order['CYCLES'] == list()
+    assert load_order['SCHEMAS'] == {'sch': [{'WAVE': 0, 'TABLES': ['airports', 'bookings']},
+                                             {'WAVE': 1, 'TABLES': ['flights']},
+                                             {'WAVE': 2, 'TABLES': ['tickets']}]}
+
+
+def test_tables_referencing_each_other_are_loaded_together():
+    load_order = plan([
+        ('bookings', 'last_ticket_no', 'sch', 'tickets'),
+        ('tickets', 'book_ref', 'sch', 'bookings'),
+        ('flights', 'departure_airport', 'sch', 'airports'),
+        # Depends on the cycle
+        ('airports', 'first_booking', 'sch', 'bookings'),
+    ])
+    assert load_order['WAVES'] == [[['sch', 'bookings'], ['sch', 'tickets']], [['sch', 'airports']],
+                                   [['sch', 'flights']]]
+    assert load_order['TRUNCATE_ORDER'] == [['sch', 'flights'], ['sch', 'airports'], ['sch', 'tickets'],
+                                            ['sch', 'bookings']]
+    assert load_order['CYCLES'] == [{
+        'TABLES': [['sch', 'bookings'], ['sch', 'tickets']],
+        'CONSTRAINTS': [['sch', 'bookings', 'bookings_last_ticket_no_fkey'],
+                        ['sch', 'tickets', 'tickets_book_ref_fkey']],
+    }]
+
+
+def test_self_reference_is_a_cycle_of_one_table():
+    load_order = plan([
+        ('flights', 'previous_flight_id', 'sch', 'flights'),
+        ('tickets', 'flight_id', 'sch', 'flights'),
+    ], tables=('flights', 'tickets'))
+    assert load_order['WAVES'] == [[['sch', 'flights']], [['sch', 'tickets']]]
+    assert load_order['TRUNCATE_ORDER'] == [['sch', 'tickets'], ['sch', 'flights']]
+    assert load_order['CYCLES'] == [{
+        'TABLES': [['sch', 'flights']],
+        'CONSTRAINTS': [['sch', 'flights', 'flights_previous_flight_id_fkey']],
+    }]
+
+
+def test_long_reference_chains_do_not_recurse():
+    # Every table references the next one, so the search from the first
+    # goes deeper than the recursion limit
+    tables = ['t{:05d}'.format(index) for index in range(5000)]
+    load_order = plan([(table, 'next_id', 'sch', referenced) for table, referenced in zip(tables, tables[1:])],
+                      tables=tables)
+    assert len(load_order['WAVES']) == len(tables)
+    assert load_order['LOAD_ORDER'] == [['sch', table] for table in reversed(tables)]
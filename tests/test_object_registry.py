@@ -0,0 +1,36 @@
+import postgresql_autodoc
+
+
+def registry(tables, functions=()):
+    struct = dict()
+    for table in tables:
+        postgresql_autodoc.set_table_attribute(struct, 'Sch', table, 'TYPE', 'table')
+    for function in functions:
+        struct['Sch'].setdefault('FUNCTION', dict())[function] = {'NAME': function.split('(')[0]}
+    return postgresql_autodoc.ObjectRegistry('test', struct)
+
+
+def test_names_with_the_same_id_get_suffixes():
+    tables = ('a_b', 'a-b', 'a-b-2', 'Flights')
+    object_registry = registry(tables)
+    # In the order of the sorted names, whatever order they were added in
+    assert object_registry.table_id('Sch', 'a-b') == 'Sch.table.a-b'
+    assert object_registry.table_id('Sch', 'a-b-2') == 'Sch.table.a-b-2'
+    assert object_registry.table_id('Sch', 'a_b') == 'Sch.table.a-b-3'
+    reversed_registry = registry(reversed(tables))
+    assert [reversed_registry.table_id('Sch', table) for table in tables] == \
+        [object_registry.table_id('Sch', table) for table in tables]
+    assert object_registry.table_object_id('Sch', 'Flights') == 1
+
+
+def test_references_resolve_whatever_their_case():
+    object_registry = registry(['Flights', 'flights', 'Routes'], ['next_id(value integer)'])
+    assert object_registry.reference_id('TABLE', 'sch', 'routes') == 'Sch.table.Routes'
+    assert object_registry.reference_id('table', 'SCH', 'ROUTES') == 'Sch.table.Routes'
+    # The exact name comes first, then the first of the names in another case
+    assert object_registry.reference_id('TABLE', 'Sch', 'flights') == 'Sch.table.flights'
+    assert object_registry.reference_id('TABLE', 'sch', 'FLIGHTS') == 'Sch.table.Flights'
+    assert object_registry.reference_id('function', 'sch', 'NEXT_ID(value integer)') == \
+        object_registry.function_id('Sch', 'next_id(value integer)')
+    # Targets which are not documented get the id they would have
+    assert object_registry.reference_id('VIEW', 'sch', 'missing_one') == 'sch.view.missing-one'
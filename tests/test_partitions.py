@@ -0,0 +1,38 @@
+import collect_info
+import postgresql_autodoc
+from conftest import FakeCursor
+
+
+def partition(chl_oid, chl_tablename, par_oid, partition_bound, total_size=8192):
+    return {'chl_oid': chl_oid, 'chl_schemaname': 'sch', 'chl_tablename': chl_tablename, 'chl_relkind': 'r',
+            'par_oid': par_oid, 'par_schemaname': 'sch', 'par_tablename': 'flights', 'total_size': total_size,
+            'declarative': True, 'partition_key': 'RANGE (departure)', 'partition_bound': partition_bound}
+
+
+def test_partitions_are_folded_into_their_parent():
+    tables = [{'oid': oid, 'tablename': tablename}
+              for oid, tablename in ((1001, 'flights'), (1002, 'flights_2024'), (1003, 'flights_2025'),
+                                     (1004, 'routes'))]
+    partitions = [
+        partition(1002, 'flights_2024', 1001, "FOR VALUES FROM ('2024-01-01') TO ('2025-01-01')"),
+        partition(1003, 'flights_2025', 1001, "FOR VALUES FROM ('2025-01-01') TO ('2026-01-01')"),
+    ]
+    tables, summaries = postgresql_autodoc.fold_child_partitions(tables, partitions, False)
+    assert [table['tablename'] for table in tables] == ['flights', 'routes']
+    assert summaries == {1001: {'COUNT': 2, 'SIZE': 16384, 'KEY': 'RANGE (departure)', 'HAS_DEFAULT': False,
+                                'BOUND_FROM': "'2024-01-01'", 'BOUND_TO': "'2026-01-01'"}}
+
+
+def test_foreign_keys_to_partitions_are_not_collected():
+    # The clones of a foreign key to the partitions of a partitioned table
+    # would link to the folded partitions
+    cur = FakeCursor('oid', 7001, server_version=120000)
+    collect_info.get_foreign_keys(cur, 1004, ['sch'])
+    request = ' '.join(cur.requests[0].split())
+    assert 'WHERE parent_constraint.oid = pg_constraint.conparentid ' \
+           'AND parent_constraint.conrelid = pg_constraint.conrelid' in request
+
+    # Before 11 there are neither clones nor conparentid
+    cur = FakeCursor('oid', 7001, server_version=100000)
+    collect_info.get_foreign_keys(cur, 1004, ['sch'])
+    assert 'conparentid' not in cur.requests[0]
@@ -0,0 +1,122 @@
+import psycopg2.errors
+import pytest
+
+import collect_info
+from conftest import FakeCursor
+
+
+def test_replication_lag_of_a_caught_up_standby_is_zero():
+    cur = FakeCursor('replication_lag', None)
+    assert collect_info.get_replication_lag(cur) == 0
+    # On a standby the lag only counts while received WAL is not replayed yet,
+    # rather than since the last transaction of the primary
+    request = ' '.join(cur.requests[0].split())
+    assert 'WHEN pg_catalog.pg_last_wal_receive_lsn() = pg_catalog.pg_last_wal_replay_lsn() THEN 0' in request
+    assert request.index('pg_last_wal_replay_lsn') < request.index('pg_last_xact_replay_timestamp')
+
+
+def throttle_with_lag(monkeypatch, lags, max_pause):
+    sleeps = list()
+    monkeypatch.setattr(collect_info, 'get_replication_lag', lambda cur: next(lags))
+    monkeypatch.setattr(collect_info.time, 'sleep', sleeps.append)
+    throttle = collect_info.QueryThrottle(max_replication_lag=30, max_pause=max_pause)
+    return throttle, sleeps
+
+
+def test_idle_standby_does_not_pause(monkeypatch):
+    throttle, sleeps = throttle_with_lag(monkeypatch, iter([0.0] * 10), 100)
+    throttle.before_query(None)
+    assert sleeps == list()
+    assert not throttle.pause_limit_reached
+
+
+def test_pauses_stop_at_the_limit(monkeypatch, capsys):
+    # The lag never goes down
+    throttle, sleeps = throttle_with_lag(monkeypatch, iter(lambda: 3600.0, None), 100)
+    throttle.before_query(None)
+    assert sleeps == [1, 2, 4, 8, 16, 32, 37]
+    assert throttle.pause_limit_reached
+    assert 'warning: paused 100 s in all' in capsys.readouterr().out
+
+    # Later queries don't check the load any more
+    throttle.next_load_check = 0
+    throttle.before_query(None)
+    assert sum(sleeps) == 100
+    assert throttle.report()['pause_limit_reached']
+
+
+def test_pauses_end_when_the_lag_goes_down(monkeypatch):
+    throttle, sleeps = throttle_with_lag(monkeypatch, iter([3600.0, 3600.0, 5.0]), 100)
+    throttle.before_query(None)
+    assert sleeps == [1, 2]
+    assert not throttle.pause_limit_reached
+
+
+class LockNotAvailable(psycopg2.errors.LockNotAvailable):
+    # As raised by psycopg2, with the SQLSTATE sent by the server
+    pgcode = '55P03'
+
+
+class LockedCursor(FakeCursor):
+    # Its first queries wait for a table locked by an ALTER TABLE and time out
+    def __init__(self, name, value, locked_queries):
+        super().__init__(name, value)
+        self.locked_queries = locked_queries
+        self.rollbacks = 0
+
+    def execute(self, request, arguments=None):
+        super().execute(request, arguments)
+        if self.locked_queries:
+            self.locked_queries -= 1
+            raise LockNotAvailable('canceling statement due to lock timeout')
+
+    def rollback(self):
+        self.rollbacks += 1
+
+
+def low_impact_cursor(monkeypatch, locked_queries):
+    sleeps = list()
+    monkeypatch.setattr(collect_info.time, 'sleep', sleeps.append)
+    throttle = collect_info.QueryThrottle(lock_timeout=1000)
+    locked_cursor = LockedCursor('schemaname', 'sch', locked_queries)
+    cur = collect_info.InstrumentedCursor(locked_cursor, collect_info.QueryStatistics(), throttle)
+    return cur, locked_cursor, throttle, sleeps
+
+
+def test_bulk_query_is_retried_after_a_lock_timeout(monkeypatch):
+    cur, locked_cursor, throttle, sleeps = low_impact_cursor(monkeypatch, 2)
+    assert collect_info.get_index_keys(cur, ['sch'], throttle.estimated_sizes) == [{'schemaname': 'sch'}]
+    assert sleeps == [1, 2]
+    assert locked_cursor.rollbacks == 2
+    assert throttle.report()['retried'] == {'get_index_keys': {'retries': 2, 'seconds': 3}}
+    # The sizes are estimated without locking the indexes
+    assert 'pg_relation_size' not in locked_cursor.requests[-1]
+    assert 'relpages' in locked_cursor.requests[-1]
+
+
+def test_sizes_lock_the_relations_without_a_lock_timeout():
+    cur = FakeCursor('schemaname', 'sch')
+    collect_info.get_fast_statistics(cur, ['sch'], collect_info.QueryThrottle().estimated_sizes)
+    collect_info.get_partitions(cur, ['sch'])
+    assert 'pg_catalog.pg_indexes_size(pg_class.oid)' in cur.requests[0]
+    assert 'pg_catalog.pg_total_relation_size(chlcla.oid)' in cur.requests[1]
+
+
+def test_lock_timeouts_fail_the_query_after_the_retries(monkeypatch):
+    cur, locked_cursor, throttle, sleeps = low_impact_cursor(monkeypatch, 100)
+    with pytest.raises(LockNotAvailable):
+        collect_info.get_partitions(cur, ['sch'], throttle.estimated_sizes)
+    assert sleeps == [1, 2, 4, 8, 16]
+    assert len(locked_cursor.requests) == collect_info.QueryThrottle.MAX_RETRIES + 1
+
+
+def test_statistics_scan_is_skipped_without_retries(monkeypatch):
+    cur, locked_cursor, throttle, sleeps = low_impact_cursor(monkeypatch, 1)
+    assert throttle.unless_timed_out(locked_cursor, 'sch.flights',
+                                     lambda: collect_info.get_statistics(cur, 1001)) is None
+    assert sleeps == list()
+    assert throttle.timed_out == ['sch.flights']
+    # Later queries are retried again
+    locked_cursor.locked_queries = 1
+    collect_info.get_fast_statistics(cur, ['sch'], throttle.estimated_sizes)
+    assert sleeps == [1]
@@ -0,0 +1,57 @@
+import json
+import os
+
+import postgresql_autodoc
+
+VIEW = ' SELECT t.id FROM (s.t t LEFT JOIN s.u u ON ((u.id = t.id))) WHERE (t.id > 0);'
+
+
+def test_results_are_kept_between_runs(tmp_path):
+    cache = postgresql_autodoc.SqlPrettyprintCache(str(tmp_path), 'formatter 1')
+    assert cache.prettyprint(VIEW) == postgresql_autodoc.sql_prettyprint(VIEW)
+    cache.save()
+
+    cache = postgresql_autodoc.SqlPrettyprintCache(str(tmp_path), 'formatter 1')
+    assert list(cache.loaded.values()) == [postgresql_autodoc.sql_prettyprint(VIEW)]
+    assert os.listdir(str(tmp_path)) == ['sql_prettyprint.json']
+
+
+def test_results_of_another_formatter_are_not_reused(tmp_path):
+    cache = postgresql_autodoc.SqlPrettyprintCache(str(tmp_path), 'formatter 1')
+    cache.prettyprint(VIEW)
+    cache.save()
+    filename = os.path.join(str(tmp_path), 'sql_prettyprint.json')
+    with open(filename) as f:
+        entries = json.load(f)
+    with open(filename, 'w') as f:
+        json.dump({key: 'stale' for key in entries}, f)
+
+    assert postgresql_autodoc.SqlPrettyprintCache(str(tmp_path), 'formatter 1').prettyprint(VIEW) == 'stale'
+    assert postgresql_autodoc.SqlPrettyprintCache(str(tmp_path), 'formatter 2').prettyprint(VIEW) == \
+        postgresql_autodoc.sql_prettyprint(VIEW)
+
+
+def test_default_salt_is_the_module(tmp_path):
+    cache = postgresql_autodoc.SqlPrettyprintCache(str(tmp_path))
+    assert cache.salt == postgresql_autodoc.file_hash(postgresql_autodoc.__file__)
+
+
+def test_interrupted_save_keeps_the_previous_cache(tmp_path, monkeypatch):
+    cache = postgresql_autodoc.SqlPrettyprintCache(str(tmp_path), 'formatter 1')
+    cache.prettyprint(VIEW)
+    cache.save()
+
+    def interrupted_dump(value, f, **kwargs):
+        f.write('{"partial')
+        raise KeyboardInterrupt
+
+    cache = postgresql_autodoc.SqlPrettyprintCache(str(tmp_path), 'formatter 1')
+    cache.prettyprint(VIEW + ' ')
+    monkeypatch.setattr(postgresql_autodoc.json, 'dump', interrupted_dump)
+    try:
+        cache.save()
+    except KeyboardInterrupt:
+        pass
+    monkeypatch.undo()
+
+    assert len(postgresql_autodoc.SqlPrettyprintCache(str(tmp_path), 'formatter 1').loaded) == 1
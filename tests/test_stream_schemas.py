@@ -0,0 +1,74 @@
+import os
+
+import pytest
+
+import postgresql_autodoc
+from conftest import FakeCatalog
+
+TEMPLATE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'templates')
+
+
+def two_schemas(fake_catalog):
+    # The tables of sch come after the ones of airports, in collection order
+    fake_catalog.rows['get_schemas'][:] = ['airports', 'sch']
+    fake_catalog.rows['get_tables'].insert(0, FakeCatalog.table(1003, 'airports', 'airports'))
+    fake_catalog.rows['get_schemas_comment'].append({'namespace': 'airports', 'comment': None})
+
+
+def collect_by_schema(fake_connection, output_dir, resume=False):
+    return postgresql_autodoc.info_collect_by_schema(fake_connection, 'test', str(output_dir), None, None, None, None,
+                                                     progress=None,
+                                                     checkpoint_filename=str(output_dir / 'test.checkpoint.json'),
+                                                     resume=resume)
+
+
+def read_files(directory):
+    return {filename: (directory / filename).read_bytes() for filename in sorted(os.listdir(directory))}
+
+
+@pytest.mark.parametrize('html_shards', ['schema', 'object'])
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_pages_written_by_schema_are_the_pages_of_the_whole_database(fake_catalog, fake_connection, tmp_path,
+                                                                     html_shards, jobs):
+    two_schemas(fake_catalog)
+    db = dict()
+    postgresql_autodoc.info_collect(fake_connection, db, 'test', None, None, None, None, progress=None)
+    postgresql_autodoc.info_postprocess(db, dict(), dict())
+    postgresql_autodoc.write_using_templates(db, 'test', TEMPLATE_PATH, str(tmp_path / 'whole'), 'html',
+                                             html_shards=html_shards)
+
+    index = collect_by_schema(fake_connection, tmp_path / 'json')
+    postgresql_autodoc.write_by_schema(index, dict(), dict(), TEMPLATE_PATH, str(tmp_path / 'streamed'), jobs=jobs,
+                                       html_shards=html_shards)
+
+    pages = read_files(tmp_path / 'whole_html')
+    assert postgresql_autodoc.HTML_SEARCH_INDEX in pages
+    assert len(pages) == (4 if html_shards == 'schema' else 9)
+    assert read_files(tmp_path / 'streamed_html') == pages
+    assert index.db['test']['LOAD_ORDER'] == db['test']['LOAD_ORDER']
+
+
+def test_resume_after_a_failure_in_the_second_schema(fake_catalog, fake_connection, tmp_path):
+    two_schemas(fake_catalog)
+    expected = collect_by_schema(fake_connection, tmp_path / 'expected')
+    fake_catalog.calls.clear()
+
+    # Columns of airports, of sch.flights, then of sch.routes
+    fake_catalog.fail['get_columns'] = 3
+    with pytest.raises(RuntimeError):
+        collect_by_schema(fake_connection, tmp_path / 'json')
+    assert (tmp_path / 'json' / 'airports.json').exists()
+    assert not (tmp_path / 'json' / 'sch.json').exists()
+    assert (tmp_path / 'json' / 'test.checkpoint.json').exists()
+
+    index = collect_by_schema(fake_connection, tmp_path / 'json', resume=True)
+    # airports was read back from its file and sch.flights from the checkpoint
+    assert fake_catalog.calls['get_tables'] == 3
+    assert fake_catalog.calls['get_columns'] == 4
+    assert index.files == {'airports': str(tmp_path / 'json' / 'airports.json'),
+                           'sch': str(tmp_path / 'json' / 'sch.json')}
+    assert index.db == expected.db
+    # Of every table only what the other schemas refer to is kept
+    assert index.db['test']['STRUCT']['sch']['TABLE']['flights'] == {'TYPE': 'table', 'COLUMN': {'id': {'ORDER': 1}}}
+    assert (tmp_path / 'json' / 'collected.jsonl').read_text().splitlines()[1:] == ['"airports"', '"sch"']
+    assert not (tmp_path / 'json' / 'test.checkpoint.json').exists()